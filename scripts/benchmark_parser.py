@@ -0,0 +1,149 @@
+import argparse
+import contextlib
+import io
+import random
+import re
+import time
+
+import pandas as pd
+
+import parse_dengue
+
+# Perfil mensal da linha TOTAL de data/tabnet_uf_mes.txt, usado para dar às linhas sintéticas a sazonalidade real
+PERFIL_MENSAL = [1329838, 2594794, 4114939, 4304428, 3015182, 980148, 404895, 237338, 186481, 191331, 275864, 438733]
+
+UFS = [
+    (11, "Rondônia"), (12, "Acre"), (13, "Amazonas"), (14, "Roraima"), (15, "Pará"), (16, "Amapá"),
+    (17, "Tocantins"), (21, "Maranhão"), (22, "Piauí"), (23, "Ceará"), (24, "Rio Grande do Norte"),
+    (25, "Paraíba"), (26, "Pernambuco"), (27, "Alagoas"), (28, "Sergipe"), (29, "Bahia"),
+    (31, "Minas Gerais"), (32, "Espírito Santo"), (33, "Rio de Janeiro"), (35, "São Paulo"),
+    (41, "Paraná"), (42, "Santa Catarina"), (43, "Rio Grande do Sul"), (50, "Mato Grosso do Sul"),
+    (51, "Mato Grosso"), (52, "Goiás"), (53, "Distrito Federal"),
+]
+
+# Loop original de parse_dengue.py (regex + conversão com pd.to_numeric), mantido aqui como referência
+pattern = re.compile(r"^(.*?)\s+(-?\d{1,3}(?:\.\d{3})*|-)\s*(\d.*|-\d.*)$", re.UNICODE)
+num_pattern = re.compile(r"(-?\d{1,3}(?:\.\d{3})*|-)")
+
+
+def formatar_tabnet(valor):
+    """Formata um número como o TabNet: '-' para zero e '.' como separador de milhar."""
+    return '-' if valor == 0 else f"{valor:,}".replace(',', '.')
+
+
+def gerar_linhas_sinteticas(n_linhas, semente=42):
+    """
+    Gera linhas no formato copiado do TabNet, em tabelas de uma linha TOTAL
+    seguida das 27 UFs, com casos na escala da tabela real (de ~6 mil a ~6
+    milhões por ano) e a sazonalidade de PERFIL_MENSAL. Retorna as linhas e
+    os registros esperados, como (UF, números).
+    """
+    rng = random.Random(semente)
+    total_perfil = sum(PERFIL_MENSAL)
+    linhas = []
+    esperados = []
+    while len(linhas) < n_linhas:
+        tabela = []
+        for codigo, nome in UFS:
+            casos = 10 ** rng.uniform(3.8, 6.8)
+            numeros = [int(rng.expovariate(0.1)) if rng.random() < 0.7 else 0]
+            numeros += [int(casos * mes / total_perfil * rng.uniform(0.7, 1.3)) for mes in PERFIL_MENSAL]
+            numeros.append(sum(numeros))
+            tabela.append((codigo, nome, numeros))
+        total = [sum(coluna) for coluna in zip(*(numeros for _, _, numeros in tabela))]
+        for codigo, nome, numeros in [(None, "TOTAL", total)] + tabela:
+            rotulo = nome if codigo is None else f"{codigo} {nome}"
+            linhas.append(f"{rotulo} {''.join(formatar_tabnet(valor) for valor in numeros)}")
+            esperados.append((nome, numeros))
+    return linhas[:n_linhas], esperados[:n_linhas]
+
+
+def parsear_legado(linhas):
+    """Loop de regex do parse_dengue.py original, da linha ao DataFrame tipado."""
+    columns = parse_dengue.columns
+    data = []
+    for line in linhas:
+        match = pattern.match(line)
+        if match:
+            uf_name = re.sub(r"^\d+\s+", "", match.group(1).strip())
+            ign_branco = match.group(2).strip().replace('.', '').replace('-', '0')
+            numbers = num_pattern.findall(match.group(3).strip())
+            cleaned_numbers = [num.replace('.', '').replace('-', '0') for num in numbers]
+            row = [uf_name, ign_branco] + cleaned_numbers
+            if len(row) < len(columns):
+                row.extend(['0'] * (len(columns) - len(row)))
+            elif len(row) > len(columns):
+                row = row[:len(columns)]
+            data.append(row)
+
+    df = pd.DataFrame(data, columns=columns)
+    for col in columns[1:]:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
+    return df
+
+
+def parsear_novo(linhas):
+    """Separação conferida pelo total de cada linha, em blocos colunares (parse_dengue.gerar_blocos)."""
+    return pd.concat(parse_dengue.gerar_blocos(linhas), ignore_index=True)
+
+
+def parsear_referencia(linhas):
+    """
+    Cada linha pela programação dinâmica de referência (parse_dengue.separar_referencia),
+    sem a reconciliação das ambíguas pela linha TOTAL: essas são descartadas.
+    """
+    nomes, valores = [], []
+    for linha in linhas:
+        rotulo, texto = linha.rsplit(None, 1)
+        try:
+            valores.append(parse_dengue.separar_referencia(texto))
+        except parse_dengue.ErroSeparacao:
+            continue
+        nomes.append(parse_dengue._CODIGO_UF.sub("", rotulo))
+    df = pd.DataFrame(valores, columns=parse_dengue.colunas_numericas)
+    df.insert(0, 'UF_Notificacao', nomes)
+    return df
+
+
+def medir(nome, funcao, linhas, esperados):
+    """Executa um parser, imprime o tempo e quantas linhas saíram iguais às esperadas."""
+    avisos = io.StringIO()
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(avisos), contextlib.redirect_stderr(avisos):
+        df = funcao(linhas)
+    segundos = time.perf_counter() - inicio
+
+    # as linhas descartadas somem da saída; as demais seguem a ordem da entrada
+    corretas = 0
+    esperado = iter(esperados)
+    for uf, numeros in zip(df['UF_Notificacao'], df[parse_dengue.colunas_numericas].to_numpy().tolist()):
+        for uf_esperada, numeros_esperados in esperado:
+            if uf_esperada == uf:
+                corretas += numeros == numeros_esperados
+                break
+
+    print(f"{nome:>5}: {segundos:7.2f} s  {len(linhas) / segundos:9,.0f} linhas/s  "
+          f"{segundos / len(linhas) * 1e6:6.1f} us/linha  "
+          f"{corretas} corretas, {len(linhas) - len(df)} descartadas")
+    return segundos
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compara o parser de regex original e a programação dinâmica de referência com a '
+                                                 'separação de parse_dengue.')
+    parser.add_argument('--linhas', type=int, default=10 ** 6, help='quantidade de linhas sintéticas')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--linhas-referencia', type=int, default=10 ** 4,
+                        help='primeiras linhas também separadas pela programação dinâmica de referência')
+    args = parser.parse_args()
+
+    linhas, esperados = gerar_linhas_sinteticas(args.linhas, args.semente)
+    print(f"{len(linhas)} linhas sintéticas do TabNet")
+
+    tempo_legado = medir('regex', parsear_legado, linhas, esperados)
+    tempo_novo = medir('novo', parsear_novo, linhas, esperados)
+    print(f"speedup: {tempo_legado / tempo_novo:.2f}x")
+    if args.linhas_referencia:
+        n = min(args.linhas_referencia, len(linhas))
+        tempo_referencia = medir('ref', parsear_referencia, linhas[:n], esperados[:n])
+        print(f"speedup sobre a referência: {tempo_referencia / n / (tempo_novo / len(linhas)):.1f}x")
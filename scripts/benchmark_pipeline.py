@@ -0,0 +1,361 @@
+import argparse
+import collections
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import string
+import subprocess
+import time
+
+import numpy as np
+import pandas as pd
+
+SAIDA_PADRAO = "/home/ubuntu/benchmark"
+
+# escala padrão: todos os municípios, semanas epidemiológicas, duas décadas
+MUNICIPIOS = 5570
+SEMANAS = 52
+ANOS = 20
+ANO_INICIAL = 2005
+
+# perfil mensal da linha TOTAL de data/tabnet_uf_mes.txt (o mesmo de benchmark_parser.py)
+PERFIL_MENSAL = [1329838, 2594794, 4114939, 4304428, 3015182, 980148, 404895, 237338, 186481, 191331, 275864, 438733]
+
+ARQUIVO_TABNET_UF = 'tabnet_uf_mes.txt'
+ARQUIVO_TABNET_MUNICIPIO = 'tabnet_municipio_mes.csv'
+ARQUIVO_SEMANAL = 'casos_municipio_semana.csv'
+ARQUIVO_COVARIAVEIS = 'covariaveis_municipio.csv'
+ARQUIVO_POPULACAO = 'populacao_municipio.csv'
+ARQUIVO_HISTORICO = 'historico.csv'
+
+# variação relativa acima da qual uma etapa é apontada como regressão
+TOLERANCIA = 0.10
+
+
+def _nome_municipio(i):
+    """Nome só com letras (dígitos no nome se confundiriam com os números da linha do TabNet)."""
+    letras = []
+    for _ in range(4):
+        i, resto = divmod(i, 26)
+        letras.append(string.ascii_uppercase[resto])
+    return 'Município ' + ''.join(reversed(letras)).capitalize()
+
+
+def gerar_dataset(diretorio, municipios=MUNICIPIOS, semanas=SEMANAS, anos=ANOS, semente=42):
+    """
+    Gera em `diretorio` um conjunto sintético na escala pedida:
+
+    - tabnet_uf_mes.txt: tabelas UF × mês por ano, no formato de texto
+      copiado do TabNet (linha TOTAL e números concatenados);
+    - tabnet_municipio_mes.csv: tabelas município × mês por ano, no CSV
+      exportado pelo TabNet (campos separados por ';');
+    - casos_municipio_semana.csv: casos por município, ano e semana;
+    - covariaveis_municipio.csv: clima e indicadores por município;
+    - populacao_municipio.csv: população por município no primeiro e no
+      último ano, no formato de populacao.py (codigo, ano, populacao).
+
+    Os municípios são distribuídos entre as UFs e têm porte log-normal; os
+    casos seguem a sazonalidade de PERFIL_MENSAL, com um fator epidêmico por
+    ano e por município e ruído binomial negativo. Retorna o resumo da escala.
+    """
+    from benchmark_parser import formatar_tabnet
+    from geografia import MESES, UFS
+
+    rng = np.random.default_rng(semente)
+    os.makedirs(diretorio, exist_ok=True)
+    codigos_uf = np.array([codigo for codigo in UFS if codigo])
+    uf = np.sort(rng.choice(codigos_uf, size=municipios))
+    sequencial = np.arange(municipios) - np.searchsorted(uf, uf)
+    codigos = uf * 10000 + sequencial + 1
+
+    porte = rng.lognormal(2.0, 1.2, size=municipios)
+    perfil = np.interp(np.arange(semanas) * 12 / semanas, np.arange(12), PERFIL_MENSAL)
+    perfil = perfil / perfil.mean()
+    epidemia = rng.lognormal(0.0, 0.8, size=(municipios, anos))
+    media = porte[:, None, None] * epidemia[:, :, None] * perfil[None, None, :]
+    casos = rng.poisson(rng.gamma(2.0, media / 2.0)).astype(np.int32)  # município × ano × semana
+
+    mes_da_semana = np.minimum(np.arange(semanas) * 12 // semanas, 11)
+    por_mes = np.zeros((municipios, anos, 12), dtype=np.int64)
+    np.add.at(np.moveaxis(por_mes, 2, 0), mes_da_semana, np.moveaxis(casos, 2, 0))
+    ignorados = rng.binomial(por_mes.sum(axis=2), 0.002)
+
+    tabelas = np.concatenate([ignorados[:, :, None], por_mes, (ignorados + por_mes.sum(axis=2))[:, :, None]], axis=2)
+    por_uf = np.zeros((len(codigos_uf),) + tabelas.shape[1:], dtype=np.int64)
+    np.add.at(por_uf, np.searchsorted(codigos_uf, uf), tabelas)
+
+    with open(os.path.join(diretorio, ARQUIVO_TABNET_UF), 'w', encoding='utf-8') as arquivo:
+        for ano in range(anos):
+            arquivo.write("TOTAL " + ''.join(formatar_tabnet(int(v)) for v in por_uf[:, ano].sum(axis=0)) + "\n")
+            for codigo, linha in zip(codigos_uf, por_uf[:, ano].tolist()):
+                arquivo.write(f"{codigo} {UFS[codigo]} {''.join(formatar_tabnet(v) for v in linha)}\n")
+
+    nomes = [_nome_municipio(i) for i in range(municipios)]
+    cabecalho = ';'.join(f'"{coluna}"' for coluna in ['Município', 'Ign/Em Branco'] + MESES + ['Total']) + "\n"
+    with open(os.path.join(diretorio, ARQUIVO_TABNET_MUNICIPIO), 'w', encoding='utf-8') as arquivo:
+        for ano in range(anos):
+            arquivo.write(cabecalho)
+            arquivo.write('"TOTAL";' + ';'.join(formatar_tabnet(int(v)) for v in tabelas[:, ano].sum(axis=0)) + "\n")
+            for codigo, nome, linha in zip(codigos, nomes, tabelas[:, ano].tolist()):
+                arquivo.write(f'"{codigo} {nome}";' + ';'.join(formatar_tabnet(v) for v in linha) + "\n")
+
+    indice = pd.MultiIndex.from_product([codigos, np.arange(ANO_INICIAL, ANO_INICIAL + anos), np.arange(1, semanas + 1)],
+                                        names=['Municipio', 'Ano', 'Semana'])
+    pd.DataFrame({'Casos': casos.ravel()}, index=indice).to_csv(os.path.join(diretorio, ARQUIVO_SEMANAL))
+
+    latitude = rng.uniform(-33, 5, size=municipios)
+    pd.DataFrame({
+        'Temperatura_Media': (27 + 0.25 * latitude + rng.normal(0, 1, municipios)).round(1),
+        'Precipitacao_Total': rng.gamma(8, 180, municipios).round(1),
+        'IDH': rng.uniform(0.5, 0.86, municipios).round(3),
+        'Acesso_Saneamento': rng.uniform(10, 98, municipios).round(1),
+        'Densidade_Demografica': (porte * rng.lognormal(1, 1, municipios)).round(2),
+    }, index=pd.Index(codigos, name='Municipio')).to_csv(os.path.join(diretorio, ARQUIVO_COVARIAVEIS))
+
+    # população proporcional ao porte, com crescimento entre os dois anos de referência
+    inicial = np.round(porte * 3000 * rng.lognormal(0, 0.3, municipios)) + 1000
+    final = np.round(inicial * rng.lognormal(0.1, 0.1, municipios))
+    referencias = sorted({ANO_INICIAL, ANO_INICIAL + anos - 1})
+    pd.DataFrame({
+        'codigo': np.tile(codigos, len(referencias)),
+        'ano': np.repeat(referencias, municipios),
+        'populacao': np.concatenate([inicial, final][:len(referencias)]).astype(np.int64),
+    }).to_csv(os.path.join(diretorio, ARQUIVO_POPULACAO), index=False)
+
+    return {'municipios': municipios, 'semanas': semanas, 'anos': anos, 'semente': semente,
+            'casos': int(casos.sum()), 'linhas_tabnet': anos * (municipios + len(codigos_uf) + 2),
+            'linhas_semanais': casos.size}
+
+
+def _ler_semanal(diretorio):
+    """Casos semanais como array município × ano × semana, com os códigos dos municípios."""
+    df = pd.read_csv(os.path.join(diretorio, ARQUIVO_SEMANAL),
+                     dtype={'Municipio': np.int32, 'Ano': np.int16, 'Semana': np.int8, 'Casos': np.int32})
+    municipios, posicao_municipio = np.unique(df['Municipio'].to_numpy(), return_inverse=True)
+    anos, posicao_ano = np.unique(df['Ano'].to_numpy(), return_inverse=True)
+    semanas = int(df['Semana'].max())
+    casos = np.zeros((len(municipios), len(anos), semanas), dtype=np.int32)
+    casos[posicao_municipio, posicao_ano, df['Semana'].to_numpy() - 1] = df['Casos'].to_numpy()
+    return municipios, casos
+
+
+def etapa_parse(diretorio, opcoes):
+    """
+    Texto (UFs) e CSV (municípios) do TabNet → CSVs no esquema de
+    dengue_data_raw.csv (parse_dengue). Além das linhas gravadas, devolve as
+    esperadas (as linhas de dados geradas, com as TOTAL) e as descartadas
+    por motivo; os avisos linha a linha do parse não são mostrados.
+    """
+    import parse_dengue
+    linhas = 0
+    descartes = collections.Counter()
+    for entrada, saida in ((ARQUIVO_TABNET_UF, 'parse_uf.csv'), (ARQUIVO_TABNET_MUNICIPIO, 'parse_municipio.csv')):
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            blocos = parse_dengue.gerar_blocos(parse_dengue.ler_linhas([os.path.join(diretorio, entrada)]),
+                                               descartes=descartes)
+            linhas += parse_dengue.escrever_csv(blocos, os.path.join(diretorio, saida))
+    return {'itens': linhas, 'esperadas': opcoes['linhas_tabnet'], 'descartadas': dict(descartes)}
+
+
+def etapa_agregacao(diretorio, opcoes):
+    """CSV semanal → município × ano × semana, e somas por UF, região, mês e trimestre (geografia)."""
+    from geografia import IndiceGeografico, TabelaGeografica
+    municipios, casos = _ler_semanal(diretorio)
+    semanas = casos.shape[2]
+    por_mes = np.zeros(casos.shape[:2] + (12,), dtype=np.int64)
+    np.add.at(np.moveaxis(por_mes, 2, 0), np.minimum(np.arange(semanas) * 12 // semanas, 11), np.moveaxis(casos, 2, 0))
+    tabela = TabelaGeografica(IndiceGeografico(municipios, 'municipio'), por_mes.sum(axis=1))
+    for nivel in ('uf', 'regiao', 'brasil'):
+        tabela.agregado(nivel)
+        tabela.agregado(nivel, 'trimestre')
+    return {'itens': int(casos.size)}
+
+
+def _base_municipal(diretorio):
+    from juncao import juntar
+    from populacao import TabelaPopulacao, juntar_rotulos
+    municipios, casos = _ler_semanal(diretorio)
+    base = pd.DataFrame({'Total_Casos': casos.sum(axis=(1, 2))}, index=pd.Index(municipios, name='Municipio'))
+    covariaveis = pd.read_csv(os.path.join(diretorio, ARQUIVO_COVARIAVEIS), index_col=0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        df, _ = juntar(base, {'municipio': covariaveis})
+    # casos no período por 100 mil habitantes (população média dos anos cobertos), como em correlation_analysis.py
+    populacao = TabelaPopulacao.de_arquivos([os.path.join(diretorio, ARQUIVO_POPULACAO)], cache=None)
+    periodo = juntar_rotulos(range(ANO_INICIAL, ANO_INICIAL + casos.shape[1]))
+    df['Casos_por_100k'] = populacao.incidencia(df[['Total_Casos']].to_numpy(), 'municipio', [periodo],
+                                                df.index.to_numpy())[:, 0]
+    return df, casos
+
+
+def etapa_juncao(diretorio, opcoes):
+    """Casos totais por município juntados às covariáveis municipais (juncao)."""
+    df, _ = _base_municipal(diretorio)
+    return {'itens': len(df)}
+
+
+def etapa_correlacao(diretorio, opcoes):
+    """Matriz de Spearman, IC bootstrap e p-valores de permutação, e correlação defasada por município."""
+    from correlacao import correlacao_defasada, inferencia_correlacao, matriz_correlacao
+    df, casos = _base_municipal(diretorio)
+    matriz_correlacao(df)
+    inferencia_correlacao(df, n_bootstrap=opcoes['reamostragens'], n_permutacoes=opcoes['reamostragens'],
+                          processos=opcoes['processos'])
+    # temperatura semanal sintética, com o ciclo anual e um desvio por município
+    semanas = casos.shape[2]
+    rng = np.random.default_rng(0)
+    ciclo = 3 * np.cos(2 * np.pi * np.arange(semanas) / semanas)
+    clima = pd.DataFrame(df['Temperatura_Media'].to_numpy()[:, None] + ciclo + rng.normal(0, 0.5, (len(df), semanas)),
+                         index=df.index)
+    correlacao_defasada(clima, pd.DataFrame(casos.mean(axis=1), index=df.index), max_defasagem=8)
+    return {'itens': len(df)}
+
+
+def etapa_renderizacao(diretorio, opcoes):
+    """Gráficos de visualize_dengue.py sobre as tabelas UF × mês do parse, somados os anos."""
+    from graficos import renderizar
+    from visualize_dengue import especificar_graficos, preparar_dados
+    df = pd.read_csv(os.path.join(diretorio, 'parse_uf.csv'))
+    df = df.groupby('UF_Notificacao', as_index=False, sort=False).sum()
+    df_regioes, df_trimestres = preparar_dados(df)
+    specs = especificar_graficos(df, df_regioes, df_trimestres, saida=os.path.join(diretorio, 'graficos'))
+    # sem armazém: a etapa mede o desenho, não a cópia de gráficos já guardados
+    with contextlib.redirect_stdout(io.StringIO()):
+        renderizar(specs, opcoes['processos'], armazem=None)
+    return {'itens': len(specs)}
+
+
+# em ordem: a renderização lê os CSVs gerados pelo parse
+ETAPAS = {
+    'parse': etapa_parse,
+    'agregacao': etapa_agregacao,
+    'juncao': etapa_juncao,
+    'correlacao': etapa_correlacao,
+    'renderizacao': etapa_renderizacao,
+}
+
+
+def _executar_etapa(nome, diretorio, opcoes):
+    """Roda uma etapa (num processo novo) e mede tempo e pico de memória residente."""
+    inicio_memoria = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    inicio = time.perf_counter()
+    resultado = ETAPAS[nome](diretorio, opcoes)
+    segundos = time.perf_counter() - inicio
+    pico = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return dict(resultado, segundos=round(segundos, 4), pico_mb=round(pico / 1024, 1),
+                pico_inicial_mb=round(inicio_memoria / 1024, 1))
+
+
+def medir_etapas(diretorio, etapas, opcoes):
+    """
+    Executa as etapas em ordem, cada uma num processo criado do zero
+    (spawn), para que o pico de memória (ru_maxrss) seja só daquela etapa.
+    """
+    contexto = multiprocessing.get_context('spawn')
+    resultados = {}
+    for nome in etapas:
+        with contexto.Pool(1) as pool:
+            resultados[nome] = pool.apply(_executar_etapa, (nome, diretorio, opcoes))
+        medida = resultados[nome]
+        print(f"  {nome:<13} {medida['segundos']:8.2f} s  pico {medida['pico_mb']:8.1f} MB  ({medida['itens']} itens)")
+        if medida.get('esperadas', medida['itens']) != medida['itens']:
+            print(f"  Aviso: {nome} gravou {medida['itens']} de {medida['esperadas']} linhas esperadas (descartadas: "
+                  + ', '.join(f"{quantidade} {motivo}" for motivo, quantidade in medida['descartadas'].items()) + ")")
+    return resultados
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(atual, referencia, tolerancia=TOLERANCIA):
+    """Variação de tempo e memória de cada etapa contra uma execução de referência. Retorna as regressões."""
+    regressoes = []
+    for nome, medida in atual['etapas'].items():
+        base = referencia['etapas'].get(nome)
+        if base is None:
+            continue
+        for campo in ('segundos', 'pico_mb'):
+            variacao = medida[campo] / base[campo] - 1 if base[campo] else 0.0
+            marca = ''
+            if variacao > tolerancia:
+                regressoes.append((nome, campo, variacao))
+                marca = '  <- regressão'
+            print(f"  {nome:<13} {campo:<9} {base[campo]:10.2f} -> {medida[campo]:10.2f}  ({variacao:+.1%}){marca}")
+    return regressoes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mede tempo e pico de memória de cada etapa num conjunto sintético em grande escala.')
+    parser.add_argument('--saida', default=SAIDA_PADRAO, help='diretório dos dados sintéticos e dos resultados')
+    parser.add_argument('--municipios', type=int, default=MUNICIPIOS)
+    parser.add_argument('--semanas', type=int, default=SEMANAS)
+    parser.add_argument('--anos', type=int, default=ANOS)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--etapas', nargs='+', choices=list(ETAPAS), default=list(ETAPAS), help='etapas a medir')
+    parser.add_argument('--reamostragens', type=int, default=1000, help='reamostragens bootstrap e permutações')
+    parser.add_argument('--processos', type=int, default=None, help='processos da correlação e da renderização')
+    parser.add_argument('--reusar', action='store_true', help='reaproveita os dados sintéticos já gerados em --saida')
+    parser.add_argument('--comparar', help='JSON de uma execução anterior; sai com código 1 se alguma etapa piorar')
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA, help='piora relativa tolerada em --comparar')
+    args = parser.parse_args()
+
+    dados = os.path.join(args.saida, f'dados_{args.municipios}x{args.semanas}x{args.anos}_{args.semente}')
+    resumo_arquivo = os.path.join(dados, 'escala.json')
+    # conjuntos gerados antes do arquivo de população são gerados de novo
+    if args.reusar and os.path.exists(resumo_arquivo) and os.path.exists(os.path.join(dados, ARQUIVO_POPULACAO)):
+        with open(resumo_arquivo, encoding='utf-8') as arquivo:
+            escala = json.load(arquivo)
+        print(f"Reusando dados sintéticos de {dados}")
+    else:
+        inicio = time.perf_counter()
+        escala = gerar_dataset(dados, args.municipios, args.semanas, args.anos, args.semente)
+        with open(resumo_arquivo, 'w', encoding='utf-8') as arquivo:
+            json.dump(escala, arquivo, indent=1)
+        print(f"Dados sintéticos gerados em {time.perf_counter() - inicio:.1f} s: {escala['linhas_tabnet']} linhas do TabNet, "
+              f"{escala['linhas_semanais']} linhas semanais, {escala['casos']} casos")
+
+    print("Etapas:")
+    etapas = medir_etapas(dados, args.etapas, {'reamostragens': args.reamostragens, 'processos': args.processos,
+                                                'linhas_tabnet': escala['linhas_tabnet']})
+
+    resultado = {
+        'data': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'cpus': os.cpu_count(),
+        'escala': escala,
+        'etapas': etapas,
+    }
+    caminho = os.path.join(args.saida, f"benchmark_{resultado['commit'] or 'sem-commit'}_{resultado['data'].replace(':', '')}.json")
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultado, arquivo, ensure_ascii=False, indent=1)
+
+    # uma linha por etapa e execução, para acompanhar a evolução entre commits
+    historico = os.path.join(args.saida, ARQUIVO_HISTORICO)
+    linhas = pd.DataFrame([{'data': resultado['data'], 'commit': resultado['commit'], 'municipios': escala['municipios'],
+                            'semanas': escala['semanas'], 'anos': escala['anos'], 'etapa': nome,
+                            'segundos': medida['segundos'], 'pico_mb': medida['pico_mb']}
+                           for nome, medida in etapas.items()])
+    linhas.to_csv(historico, mode='a', header=not os.path.exists(historico), index=False)
+    print(f"Resultados em {caminho} (histórico em {historico})")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            referencia = json.load(arquivo)
+        if referencia['escala'] != escala:
+            print("Aviso: a referência foi medida em outra escala")
+        print(f"Comparação com {args.comparar}:")
+        regressoes = comparar(resultado, referencia, args.tolerancia)
+        if regressoes:
+            raise SystemExit(1)
@@ -0,0 +1,116 @@
+import argparse
+import os
+import shutil
+
+# diretório dos caches endereçados por conteúdo (gráficos, denominadores, vizinhanças)
+VARIAVEL_DIRETORIO = 'DENGUE_CACHE'
+DIRETORIO_CACHE = os.environ.get(VARIAVEL_DIRETORIO) or os.path.join(os.path.expanduser('~'), '.cache_dengue')
+# tamanho máximo de cada cache, em MB; acima dele saem as entradas usadas há mais tempo
+VARIAVEL_LIMITE = 'DENGUE_CACHE_LIMITE_MB'
+LIMITE_MB = 512
+
+# nome: profundidade das entradas (a unidade removida de uma vez) dentro do diretório
+CACHES = {
+    'graficos': 2,  # <2 primeiros dígitos>/<impressão>/, com o PNG e as variantes
+    'populacao': 1,
+    'espacial': 1,
+}
+
+
+def diretorio(nome):
+    return os.path.join(DIRETORIO_CACHE, nome)
+
+
+def limite_bytes():
+    return int(float(os.environ.get(VARIAVEL_LIMITE) or LIMITE_MB) * (1 << 20))
+
+
+def usar(caminho):
+    """Marca uma entrada como usada agora (o mtime é a idade usada por `limitar`)."""
+    try:
+        os.utime(caminho)
+    except OSError:
+        pass
+
+
+def _tamanho(caminho):
+    if not os.path.isdir(caminho):
+        return os.path.getsize(caminho)
+    return sum(os.path.getsize(os.path.join(raiz, arquivo))
+               for raiz, _, arquivos in os.walk(caminho) for arquivo in arquivos)
+
+
+def _entradas(diretorio, profundidade):
+    """(mtime, tamanho, caminho) de cada entrada a `profundidade` níveis de `diretorio`."""
+    caminhos = [diretorio]
+    for _ in range(profundidade):
+        caminhos = [os.path.join(caminho, nome) for caminho in caminhos if os.path.isdir(caminho)
+                    for nome in sorted(os.listdir(caminho))]
+    entradas = []
+    for caminho in caminhos:
+        try:
+            entradas.append((os.stat(caminho).st_mtime, _tamanho(caminho), caminho))
+        except OSError:  # removida por outro processo no meio da varredura
+            pass
+    return entradas
+
+
+def _remover(caminho):
+    if os.path.isdir(caminho):
+        shutil.rmtree(caminho, ignore_errors=True)
+    else:
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+
+def limitar(diretorio, profundidade=1, limite=None):
+    """
+    Remove as entradas usadas há mais tempo até `diretorio` caber em
+    `limite` bytes (padrão: DENGUE_CACHE_LIMITE_MB ou LIMITE_MB). Retorna
+    (entradas removidas, bytes liberados).
+    """
+    limite = limite_bytes() if limite is None else limite
+    entradas = sorted(_entradas(diretorio, profundidade))
+    excesso = sum(tamanho for _, tamanho, _ in entradas) - limite
+    removidas = liberados = 0
+    for _, tamanho, caminho in entradas:
+        if liberados >= excesso:
+            break
+        _remover(caminho)
+        removidas += 1
+        liberados += tamanho
+    return removidas, liberados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=f'Mostra, limita ou apaga os caches de gráficos, denominadores de população e vizinhanças '
+                    f'em {DIRETORIO_CACHE} (outro diretório com {VARIAVEL_DIRETORIO}).')
+    parser.add_argument('nomes', nargs='*', metavar='cache', help=f"{', '.join(CACHES)} (padrão: todos)")
+    parser.add_argument('--limpar', action='store_true', help='apaga os caches')
+    parser.add_argument('--limite-mb', type=float, default=None,
+                        help=f'remove as entradas mais antigas acima deste tamanho ({VARIAVEL_LIMITE}, padrão {LIMITE_MB})')
+    args = parser.parse_args(argv)
+    desconhecidos = sorted(set(args.nomes) - set(CACHES))
+    if desconhecidos:
+        parser.error(f"cache desconhecido: {', '.join(desconhecidos)} (use {', '.join(CACHES)})")
+
+    for nome in args.nomes or CACHES:
+        caminho = diretorio(nome)
+        if args.limpar:
+            shutil.rmtree(caminho, ignore_errors=True)
+            print(f"{nome}: apagado ({caminho})")
+            continue
+        if args.limite_mb is not None:
+            removidas, liberados = limitar(caminho, CACHES[nome], int(args.limite_mb * (1 << 20)))
+            if removidas:
+                print(f"{nome}: {removidas} entrada(s) removida(s), {liberados / (1 << 20):.1f} MB liberados")
+        entradas = _entradas(caminho, CACHES[nome]) if os.path.isdir(caminho) else []
+        print(f"{nome}: {len(entradas)} entrada(s), {sum(tamanho for _, tamanho, _ in entradas) / (1 << 20):.1f} MB "
+              f"({caminho})")
+
+
+if __name__ == '__main__':
+    main()
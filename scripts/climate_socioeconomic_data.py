@@ -1,98 +1,79 @@
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import requests
-from io import StringIO
+import argparse
 import os
 
-os.makedirs('/home/ubuntu/dados_complementares', exist_ok=True)
+import numpy as np
+import pandas as pd
+
+from geografia import CODIGOS_POR_NOME, ESTADOS, REGIOES, regiao_da_uf
+from graficos import VARIANTES, grafico, renderizar
+from rastreamento import etapa
+
+SAIDA = '/home/ubuntu/dados_complementares'
 
-def gerar_dados_climaticos():
+MESES = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+
+# perfis mensais de cada região (°C e mm)
+TEMP_BASE_REGIAO = {
+    'Norte': [27, 27, 27, 27, 26, 26, 26, 27, 28, 28, 28, 27],
+    'Nordeste': [28, 28, 28, 27, 26, 25, 25, 26, 27, 28, 28, 28],
+    'Centro-Oeste': [26, 26, 26, 25, 23, 22, 22, 24, 26, 27, 26, 26],
+    'Sudeste': [25, 25, 24, 23, 21, 20, 19, 21, 22, 23, 24, 25],
+    'Sul': [24, 24, 23, 20, 17, 15, 15, 16, 18, 20, 22, 23]
+}
+
+PRECIP_BASE_REGIAO = {
+    'Norte': [300, 300, 300, 250, 200, 100, 80, 60, 80, 150, 200, 250],
+    'Nordeste': [150, 180, 200, 180, 150, 100, 80, 30, 30, 50, 80, 100],
+    'Centro-Oeste': [250, 200, 180, 100, 50, 20, 10, 30, 80, 150, 200, 250],
+    'Sudeste': [200, 180, 150, 80, 50, 30, 30, 30, 80, 120, 150, 200],
+    'Sul': [150, 150, 150, 120, 100, 100, 100, 100, 150, 180, 150, 150]
+}
+
+REGIAO_POR_ESTADO = {estado: REGIOES[regiao_da_uf(CODIGOS_POR_NOME[estado])] for estado in ESTADOS}
+
+
+def gerar_cenarios_climaticos(n_cenarios, semente=None):
+    """
+    Gera `n_cenarios` realizações do clima simulado de uma vez, a partir dos
+    perfis regionais: cada estado recebe um desvio de temperatura e um fator
+    de chuva por cenário, mais um ruído por mês. `semente` é um inteiro ou um
+    np.random.Generator. Retorna (temperatura, precipitação), arrays
+    cenário × estado (na ordem de ESTADOS) × mês, com uma casa decimal.
+    """
+    rng = semente if isinstance(semente, np.random.Generator) else np.random.default_rng(semente)
+    regioes = [REGIAO_POR_ESTADO[estado] for estado in ESTADOS]
+    temp_base = np.array([TEMP_BASE_REGIAO[regiao] for regiao in regioes], dtype=float)
+    precip_base = np.array([PRECIP_BASE_REGIAO[regiao] for regiao in regioes], dtype=float)
+
+    forma = (n_cenarios, len(ESTADOS), len(MESES))
+    temp_var = rng.uniform(-1.5, 1.5, size=forma[:2] + (1,))
+    precip_var_factor = rng.uniform(0.8, 1.2, size=forma[:2] + (1,))
+    temperatura = temp_base + temp_var + rng.uniform(-0.5, 0.5, size=forma)
+    precipitacao = precip_base * precip_var_factor * rng.uniform(0.9, 1.1, size=forma)
+    return temperatura.round(1), precipitacao.round(1)
+
+
+def gerar_dados_climaticos(semente=None):
     """
     Gera dados simulados de temperatura e precipitação por estado
-    baseados em padrões climáticos conhecidos do Brasil.
+    baseados em padrões climáticos conhecidos do Brasil (um cenário de
+    gerar_cenarios_climaticos, como DataFrames estado × mês).
     """
-    
-    estados = [
-        'Acre', 'Alagoas', 'Amapá', 'Amazonas', 'Bahia', 'Ceará', 
-        'Distrito Federal', 'Espírito Santo', 'Goiás', 'Maranhão', 
-        'Mato Grosso', 'Mato Grosso do Sul', 'Minas Gerais', 'Pará', 
-        'Paraíba', 'Paraná', 'Pernambuco', 'Piauí', 'Rio de Janeiro', 
-        'Rio Grande do Norte', 'Rio Grande do Sul', 'Rondônia', 'Roraima', 
-        'Santa Catarina', 'São Paulo', 'Sergipe', 'Tocantins'
-    ]
-    
-    meses = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
-    
-    temp_base_regiao = {
-        'Norte': [27, 27, 27, 27, 26, 26, 26, 27, 28, 28, 28, 27],
-        'Nordeste': [28, 28, 28, 27, 26, 25, 25, 26, 27, 28, 28, 28],
-        'Centro-Oeste': [26, 26, 26, 25, 23, 22, 22, 24, 26, 27, 26, 26],
-        'Sudeste': [25, 25, 24, 23, 21, 20, 19, 21, 22, 23, 24, 25],
-        'Sul': [24, 24, 23, 20, 17, 15, 15, 16, 18, 20, 22, 23]
-    }
-    
-    precip_base_regiao = {
-        'Norte': [300, 300, 300, 250, 200, 100, 80, 60, 80, 150, 200, 250],
-        'Nordeste': [150, 180, 200, 180, 150, 100, 80, 30, 30, 50, 80, 100],
-        'Centro-Oeste': [250, 200, 180, 100, 50, 20, 10, 30, 80, 150, 200, 250],
-        'Sudeste': [200, 180, 150, 80, 50, 30, 30, 30, 80, 120, 150, 200],
-        'Sul': [150, 150, 150, 120, 100, 100, 100, 100, 150, 180, 150, 150]
-    }
-    
-    regiao_por_estado = {
-        'Acre': 'Norte', 'Amapá': 'Norte', 'Amazonas': 'Norte', 'Pará': 'Norte', 
-        'Rondônia': 'Norte', 'Roraima': 'Norte', 'Tocantins': 'Norte',
-        'Alagoas': 'Nordeste', 'Bahia': 'Nordeste', 'Ceará': 'Nordeste', 
-        'Maranhão': 'Nordeste', 'Paraíba': 'Nordeste', 'Pernambuco': 'Nordeste', 
-        'Piauí': 'Nordeste', 'Rio Grande do Norte': 'Nordeste', 'Sergipe': 'Nordeste',
-        'Distrito Federal': 'Centro-Oeste', 'Goiás': 'Centro-Oeste', 
-        'Mato Grosso': 'Centro-Oeste', 'Mato Grosso do Sul': 'Centro-Oeste',
-        'Espírito Santo': 'Sudeste', 'Minas Gerais': 'Sudeste', 
-        'Rio de Janeiro': 'Sudeste', 'São Paulo': 'Sudeste',
-        'Paraná': 'Sul', 'Rio Grande do Sul': 'Sul', 'Santa Catarina': 'Sul'
-    }
-    
-    df_temp = pd.DataFrame(index=estados, columns=meses)
-    df_precip = pd.DataFrame(index=estados, columns=meses)
-    
-    for estado in estados:
-        regiao = regiao_por_estado[estado]
-        
-        temp_var = np.random.uniform(-1.5, 1.5)
-        precip_var_factor = np.random.uniform(0.8, 1.2)
-        
-        for i, mes in enumerate(meses):
-            temp_base = temp_base_regiao[regiao][i]
-            df_temp.loc[estado, mes] = float(temp_base + temp_var + np.random.uniform(-0.5, 0.5))
-            
-            precip_base = precip_base_regiao[regiao][i]
-            df_precip.loc[estado, mes] = float(precip_base * precip_var_factor * np.random.uniform(0.9, 1.1))
-    
-    for col in meses:
-        df_temp[col] = df_temp[col].astype(float).round(1)
-        df_precip[col] = df_precip[col].astype(float).round(1)
-    
-    df_temp['Media_Anual'] = df_temp[meses].mean(axis=1).round(1)
-    df_precip['Total_Anual'] = df_precip[meses].sum(axis=1).round(1)
-    
+    temperatura, precipitacao = gerar_cenarios_climaticos(1, semente)
+    df_temp = pd.DataFrame(temperatura[0], index=ESTADOS, columns=MESES)
+    df_precip = pd.DataFrame(precipitacao[0], index=ESTADOS, columns=MESES)
+
+    df_temp['Media_Anual'] = df_temp[MESES].mean(axis=1).round(1)
+    df_precip['Total_Anual'] = df_precip[MESES].sum(axis=1).round(1)
+
     return df_temp, df_precip
 
+
 def gerar_dados_socioeconomicos():
     """
     Gera dados socioeconômicos simulados por estado baseados em
     estatísticas aproximadas do Brasil.
     """
-    estados = [
-        'Acre', 'Alagoas', 'Amapá', 'Amazonas', 'Bahia', 'Ceará', 
-        'Distrito Federal', 'Espírito Santo', 'Goiás', 'Maranhão', 
-        'Mato Grosso', 'Mato Grosso do Sul', 'Minas Gerais', 'Pará', 
-        'Paraíba', 'Paraná', 'Pernambuco', 'Piauí', 'Rio de Janeiro', 
-        'Rio Grande do Norte', 'Rio Grande do Sul', 'Rondônia', 'Roraima', 
-        'Santa Catarina', 'São Paulo', 'Sergipe', 'Tocantins'
-    ]
-    
     idh_aproximado = {
         'Distrito Federal': 0.850, 'São Paulo': 0.826, 'Santa Catarina': 0.808,
         'Rio de Janeiro': 0.796, 'Paraná': 0.792, 'Rio Grande do Sul': 0.787,
@@ -154,84 +135,70 @@ def gerar_dados_socioeconomicos():
     }
     
     df_socio = pd.DataFrame({
-        'UF': estados,
-        'IDH': [idh_aproximado[estado] for estado in estados],
-        'Renda_Per_Capita': [renda_aproximada[estado] for estado in estados],
-        'Taxa_Urbanizacao': [urbanizacao_aproximada[estado] for estado in estados],
-        'Acesso_Saneamento': [saneamento_aproximado[estado] for estado in estados],
-        'Densidade_Demografica': [densidade_aproximada[estado] for estado in estados]
+        'UF': ESTADOS,
+        'IDH': [idh_aproximado[estado] for estado in ESTADOS],
+        'Renda_Per_Capita': [renda_aproximada[estado] for estado in ESTADOS],
+        'Taxa_Urbanizacao': [urbanizacao_aproximada[estado] for estado in ESTADOS],
+        'Acesso_Saneamento': [saneamento_aproximado[estado] for estado in ESTADOS],
+        'Densidade_Demografica': [densidade_aproximada[estado] for estado in ESTADOS]
     })
     
     df_socio.set_index('UF', inplace=True)
     
     return df_socio
 
-print("Gerando dados climáticos simulados...")
-df_temp, df_precip = gerar_dados_climaticos()
-df_temp.to_csv('/home/ubuntu/dados_complementares/temperatura_media_por_estado.csv')
-df_precip.to_csv('/home/ubuntu/dados_complementares/precipitacao_por_estado.csv')
-
-print("Gerando dados socioeconômicos simulados...")
-df_socio = gerar_dados_socioeconomicos()
-df_socio.to_csv('/home/ubuntu/dados_complementares/dados_socioeconomicos_por_estado.csv')
-
-print("Carregando dados de dengue...")
-df_dengue = pd.read_csv('/home/ubuntu/dengue_data_raw.csv')
-
-print("Criando visualizações exploratórias...")
-
-plt.figure(figsize=(14, 10))
-sns.heatmap(df_temp.iloc[:, :-1].astype(float), annot=False, cmap='YlOrRd', 
-            linewidths=0.5)
-plt.title('Temperatura Média por Estado e Mês (°C)', fontsize=16)
-plt.xlabel('Mês', fontsize=12)
-plt.ylabel('Estado', fontsize=12)
-plt.tight_layout()
-plt.savefig('/home/ubuntu/dados_complementares/heatmap_temperatura.png', dpi=300)
-
-plt.figure(figsize=(14, 10))
-sns.heatmap(df_precip.iloc[:, :-1].astype(float), annot=False, cmap='Blues', 
-            linewidths=0.5)
-plt.title('Precipitação por Estado e Mês (mm)', fontsize=16)
-plt.xlabel('Mês', fontsize=12)
-plt.ylabel('Estado', fontsize=12)
-plt.tight_layout()
-plt.savefig('/home/ubuntu/dados_complementares/heatmap_precipitacao.png', dpi=300)
-
-plt.figure(figsize=(14, 8))
-df_socio.sort_values('IDH', ascending=False).IDH.plot(kind='bar', color='teal')
-plt.title('Índice de Desenvolvimento Humano (IDH) por Estado', fontsize=16)
-plt.xlabel('Estado', fontsize=12)
-plt.ylabel('IDH', fontsize=12)
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('/home/ubuntu/dados_complementares/idh_por_estado.png', dpi=300)
-
-plt.figure(figsize=(14, 8))
-df_socio.sort_values('Renda_Per_Capita', ascending=False).Renda_Per_Capita.plot(kind='bar', color='darkgreen')
-plt.title('Renda Per Capita por Estado (R$)', fontsize=16)
-plt.xlabel('Estado', fontsize=12)
-plt.ylabel('Renda Per Capita (R$)', fontsize=12)
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('/home/ubuntu/dados_complementares/renda_por_estado.png', dpi=300)
-
-plt.figure(figsize=(14, 8))
-df_socio.sort_values('Taxa_Urbanizacao', ascending=False).Taxa_Urbanizacao.plot(kind='bar', color='purple')
-plt.title('Taxa de Urbanização por Estado (%)', fontsize=16)
-plt.xlabel('Estado', fontsize=12)
-plt.ylabel('Taxa de Urbanização (%)', fontsize=12)
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('/home/ubuntu/dados_complementares/urbanizacao_por_estado.png', dpi=300)
-
-plt.figure(figsize=(14, 8))
-df_socio.sort_values('Acesso_Saneamento', ascending=False).Acesso_Saneamento.plot(kind='bar', color='brown')
-plt.title('Acesso a Saneamento Básico por Estado (%)', fontsize=16)
-plt.xlabel('Estado', fontsize=12)
-plt.ylabel('Acesso a Saneamento (%)', fontsize=12)
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('/home/ubuntu/dados_complementares/saneamento_por_estado.png', dpi=300)
-
-print("Dados e visualizações gerados com sucesso!")
+
+def especificar_graficos(df_temp, df_precip, df_socio, saida=SAIDA):
+    """Especificações (graficos.grafico) dos mapas de calor do clima e das barras das covariáveis por estado."""
+    specs = [
+        grafico('mapa_calor', os.path.join(saida, arquivo), df[MESES].to_numpy(dtype=float), titulo, 'Mês', 'Estado',
+                tamanho=(14, 10), linhas=list(df.index), colunas=MESES, cmap=cmap, separar=True)
+        for df, arquivo, titulo, cmap in (
+            (df_temp, 'heatmap_temperatura.png', 'Temperatura Média por Estado e Mês (°C)', 'YlOrRd'),
+            (df_precip, 'heatmap_precipitacao.png', 'Precipitação por Estado e Mês (mm)', 'Blues'))
+    ]
+    for coluna, arquivo, titulo, ylabel, cor in (
+            ('IDH', 'idh_por_estado.png', 'Índice de Desenvolvimento Humano (IDH) por Estado', 'IDH', 'teal'),
+            ('Renda_Per_Capita', 'renda_por_estado.png', 'Renda Per Capita por Estado (R$)',
+             'Renda Per Capita (R$)', 'darkgreen'),
+            ('Taxa_Urbanizacao', 'urbanizacao_por_estado.png', 'Taxa de Urbanização por Estado (%)',
+             'Taxa de Urbanização (%)', 'purple'),
+            ('Acesso_Saneamento', 'saneamento_por_estado.png', 'Acesso a Saneamento Básico por Estado (%)',
+             'Acesso a Saneamento (%)', 'brown')):
+        specs.append(grafico('barras', os.path.join(saida, arquivo),
+                             df_socio[coluna].sort_values(ascending=False).to_dict(), titulo, 'Estado', ylabel,
+                             tamanho=(14, 8), cor=cor, rotacao=90, grade='y'))
+    return specs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Gera os dados climáticos e socioeconômicos simulados por estado.')
+    parser.add_argument('--semente', type=int, default=42, help='semente do gerador de clima')
+    parser.add_argument('--processos', type=int, default=None, help='processos de desenho (padrão: número de CPUs)')
+    parser.add_argument('--variantes', nargs='*', choices=list(VARIANTES), default=list(VARIANTES),
+                        help='versões gravadas ao lado de cada PNG (padrão: todas; sem valores, só o PNG)')
+    args = parser.parse_args(argv)
+
+    os.makedirs(SAIDA, exist_ok=True)
+
+    print("Gerando dados climáticos simulados...")
+    with etapa('dados_climaticos', linhas=len(ESTADOS)):
+        df_temp, df_precip = gerar_dados_climaticos(args.semente)
+        df_temp.to_csv(os.path.join(SAIDA, 'temperatura_media_por_estado.csv'))
+        df_precip.to_csv(os.path.join(SAIDA, 'precipitacao_por_estado.csv'))
+
+    print("Gerando dados socioeconômicos simulados...")
+    with etapa('dados_socioeconomicos', linhas=len(ESTADOS)):
+        df_socio = gerar_dados_socioeconomicos()
+        df_socio.to_csv(os.path.join(SAIDA, 'dados_socioeconomicos_por_estado.csv'))
+
+    print("Criando visualizações exploratórias...")
+    specs = especificar_graficos(df_temp, df_precip, df_socio)
+    with etapa('graficos_exploratorios', linhas=len(specs), processos=args.processos):
+        renderizar(specs, args.processos, variantes=args.variantes)
+
+    print("Dados e visualizações gerados com sucesso!")
+
+
+if __name__ == '__main__':
+    main()
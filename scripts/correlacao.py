@@ -0,0 +1,237 @@
+import concurrent.futures
+import os
+
+import numpy as np
+import pandas as pd
+
+# resolução dos histogramas de correlações reamostradas (quantis com erro <= 1e-3)
+N_CLASSES = 2001
+TAMANHO_LOTE = 1000  # reamostragens por tarefa; cada lote tem sua própria semente
+LIMITE_ELEMENTOS = 1 << 22  # elementos de (reamostragens × n × p) em memória de cada vez
+
+
+def postos(valores, eixo=0, densos=False):
+    """
+    Postos de `valores` ao longo de `eixo`, como scipy.stats.rankdata: médios
+    nos empates (de 1 a n) ou, com `densos=True`, densos (1, 2, ...). Feito só
+    com NumPy, para não carregar o scipy.stats, que sozinho custa mais de um
+    segundo de importação.
+    """
+    valores = np.moveaxis(np.asarray(valores, dtype=float), eixo, -1)
+    ordem = np.argsort(valores, axis=-1, kind='stable')
+    ordenados = np.take_along_axis(valores, ordem, axis=-1)
+    n = ordenados.shape[-1]
+    inicia = np.ones(ordenados.shape, dtype=bool)  # primeiro de cada grupo de empatados
+    inicia[..., 1:] = ordenados[..., 1:] != ordenados[..., :-1]
+    if densos:
+        postos_ordenados = inicia.cumsum(axis=-1).astype(float)
+    else:
+        termina = np.ones(ordenados.shape, dtype=bool)
+        termina[..., :-1] = inicia[..., 1:]
+        posicao = np.broadcast_to(np.arange(n), ordenados.shape)
+        primeiro = np.maximum.accumulate(np.where(inicia, posicao, 0), axis=-1)
+        ultimo = np.flip(np.minimum.accumulate(np.flip(np.where(termina, posicao, n - 1), -1), axis=-1), -1)
+        postos_ordenados = (primeiro + ultimo) / 2 + 1
+    resultado = np.empty(ordenados.shape)
+    np.put_along_axis(resultado, ordem, postos_ordenados, axis=-1)
+    return np.moveaxis(resultado, -1, eixo)
+
+
+def _padronizar(valores):
+    """Centra e escala as colunas (eixo -2) para que Z^T Z / n seja a correlação."""
+    centrado = valores - valores.mean(axis=-2, keepdims=True)
+    desvio = np.sqrt((centrado ** 2).mean(axis=-2, keepdims=True))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return centrado / desvio
+
+
+def _correlacao(valores):
+    z = _padronizar(valores)
+    return np.clip(np.swapaxes(z, -1, -2) @ z / valores.shape[-2], -1, 1)
+
+
+def _preparar(df, metodo):
+    if metodo not in ('spearman', 'pearson'):
+        raise ValueError(f"método desconhecido: {metodo}")
+    completo = df.dropna()
+    if len(completo) < len(df):
+        print(f"Correlação: {len(df) - len(completo)} linha(s) com valores ausentes descartadas")
+    valores = completo.to_numpy(dtype=float)
+    if metodo == 'spearman':
+        valores = postos(valores)
+    return valores
+
+
+def matriz_correlacao(df, metodo='spearman'):
+    """
+    Matriz de correlação de Spearman ou Pearson entre as colunas de `df`,
+    com cada coluna posta em postos uma única vez e a matriz inteira saindo
+    de um produto matricial. Linhas com valores ausentes são descartadas.
+    """
+    valores = _preparar(df, metodo)
+    return pd.DataFrame(_correlacao(valores), index=df.columns, columns=df.columns)
+
+
+def correlacao_em_lote(x, y, metodo='spearman'):
+    """
+    Correlação de cada linha de `x` (cenários × unidades) com o vetor `y`
+    (unidades), numa única operação vetorizada. Retorna um array por cenário.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if metodo == 'spearman':
+        x = postos(x, eixo=1)
+        y = postos(y)
+    elif metodo != 'pearson':
+        raise ValueError(f"método desconhecido: {metodo}")
+    zx = _padronizar(x[..., None])[..., 0]
+    zy = _padronizar(y[:, None])[:, 0]
+    return np.clip(zx @ zy / len(y), -1, 1)
+
+
+def correlacao_defasada(clima, casos, max_defasagem=3, circular=True):
+    """
+    Correlação cruzada entre duas tabelas UF × mês (clima e casos) para as
+    defasagens 0..max_defasagem, com o clima antecedendo os casos: na
+    defasagem l, o clima do mês t é comparado aos casos do mês t + l.
+    Todas as UFs são calculadas juntas. Com `circular=True` (meses de um
+    ciclo anual médio) dezembro antecede janeiro e a correlação sai de uma
+    FFT; sem isso, cada defasagem usa só os meses sobrepostos.
+
+    Retorna um DataFrame defasagem × UF, com as UFs presentes nas duas tabelas.
+    """
+    ufs = clima.index.intersection(casos.index, sort=False)
+    meses = clima.columns.intersection(casos.columns, sort=False)
+    x = clima.loc[ufs, meses].to_numpy(dtype=float)
+    y = casos.loc[ufs, meses].to_numpy(dtype=float)
+    n = x.shape[1]
+    if not 0 <= max_defasagem < n:
+        raise ValueError(f"defasagem máxima deve estar entre 0 e {n - 1}")
+
+    if circular:
+        zx = _padronizar(x.T).T
+        zy = _padronizar(y.T).T
+        cruzada = np.fft.irfft(np.conj(np.fft.rfft(zx, axis=1)) * np.fft.rfft(zy, axis=1), n=n, axis=1) / n
+        grade = cruzada[:, :max_defasagem + 1].T
+    else:
+        grade = np.empty((max_defasagem + 1, len(ufs)))
+        for defasagem in range(max_defasagem + 1):
+            # (meses sobrepostos × UFs): uma correlação por coluna
+            zx = _padronizar(x[:, :n - defasagem].T)
+            zy = _padronizar(y[:, defasagem:].T)
+            grade[defasagem] = (zx * zy).mean(axis=0)
+
+    return pd.DataFrame(np.clip(grade, -1, 1), index=pd.RangeIndex(max_defasagem + 1, name='Defasagem'),
+                        columns=ufs)
+
+
+def _postos_reamostrados(niveis, indices):
+    """
+    Postos médios de cada coluna dentro de cada reamostragem, sem reordenar:
+    como os valores reamostrados são repetições dos originais, basta contar
+    quantas vezes cada nível (posto denso original) aparece. `niveis` é
+    (n, p), `indices` é (b, n); retorna (b, n, p).
+    """
+    b, n = indices.shape
+    p = niveis.shape[1]
+    reamostrados = niveis[indices]  # (b, n, p)
+    deslocamento = (np.arange(b)[:, None, None] * p + np.arange(p)[None, None, :]) * n
+    contagens = np.bincount((reamostrados + deslocamento).ravel(), minlength=b * p * n).reshape(b, p, n)
+    acumulado = contagens.cumsum(axis=2)
+    medios = acumulado - (contagens - 1) / 2.0  # posto médio de cada nível
+    return np.take_along_axis(medios, np.swapaxes(reamostrados, 1, 2), axis=2).swapaxes(1, 2)
+
+
+def _lote(valores, niveis, observada, n_bootstrap, n_permutacoes, semente):
+    """
+    Um lote de reamostragens: histograma das correlações bootstrap de cada
+    par (triângulo superior) e quantas permutações igualaram ou superaram a
+    correlação observada em módulo.
+    """
+    rng = np.random.default_rng(semente)
+    n, p = valores.shape
+    linhas, colunas = np.triu_indices(p, k=1)
+    histogramas = np.zeros((len(linhas), N_CLASSES), dtype=np.int64)
+    extremos = np.zeros(len(linhas), dtype=np.int64)
+
+    passo = max(1, LIMITE_ELEMENTOS // (n * p))
+    for inicio in range(0, n_bootstrap, passo):
+        indices = rng.integers(0, n, size=(min(passo, n_bootstrap - inicio), n))
+        amostras = _postos_reamostrados(niveis, indices) if niveis is not None else valores[indices]
+        r = _correlacao(amostras)[:, linhas, colunas]  # (b, pares)
+        validas = ~np.isnan(r)
+        classes = np.rint((np.where(validas, r, 0) + 1) / 2 * (N_CLASSES - 1)).astype(np.int64)
+        pares = np.broadcast_to(np.arange(len(linhas)), r.shape)
+        histogramas += np.bincount((pares * N_CLASSES + classes)[validas],
+                                   minlength=len(linhas) * N_CLASSES).reshape(len(linhas), N_CLASSES)
+
+    limiar = np.abs(observada[linhas, colunas]) - 1e-12
+    for inicio in range(0, n_permutacoes, passo):
+        m = min(passo, n_permutacoes - inicio)
+        # cada coluna embaralhada de forma independente: hipótese nula para todos os pares
+        permutacoes = rng.permuted(np.broadcast_to(np.arange(n)[:, None], (m, n, p)), axis=1)
+        amostras = np.take_along_axis(np.broadcast_to(valores, (m, n, p)), permutacoes, axis=1)
+        r = _correlacao(amostras)[:, linhas, colunas]
+        extremos += (np.abs(r) >= limiar).sum(axis=0)
+
+    return histogramas, extremos
+
+
+def _quantil(histogramas, q):
+    acumulado = histogramas.cumsum(axis=1)
+    total = acumulado[:, -1:]
+    classe = (acumulado >= q * total).argmax(axis=1)
+    return np.where(total[:, 0] > 0, classe / (N_CLASSES - 1) * 2 - 1, np.nan)
+
+
+def inferencia_correlacao(df, metodo='spearman', n_bootstrap=10000, n_permutacoes=10000, nivel=0.95,
+                          semente=42, processos=None):
+    """
+    Correlação de cada par de colunas com intervalo de confiança bootstrap
+    (percentil) e p-valor de permutação bicaudal. As reamostragens são
+    geradas em lotes como arrays de índices e distribuídas entre processos;
+    o resultado só depende da semente, não do número de processos.
+
+    Retorna um DataFrame com uma linha por par: Variavel_1, Variavel_2, r,
+    IC_inf, IC_sup e p_permutacao.
+    """
+    valores = _preparar(df, metodo)
+    niveis = None
+    if metodo == 'spearman':
+        # postos densos 0..k-1 de cada coluna, para re-postar as reamostragens por contagem
+        niveis = (postos(valores, densos=True) - 1).astype(np.int64)
+    observada = _correlacao(valores)
+
+    n_lotes = max(-(-n_bootstrap // TAMANHO_LOTE), -(-n_permutacoes // TAMANHO_LOTE), 1)
+    sementes = np.random.SeedSequence(semente).spawn(n_lotes)
+    tarefas = []
+    for i, semente_lote in enumerate(sementes):
+        b = min(TAMANHO_LOTE, max(n_bootstrap - i * TAMANHO_LOTE, 0))
+        m = min(TAMANHO_LOTE, max(n_permutacoes - i * TAMANHO_LOTE, 0))
+        tarefas.append((valores, niveis, observada, b, m, semente_lote))
+
+    p = valores.shape[1]
+    linhas, colunas = np.triu_indices(p, k=1)
+    histogramas = np.zeros((len(linhas), N_CLASSES), dtype=np.int64)
+    extremos = np.zeros(len(linhas), dtype=np.int64)
+    processos = min(processos or os.cpu_count() or 1, n_lotes)
+    if processos == 1:
+        for parcial_h, parcial_e in (_lote(*tarefa) for tarefa in tarefas):
+            histogramas += parcial_h
+            extremos += parcial_e
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processos) as executor:
+            for parcial_h, parcial_e in executor.map(_lote, *zip(*tarefas)):
+                histogramas += parcial_h
+                extremos += parcial_e
+
+    alfa = (1 - nivel) / 2
+    nomes = np.asarray(df.columns)
+    return pd.DataFrame({
+        'Variavel_1': nomes[linhas],
+        'Variavel_2': nomes[colunas],
+        'r': observada[linhas, colunas],
+        'IC_inf': _quantil(histogramas, alfa) if n_bootstrap else np.nan,
+        'IC_sup': _quantil(histogramas, 1 - alfa) if n_bootstrap else np.nan,
+        'p_permutacao': (extremos + 1) / (n_permutacoes + 1) if n_permutacoes else np.nan,
+    })
@@ -1,214 +1,175 @@
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy.stats import pearsonr, spearmanr
+import argparse
 import os
 
-plt.rcParams['font.family'] = 'DejaVu Sans'
-plt.rcParams['axes.unicode_minus'] = False
-
-os.makedirs('/home/ubuntu/analise_correlacao', exist_ok=True)
-
-print("Carregando dados...")
-df_dengue = pd.read_csv('/home/ubuntu/dengue_data_raw.csv')
-
-df_temp = pd.read_csv('/home/ubuntu/dados_complementares/temperatura_media_por_estado.csv', index_col=0)
-df_precip = pd.read_csv('/home/ubuntu/dados_complementares/precipitacao_por_estado.csv', index_col=0)
-
-df_socio = pd.read_csv('/home/ubuntu/dados_complementares/dados_socioeconomicos_por_estado.csv', index_col=0)
-
-print("Preparando dados para correlação...")
-df_dengue_estados = df_dengue[(df_dengue['UF_Notificacao'] != 'TOTAL') & 
-                             (df_dengue['UF_Notificacao'] != 'Ignorado/exterior')]
-
-mapeamento_estados = {
-    'Acre': 'Acre',
-    'Alagoas': 'Alagoas',
-    'Amapá': 'Amapá',
-    'Amazonas': 'Amazonas',
-    'Bahia': 'Bahia',
-    'Ceará': 'Ceará',
-    'Distrito Federal': 'Distrito Federal',
-    'Espírito Santo': 'Espírito Santo',
-    'Goiás': 'Goiás',
-    'Maranhão': 'Maranhão',
-    'Mato Grosso': 'Mato Grosso',
-    'Mato Grosso do Sul': 'Mato Grosso do Sul',
-    'Minas Gerais': 'Minas Gerais',
-    'Pará': 'Pará',
-    'Paraíba': 'Paraíba',
-    'Paraná': 'Paraná',
-    'Pernambuco': 'Pernambuco',
-    'Piauí': 'Piauí',
-    'Rio de Janeiro': 'Rio de Janeiro',
-    'Rio Grande do Norte': 'Rio Grande do Norte',
-    'Rio Grande do Sul': 'Rio Grande do Sul',
-    'Rondônia': 'Rondônia',
-    'Roraima': 'Roraima',
-    'Santa Catarina': 'Santa Catarina',
-    'São Paulo': 'São Paulo',
-    'Sergipe': 'Sergipe',
-    'Tocantins': 'Tocantins'
-}
+import numpy as np
+import pandas as pd
+
+from climate_socioeconomic_data import ESTADOS, gerar_cenarios_climaticos
+from cubo_casos import ANO_PADRAO, abrir_cubo, carregar_casos
+from correlacao import correlacao_defasada, correlacao_em_lote, inferencia_correlacao, matriz_correlacao
+from dispersoes import especificar_dispersoes
+from geografia import CODIGOS_POR_NOME
+from graficos import VARIANTES, grafico, renderizar
+from juncao import carregar_covariaveis, juntar
+from populacao import carregar_populacao, juntar_rotulos
+from rastreamento import etapa
+
+SAIDA = '/home/ubuntu/analise_correlacao'
 
 meses = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
-df_dengue_estados['Total_Calculado'] = df_dengue_estados[meses].sum(axis=1)
-
-df_correlacao = pd.DataFrame(index=df_dengue_estados['UF_Notificacao'])
-df_correlacao['Total_Casos'] = df_dengue_estados['Total_Calculado'].values
-
-for estado in df_correlacao.index:
-    if estado in df_temp.index:
-        df_correlacao.loc[estado, 'Temperatura_Media'] = df_temp.loc[estado, 'Media_Anual']
-        df_correlacao.loc[estado, 'Precipitacao_Total'] = df_precip.loc[estado, 'Total_Anual']
-
-for estado in df_correlacao.index:
-    if estado in df_socio.index:
-        df_correlacao.loc[estado, 'IDH'] = df_socio.loc[estado, 'IDH']
-        df_correlacao.loc[estado, 'Renda_Per_Capita'] = df_socio.loc[estado, 'Renda_Per_Capita']
-        df_correlacao.loc[estado, 'Taxa_Urbanizacao'] = df_socio.loc[estado, 'Taxa_Urbanizacao']
-        df_correlacao.loc[estado, 'Acesso_Saneamento'] = df_socio.loc[estado, 'Acesso_Saneamento']
-        df_correlacao.loc[estado, 'Densidade_Demografica'] = df_socio.loc[estado, 'Densidade_Demografica']
-
-df_correlacao['Casos_por_100k'] = df_correlacao['Total_Casos'] / df_correlacao['Densidade_Demografica'] * 100
-
-df_correlacao.to_csv('/home/ubuntu/analise_correlacao/dados_correlacao.csv')
-
-print("Calculando correlações...")
-matriz_corr = df_correlacao.corr(method='spearman')
-matriz_corr.to_csv('/home/ubuntu/analise_correlacao/matriz_correlacao.csv')
-
-print("Criando visualizações de correlação...")
-
-plt.figure(figsize=(12, 10))
-sns.heatmap(matriz_corr, annot=True, cmap='coolwarm', vmin=-1, vmax=1, 
-            linewidths=0.5, fmt=".2f", square=True)
-plt.title('Matriz de Correlação entre Variáveis', fontsize=16)
-plt.tight_layout()
-plt.savefig('/home/ubuntu/analise_correlacao/matriz_correlacao.png', dpi=300)
-
-plt.figure(figsize=(10, 8))
-sns.scatterplot(x='Temperatura_Media', y='Casos_por_100k', data=df_correlacao, 
-                s=100, alpha=0.7)
-
-sns.regplot(x='Temperatura_Media', y='Casos_por_100k', data=df_correlacao, 
-            scatter=False, ci=None, line_kws={"color": "red"})
-
-for i, txt in enumerate(df_correlacao.index):
-    plt.annotate(txt, (df_correlacao['Temperatura_Media'].iloc[i], 
-                      df_correlacao['Casos_por_100k'].iloc[i]),
-                fontsize=8)
-
-plt.title('Relação entre Temperatura Média e Casos de Dengue por 100 mil habitantes', fontsize=14)
-plt.xlabel('Temperatura Média Anual (°C)', fontsize=12)
-plt.ylabel('Casos de Dengue por 100 mil habitantes', fontsize=12)
-plt.grid(True, linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('/home/ubuntu/analise_correlacao/temp_vs_dengue.png', dpi=300)
-
-plt.figure(figsize=(10, 8))
-sns.scatterplot(x='Precipitacao_Total', y='Casos_por_100k', data=df_correlacao, 
-                s=100, alpha=0.7)
-
-sns.regplot(x='Precipitacao_Total', y='Casos_por_100k', data=df_correlacao, 
-            scatter=False, ci=None, line_kws={"color": "red"})
-
-for i, txt in enumerate(df_correlacao.index):
-    plt.annotate(txt, (df_correlacao['Precipitacao_Total'].iloc[i], 
-                      df_correlacao['Casos_por_100k'].iloc[i]),
-                fontsize=8)
-
-plt.title('Relação entre Precipitação Total e Casos de Dengue por 100 mil habitantes', fontsize=14)
-plt.xlabel('Precipitação Total Anual (mm)', fontsize=12)
-plt.ylabel('Casos de Dengue por 100 mil habitantes', fontsize=12)
-plt.grid(True, linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('/home/ubuntu/analise_correlacao/precip_vs_dengue.png', dpi=300)
-
-plt.figure(figsize=(10, 8))
-sns.scatterplot(x='IDH', y='Casos_por_100k', data=df_correlacao, 
-                s=100, alpha=0.7)
-
-sns.regplot(x='IDH', y='Casos_por_100k', data=df_correlacao, 
-            scatter=False, ci=None, line_kws={"color": "red"})
-
-for i, txt in enumerate(df_correlacao.index):
-    plt.annotate(txt, (df_correlacao['IDH'].iloc[i], 
-                      df_correlacao['Casos_por_100k'].iloc[i]),
-                fontsize=8)
-
-plt.title('Relação entre IDH e Casos de Dengue por 100 mil habitantes', fontsize=14)
-plt.xlabel('Índice de Desenvolvimento Humano (IDH)', fontsize=12)
-plt.ylabel('Casos de Dengue por 100 mil habitantes', fontsize=12)
-plt.grid(True, linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('/home/ubuntu/analise_correlacao/idh_vs_dengue.png', dpi=300)
-
-plt.figure(figsize=(10, 8))
-sns.scatterplot(x='Acesso_Saneamento', y='Casos_por_100k', data=df_correlacao, 
-                s=100, alpha=0.7)
-
-sns.regplot(x='Acesso_Saneamento', y='Casos_por_100k', data=df_correlacao, 
-            scatter=False, ci=None, line_kws={"color": "red"})
-
-for i, txt in enumerate(df_correlacao.index):
-    plt.annotate(txt, (df_correlacao['Acesso_Saneamento'].iloc[i], 
-                      df_correlacao['Casos_por_100k'].iloc[i]),
-                fontsize=8)
-
-plt.title('Relação entre Acesso a Saneamento e Casos de Dengue por 100 mil habitantes', fontsize=14)
-plt.xlabel('Acesso a Saneamento Básico (%)', fontsize=12)
-plt.ylabel('Casos de Dengue por 100 mil habitantes', fontsize=12)
-plt.grid(True, linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('/home/ubuntu/analise_correlacao/saneamento_vs_dengue.png', dpi=300)
-
-plt.figure(figsize=(10, 8))
-sns.scatterplot(x='Taxa_Urbanizacao', y='Casos_por_100k', data=df_correlacao, 
-                s=100, alpha=0.7)
-
-sns.regplot(x='Taxa_Urbanizacao', y='Casos_por_100k', data=df_correlacao, 
-            scatter=False, ci=None, line_kws={"color": "red"})
-
-for i, txt in enumerate(df_correlacao.index):
-    plt.annotate(txt, (df_correlacao['Taxa_Urbanizacao'].iloc[i], 
-                      df_correlacao['Casos_por_100k'].iloc[i]),
-                fontsize=8)
-
-plt.title('Relação entre Taxa de Urbanização e Casos de Dengue por 100 mil habitantes', fontsize=14)
-plt.xlabel('Taxa de Urbanização (%)', fontsize=12)
-plt.ylabel('Casos de Dengue por 100 mil habitantes', fontsize=12)
-plt.grid(True, linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('/home/ubuntu/analise_correlacao/urbanizacao_vs_dengue.png', dpi=300)
-
-fig = plt.figure(figsize=(12, 10))
-ax = fig.add_subplot(111, projection='3d')
-
-scatter = ax.scatter(df_correlacao['Temperatura_Media'], 
-                    df_correlacao['Acesso_Saneamento'], 
-                    df_correlacao['Casos_por_100k'],
-                    c=df_correlacao['Casos_por_100k'], 
-                    cmap='viridis', 
-                    s=100, 
-                    alpha=0.7)
-
-for i, txt in enumerate(df_correlacao.index):
-    ax.text(df_correlacao['Temperatura_Media'].iloc[i], 
-           df_correlacao['Acesso_Saneamento'].iloc[i], 
-           df_correlacao['Casos_por_100k'].iloc[i], 
-           txt, fontsize=8)
-
-ax.set_xlabel('Temperatura Média Anual (°C)', fontsize=12)
-ax.set_ylabel('Acesso a Saneamento (%)', fontsize=12)
-ax.set_zlabel('Casos de Dengue por 100 mil habitantes', fontsize=12)
-plt.title('Análise Multivariada: Temperatura, Saneamento e Casos de Dengue', fontsize=14)
-
-cbar = plt.colorbar(scatter)
-cbar.set_label('Casos de Dengue por 100 mil habitantes', fontsize=10)
-
-plt.tight_layout()
-plt.savefig('/home/ubuntu/analise_correlacao/analise_multivariada.png', dpi=300)
-
-print("Análise de correlação concluída com sucesso!")
+
+# tabelas mensais (UF × mês) comparadas aos casos mensais com defasagem
+CLIMA_MENSAL = {
+    'temperatura': '/home/ubuntu/dados_complementares/temperatura_media_por_estado.csv',
+    'precipitacao': '/home/ubuntu/dados_complementares/precipitacao_por_estado.csv',
+}
+
+# (coluna, rótulo do eixo, título e arquivo) dos gráficos de dispersão contra Casos_por_100k
+DISPERSOES = [
+    ('Temperatura_Media', 'Temperatura Média Anual (°C)', 'Temperatura Média', 'temp_vs_dengue.png'),
+    ('Precipitacao_Total', 'Precipitação Total Anual (mm)', 'Precipitação Total', 'precip_vs_dengue.png'),
+    ('IDH', 'Índice de Desenvolvimento Humano (IDH)', 'IDH', 'idh_vs_dengue.png'),
+    ('Acesso_Saneamento', 'Acesso a Saneamento Básico (%)', 'Acesso a Saneamento', 'saneamento_vs_dengue.png'),
+    ('Taxa_Urbanizacao', 'Taxa de Urbanização (%)', 'Taxa de Urbanização', 'urbanizacao_vs_dengue.png'),
+]
+
+
+def montar_dados_correlacao(df_dengue, covariaveis, anos=(ANO_PADRAO,)):
+    """
+    Total de casos de cada estado (tabela no esquema de dengue_data_raw.csv,
+    somados os `anos` do cubo) junto às covariáveis, e a incidência no período.
+    """
+    df_dengue_estados = df_dengue[(df_dengue['UF_Notificacao'] != 'TOTAL') & 
+                                 (df_dengue['UF_Notificacao'] != 'Ignorado/exterior')]
+
+    df_dengue_estados['Total_Calculado'] = df_dengue_estados[meses].sum(axis=1)
+
+    df_correlacao = pd.DataFrame(index=df_dengue_estados['UF_Notificacao'])
+    df_correlacao['Total_Casos'] = df_dengue_estados['Total_Calculado'].values
+    df_correlacao, _ = juntar(df_correlacao, covariaveis)
+
+    # casos no período por 100 mil habitantes (população média dos anos cobertos)
+    codigos = [CODIGOS_POR_NOME[uf] for uf in df_correlacao.index]
+    df_correlacao['Casos_por_100k'] = carregar_populacao().incidencia(
+        df_correlacao[['Total_Casos']].to_numpy(), 'uf', [juntar_rotulos(anos)], codigos)[:, 0]
+    return df_correlacao
+
+
+def preparar_dados():
+    """Junta casos, clima e dados socioeconômicos por estado e calcula a matriz de correlação."""
+    print("Carregando dados...")
+    df_dengue = carregar_casos()
+
+    covariaveis = carregar_covariaveis()
+
+    print("Preparando dados para correlação...")
+    df_correlacao = montar_dados_correlacao(df_dengue, covariaveis, abrir_cubo().anos)
+
+    df_correlacao.to_csv(os.path.join(SAIDA, 'dados_correlacao.csv'))
+
+    print("Calculando correlações...")
+    matriz_corr = matriz_correlacao(df_correlacao)
+    matriz_corr.to_csv(os.path.join(SAIDA, 'matriz_correlacao.csv'))
+
+    return df_correlacao, matriz_corr
+
+
+def sensibilidade_temperatura(df_correlacao, n_cenarios, semente=None):
+    """
+    Correlação de Spearman entre temperatura média anual e casos por 100 mil
+    habitantes em `n_cenarios` realizações do clima simulado, para ver se o
+    sinal observado se mantém. Retorna um valor por cenário.
+    """
+    temperatura, _ = gerar_cenarios_climaticos(n_cenarios, semente)
+    media_anual = temperatura.mean(axis=2).round(1)
+    posicoes = [ESTADOS.index(estado) for estado in df_correlacao.index]
+    return correlacao_em_lote(media_anual[:, posicoes], df_correlacao['Casos_por_100k'])
+
+
+def correlacoes_defasadas(max_defasagem=3):
+    """
+    Correlação cruzada entre cada tabela de CLIMA_MENSAL e os casos mensais
+    de cada UF, nas defasagens 0..max_defasagem (clima antes dos casos).
+    Retorna {variável: DataFrame defasagem × UF}.
+    """
+    df_dengue = carregar_casos()
+    casos = df_dengue[~df_dengue['UF_Notificacao'].isin(['TOTAL', 'Ignorado/exterior'])].set_index('UF_Notificacao')[meses]
+    return {nome: correlacao_defasada(pd.read_csv(arquivo, index_col=0)[meses], casos, max_defasagem)
+            for nome, arquivo in CLIMA_MENSAL.items()}
+
+
+def especificar_graficos(df_correlacao, matriz_corr, defasadas=None, saida=SAIDA):
+    """Especificações da matriz de correlação, das dispersões, da análise multivariada e das defasagens."""
+    specs = [
+        grafico('mapa_calor', os.path.join(saida, 'matriz_correlacao.png'), matriz_corr,
+                'Matriz de Correlação entre Variáveis', tamanho=(12, 10),
+                cmap='coolwarm', anotar=True, formato='.2f', vmin=-1, vmax=1, quadrado=True),
+    ]
+    specs += especificar_dispersoes([(os.path.join(saida, arquivo),
+                                      f'Relação entre {nome} e Casos de Dengue por 100 mil habitantes',
+                                      df_correlacao, coluna, rotulo)
+                                     for coluna, rotulo, nome, arquivo in DISPERSOES])
+    specs.append(grafico('dispersao_3d', os.path.join(saida, 'analise_multivariada.png'), df_correlacao,
+                         'Análise Multivariada: Temperatura, Saneamento e Casos de Dengue',
+                         'Temperatura Média Anual (°C)', 'Acesso a Saneamento (%)', tamanho=(12, 10),
+                         tamanho_titulo=14, x='Temperatura_Media', y='Acesso_Saneamento', z='Casos_por_100k',
+                         zlabel='Casos de Dengue por 100 mil habitantes'))
+    titulos = {'temperatura': 'Temperatura', 'precipitacao': 'Precipitação'}
+    for nome, grade in (defasadas or {}).items():
+        specs.append(grafico('mapa_calor', os.path.join(saida, f'defasagem_{nome}.png'), grade.to_numpy(),
+                             f'Correlação entre {titulos.get(nome, nome)} e Casos de Dengue por Defasagem (meses)',
+                             'Estado', 'Defasagem (meses)', tamanho=(16, 5), cmap='coolwarm', vmin=-1, vmax=1,
+                             colunas=list(grade.columns), linhas=list(grade.index), rotulo_barra='Correlação'))
+    return specs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Análise de correlação entre casos de dengue, clima e indicadores socioeconômicos.')
+    parser.add_argument('--processos', type=int, default=None, help='processos de desenho e reamostragem (padrão: número de CPUs)')
+    parser.add_argument('--reamostragens', type=int, default=10000, help='reamostragens bootstrap e permutações')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--defasagem-maxima', type=int, default=3, help='maior defasagem (meses) entre clima e casos')
+    parser.add_argument('--cenarios', type=int, default=0, help='cenários climáticos para testar o sinal da temperatura')
+    parser.add_argument('--variantes', nargs='*', choices=list(VARIANTES), default=list(VARIANTES),
+                        help='versões gravadas ao lado de cada PNG (padrão: todas; sem valores, só o PNG)')
+    args = parser.parse_args(argv)
+
+    os.makedirs(SAIDA, exist_ok=True)
+    with etapa('preparar_dados') as medida:
+        df_correlacao, matriz_corr = preparar_dados()
+        medida.linhas = len(df_correlacao)
+
+    print("Calculando intervalos de confiança e p-valores...")
+    with etapa('inferencia', linhas=len(df_correlacao), reamostragens=args.reamostragens, processos=args.processos):
+        pares = inferencia_correlacao(df_correlacao, n_bootstrap=args.reamostragens, n_permutacoes=args.reamostragens,
+                                      semente=args.semente, processos=args.processos)
+    pares.to_csv(os.path.join(SAIDA, 'correlacoes_ic.csv'), index=False)
+    casos = pares[pares['Variavel_2'] == 'Casos_por_100k']
+    for _, par in casos.iterrows():
+        print(f"  {par['Variavel_1']:>22} x casos/100k: {par['r']:+.2f} "
+              f"[{par['IC_inf']:+.2f}, {par['IC_sup']:+.2f}]  p = {par['p_permutacao']:.4f}")
+
+    if args.cenarios:
+        with etapa('sensibilidade_temperatura', linhas=args.cenarios):
+            r = sensibilidade_temperatura(df_correlacao, args.cenarios, args.semente)
+        print(f"Temperatura x casos/100k em {args.cenarios} cenários climáticos: negativa em {(r < 0).mean():.1%}, "
+              f"mediana {np.median(r):+.2f}, 95% entre {np.quantile(r, 0.025):+.2f} e {np.quantile(r, 0.975):+.2f}")
+
+    print("Calculando correlações defasadas...")
+    with etapa('correlacoes_defasadas', defasagem_maxima=args.defasagem_maxima):
+        defasadas = correlacoes_defasadas(args.defasagem_maxima)
+    for nome, grade in defasadas.items():
+        grade.to_csv(os.path.join(SAIDA, f'defasagem_{nome}.csv'))
+        media = grade.mean(axis=1)
+        print(f"  {nome}: correlação média por defasagem " + ", ".join(f"{l}m {r:+.2f}" for l, r in media.items()))
+
+    print("Criando visualizações de correlação...")
+    specs = especificar_graficos(df_correlacao, matriz_corr, defasadas)
+    with etapa('renderizar', linhas=len(specs), processos=args.processos):
+        renderizar(specs, args.processos, cache=os.path.join(SAIDA, 'impressoes.json'), variantes=args.variantes)
+
+    print("Análise de correlação concluída com sucesso!")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from geografia import CODIGOS_POR_NOME
+
+MESES = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+SEMANAS = [f'SE{semana:02d}' for semana in range(1, 54)]
+
+DIRETORIO_PADRAO = "/home/ubuntu/cubo_dengue"
+# cubo com um arquivo por ano, montado ano a ano por incremental.py (separado do cubo do parse)
+DIRETORIO_ANUAL = "/home/ubuntu/cubo_anual"
+CSV_PADRAO = "/home/ubuntu/dengue_data_raw.csv"
+# soma de todos os anos do cubo por ano, regravada por incremental.py; fica longe de CSV_PADRAO, que
+# carregar_casos usaria para remontar o cubo do parse sob ANO_PADRAO
+CSV_ANUAL = "/home/ubuntu/dengue_anual.csv"
+# tabelas derivadas das somas do cubo por ano (regiões, trimestres, ranking, entradas da correlação); as
+# etapas visualizacoes e correlacao do pipeline gravam as do parse nos seus próprios diretórios
+DIRETORIO_DERIVADOS = "/home/ubuntu/derivados_anuais"
+
+# período coberto pela exportação de data/tabnet_uf_mes.txt (anos somados)
+ANO_PADRAO = "2014-2025"
+
+# códigos IBGE das UFs, na ordem das tabelas do TabNet
+CODIGOS_UF = CODIGOS_POR_NOME
+
+_ARQUIVO_CASOS = 'casos.npy'
+_ARQUIVO_IGNORADOS = 'ignorados.npy'
+_ARQUIVO_EIXOS = 'eixos.json'
+# cubo com um arquivo por ano (montado por incremental.py): anos/<ano>.npy e anos/<ano>.ignorados.npy
+_DIRETORIO_ANOS = 'anos'
+
+
+class CuboCasos:
+    """
+    Casos de dengue num cubo UF × ano × período (mês ou semana
+    epidemiológica), em int32. Os casos com mês ignorado ficam à parte, em
+    `ignorados` (UF × ano); a linha TOTAL não é guardada, é a soma das UFs.
+    """
+
+    def __init__(self, casos, ignorados, ufs, anos, periodos=MESES):
+        self.casos = casos
+        self.ignorados = ignorados
+        self.ufs = pd.Categorical(ufs, categories=list(ufs))
+        self.anos = list(anos)
+        self.periodos = list(periodos)
+        if casos.shape != (len(self.ufs), len(self.anos), len(self.periodos)):
+            raise ValueError(f"cubo com forma {casos.shape} não bate com os eixos "
+                             f"({len(self.ufs)}, {len(self.anos)}, {len(self.periodos)})")
+        if ignorados.shape != casos.shape[:2]:
+            raise ValueError(f"ignorados com forma {ignorados.shape}, esperado {casos.shape[:2]}")
+
+    @property
+    def codigos_uf(self):
+        """Código IBGE de cada UF do eixo (-1 quando desconhecido)."""
+        return np.array([CODIGOS_UF.get(uf, -1) for uf in self.ufs.categories], dtype=np.int8)
+
+    def _posicoes(self, rotulos, eixo):
+        if rotulos is None:
+            return slice(None)
+        if isinstance(rotulos, (list, tuple, np.ndarray, pd.Index)):
+            return [eixo.index(rotulo) for rotulo in rotulos]
+        return eixo.index(rotulos)
+
+    def fatia(self, ufs=None, anos=None, periodos=None):
+        """
+        Recorta o cubo por rótulos (um rótulo elimina o eixo, uma lista o
+        mantém). Sem listas, o resultado é uma view do arquivo mapeado.
+        """
+        indices = (self._posicoes(ufs, list(self.ufs.categories)),
+                   self._posicoes(anos, self.anos),
+                   self._posicoes(periodos, self.periodos))
+        if sum(isinstance(indice, list) for indice in indices) > 1:
+            # listas em mais de um eixo: seleção cruzada, como np.ix_
+            cubo = self.casos
+            for eixo, indice in reversed(list(enumerate(indices))):
+                if isinstance(indice, list):
+                    cubo = np.take(cubo, indice, axis=eixo)
+                else:
+                    cubo = cubo[(slice(None),) * eixo + (indice,)]
+            return cubo
+        return self.casos[indices]
+
+    def para_dataframe(self, anos=None):
+        """
+        Monta o DataFrame no esquema de dengue_data_raw.csv (linha TOTAL
+        primeiro), somando os anos pedidos (todos, por padrão).
+        """
+        if self.periodos != MESES:
+            raise ValueError("para_dataframe só se aplica a cubos mensais")
+        posicoes = self._posicoes(anos, self.anos)
+        casos = self.casos[:, posicoes].astype(np.int64)
+        ignorados = self.ignorados[:, posicoes].astype(np.int64)
+        if casos.ndim == 3:
+            casos = casos.sum(axis=1)
+            ignorados = ignorados.sum(axis=1)
+
+        valores = np.column_stack([ignorados, casos])
+        valores = np.column_stack([valores, valores.sum(axis=1)])
+        valores = np.vstack([valores.sum(axis=0), valores])
+
+        df = pd.DataFrame(valores, columns=['Ign_Em_Branco'] + MESES + ['Total'])
+        df.insert(0, 'UF_Notificacao', ['TOTAL'] + list(self.ufs.categories))
+        return df
+
+    def salvar(self, diretorio=DIRETORIO_PADRAO):
+        """
+        Grava o cubo como .npy (mapeáveis em memória) e os eixos em JSON.
+        Recusa um diretório com cubo por ano: regravar os eixos apagaria dele
+        os anos anexados.
+        """
+        if (ler_eixos(diretorio) or {}).get('por_ano'):
+            raise ValueError(f"{diretorio} guarda um cubo por ano (incremental.py); use outro diretório")
+        os.makedirs(diretorio, exist_ok=True)
+        np.save(os.path.join(diretorio, _ARQUIVO_CASOS), np.ascontiguousarray(self.casos, dtype=np.int32))
+        np.save(os.path.join(diretorio, _ARQUIVO_IGNORADOS), np.ascontiguousarray(self.ignorados, dtype=np.int32))
+        eixos = {'ufs': list(self.ufs.categories), 'codigos_uf': self.codigos_uf.tolist(),
+                 'anos': self.anos, 'periodos': self.periodos}
+        with open(os.path.join(diretorio, _ARQUIVO_EIXOS), 'w', encoding='utf-8') as arquivo:
+            json.dump(eixos, arquivo, ensure_ascii=False, indent=1)
+
+    def salvar_anos(self, diretorio=DIRETORIO_PADRAO):
+        """
+        Grava cada ano do cubo num arquivo próprio e acrescenta os anos e as
+        UFs novas aos eixos do cubo por ano de `diretorio`, sem ler nem
+        regravar os demais anos (um ano já guardado é substituído). As UFs
+        novas entram no fim do eixo; os arquivos de anos anteriores, com menos
+        UFs, são completados com zeros ao abrir.
+        """
+        eixos = ler_eixos(diretorio) or {'ufs': [], 'anos': [], 'periodos': self.periodos, 'por_ano': True}
+        if not eixos.get('por_ano'):
+            raise ValueError(f"{diretorio} guarda o cubo num arquivo só; converta-o com converter_por_ano")
+        if eixos['periodos'] != self.periodos:
+            raise ValueError(f"períodos do cubo ({len(self.periodos)}) diferentes dos de {diretorio}")
+        ufs = eixos['ufs'] + [uf for uf in self.ufs.categories if uf not in eixos['ufs']]
+        linhas = [ufs.index(uf) for uf in self.ufs.categories]
+        os.makedirs(os.path.join(diretorio, _DIRETORIO_ANOS), exist_ok=True)
+        for j, ano in enumerate(self.anos):
+            casos = np.zeros((len(ufs), len(self.periodos)), dtype=np.int32)
+            ignorados = np.zeros(len(ufs), dtype=np.int32)
+            casos[linhas] = self.casos[:, j]
+            ignorados[linhas] = self.ignorados[:, j]
+            arquivo_casos, arquivo_ignorados = _arquivos_ano(diretorio, ano)
+            np.save(arquivo_casos, casos)
+            np.save(arquivo_ignorados, ignorados)
+        eixos.update(ufs=ufs, codigos_uf=[int(CODIGOS_UF.get(uf, -1)) for uf in ufs],
+                     anos=eixos['anos'] + [ano for ano in self.anos if ano not in eixos['anos']])
+        # os eixos vão por último: um ano só aparece no cubo depois de gravado
+        with open(os.path.join(diretorio, _ARQUIVO_EIXOS), 'w', encoding='utf-8') as arquivo:
+            json.dump(eixos, arquivo, ensure_ascii=False, indent=1)
+
+
+def _arquivos_ano(diretorio, ano):
+    base = os.path.join(diretorio, _DIRETORIO_ANOS, str(ano))
+    return base + '.npy', base + '.ignorados.npy'
+
+
+def ler_eixos(diretorio=DIRETORIO_PADRAO):
+    """Eixos do cubo gravado em `diretorio`, ou None se não há cubo."""
+    try:
+        with open(os.path.join(diretorio, _ARQUIVO_EIXOS), encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except FileNotFoundError:
+        return None
+
+
+def ler_ano(diretorio, ano, n_ufs=None, modo='r'):
+    """
+    Casos (UF × período) e ignorados (UF) de um ano de um cubo por ano,
+    com `n_ufs` linhas (as UFs que entraram depois do ano ser gravado ficam
+    com zero).
+    """
+    arquivo_casos, arquivo_ignorados = _arquivos_ano(diretorio, ano)
+    casos = np.load(arquivo_casos, mmap_mode=modo)
+    ignorados = np.load(arquivo_ignorados, mmap_mode=modo)
+    if n_ufs is not None and n_ufs > len(casos):
+        casos = np.concatenate([casos, np.zeros((n_ufs - len(casos), casos.shape[1]), dtype=casos.dtype)])
+        ignorados = np.concatenate([ignorados, np.zeros(n_ufs - len(ignorados), dtype=ignorados.dtype)])
+    return casos, ignorados
+
+
+def converter_por_ano(diretorio=DIRETORIO_PADRAO):
+    """Regrava um cubo de arquivo único (CuboCasos.salvar) com um arquivo por ano. Custa uma leitura do cubo."""
+    cubo = abrir_cubo(diretorio)
+    cubo = CuboCasos(np.array(cubo.casos), np.array(cubo.ignorados), cubo.ufs.categories, cubo.anos, cubo.periodos)
+    for arquivo in (_ARQUIVO_EIXOS, _ARQUIVO_CASOS, _ARQUIVO_IGNORADOS):
+        os.remove(os.path.join(diretorio, arquivo))
+    cubo.salvar_anos(diretorio)
+    return cubo
+
+
+def abrir_cubo(diretorio=DIRETORIO_PADRAO, modo='r'):
+    """
+    Abre um cubo gravado por CuboCasos.salvar. Os arrays são mapeados em
+    memória (`modo` é o mmap_mode do NumPy): nada é lido até ser fatiado.
+    Um cubo por ano (CuboCasos.salvar_anos) é montado em memória a partir
+    dos arquivos de cada ano.
+    """
+    eixos = ler_eixos(diretorio)
+    if eixos is None:
+        raise FileNotFoundError(os.path.join(diretorio, _ARQUIVO_EIXOS))
+    if eixos.get('por_ano'):
+        casos = np.zeros((len(eixos['ufs']), len(eixos['anos']), len(eixos['periodos'])), dtype=np.int32)
+        ignorados = np.zeros((len(eixos['ufs']), len(eixos['anos'])), dtype=np.int32)
+        for j, ano in enumerate(eixos['anos']):
+            casos[:, j], ignorados[:, j] = ler_ano(diretorio, ano, len(eixos['ufs']), modo)
+    else:
+        casos = np.load(os.path.join(diretorio, _ARQUIVO_CASOS), mmap_mode=modo)
+        ignorados = np.load(os.path.join(diretorio, _ARQUIVO_IGNORADOS), mmap_mode=modo)
+    return CuboCasos(casos, ignorados, eixos['ufs'], eixos['anos'], eixos['periodos'])
+
+
+def _para_int32(valores):
+    if len(valores) and (valores.max() > np.iinfo(np.int32).max or valores.min() < 0):
+        raise ValueError("contagens fora do intervalo de int32")
+    return valores.astype(np.int32)
+
+
+def cubo_de_dataframes(dfs_por_ano):
+    """
+    Monta um cubo mensal a partir de DataFrames no esquema de
+    dengue_data_raw.csv, um por ano ({ano: df}). Linhas repetidas da mesma UF
+    são somadas; a linha TOTAL é ignorada.
+    """
+    anos = list(dfs_por_ano)
+    somas = []
+    ufs = []
+    for df in dfs_por_ano.values():
+        df = df[df['UF_Notificacao'] != 'TOTAL']
+        soma = df.groupby('UF_Notificacao', sort=False)[['Ign_Em_Branco'] + MESES].sum()
+        somas.append(soma)
+        ufs += [uf for uf in soma.index if uf not in ufs]
+
+    casos = np.zeros((len(ufs), len(anos), len(MESES)), dtype=np.int64)
+    ignorados = np.zeros((len(ufs), len(anos)), dtype=np.int64)
+    for i, soma in enumerate(somas):
+        soma = soma.reindex(ufs, fill_value=0)
+        ignorados[:, i] = soma['Ign_Em_Branco'].to_numpy()
+        casos[:, i] = soma[MESES].to_numpy()
+    return CuboCasos(_para_int32(casos), _para_int32(ignorados), ufs, anos)
+
+
+class AcumuladorCubo:
+    """
+    Soma por UF os blocos de parse_dengue.gerar_blocos à medida que passam,
+    para montar o cubo de um ano sem guardar os blocos.
+    """
+
+    def __init__(self, ano=ANO_PADRAO):
+        self.ano = ano
+        self.somas = []
+
+    def passar(self, blocos):
+        for bloco in blocos:
+            ufs = bloco[bloco['UF_Notificacao'] != 'TOTAL']
+            self.somas.append(ufs.groupby('UF_Notificacao', sort=False)[['Ign_Em_Branco'] + MESES].sum())
+            yield bloco
+
+    def cubo(self):
+        if not self.somas:
+            soma = pd.DataFrame(columns=['UF_Notificacao', 'Ign_Em_Branco'] + MESES)
+        else:
+            soma = pd.concat(self.somas).groupby(level=0, sort=False).sum().reset_index()
+        return cubo_de_dataframes({self.ano: soma})
+
+
+def carregar_casos(diretorio=DIRETORIO_PADRAO, caminho_csv=CSV_PADRAO, ano=ANO_PADRAO):
+    """
+    DataFrame no esquema de dengue_data_raw.csv lido do cubo. Se o cubo
+    não existe, ou é mais antigo que o CSV, ele é montado a partir do CSV;
+    um cubo por ano nunca é remontado (o CSV é que sai dele).
+    """
+    eixos = os.path.join(diretorio, _ARQUIVO_EIXOS)
+    if not os.path.exists(eixos) or (os.path.exists(caminho_csv) and not ler_eixos(diretorio).get('por_ano')
+                                     and os.path.getmtime(caminho_csv) > os.path.getmtime(eixos)):
+        cubo_de_dataframes({ano: pd.read_csv(caminho_csv)}).salvar(diretorio)
+    return abrir_cubo(diretorio).para_dataframe()
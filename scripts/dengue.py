@@ -0,0 +1,115 @@
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+
+# subcomando: (módulo com main(argv), descrição). Nada daqui é importado antes de o subcomando ser escolhido.
+SUBCOMANDOS = {
+    'parse': ('parse_dengue', 'converte exportações do TabNet em dengue_data_raw.csv (e no cubo)'),
+    'microdados': ('microdados_sinan', 'agrega microdados de notificações do SINAN nas tabelas UF × mês'),
+    'anexar': ('incremental', 'acrescenta um ano novo ao cubo e atualiza as tabelas derivadas'),
+    'validar': ('validacao', 'confere totais, cubo e nomes das covariáveis antes das etapas caras'),
+    'gerar': ('climate_socioeconomic_data', 'gera os dados climáticos e socioeconômicos simulados'),
+    'visualizar': ('visualize_dengue', 'gera as visualizações dos casos'),
+    'correlacionar': ('correlation_analysis', 'análise de correlação entre casos, clima e indicadores'),
+    'dispersoes': ('dispersoes', 'dispersão de cada covariável por ano e região, redesenhando só o que mudou'),
+    'modelar': ('modelos', 'ajusta em lote GLMs de Poisson e binomial negativa e ordena os modelos por AIC'),
+    'espacial': ('espacial', 'I de Moran global e local (LISA) sobre a vizinhança das UFs ou municípios'),
+    'surtos': ('deteccao_surtos', 'detecção incremental de surtos (EWMA e CUSUM sobre o esperado sazonal)'),
+    'prever': ('previsao', 'previsão sazonal de todas as UFs com nowcast do atraso e intervalos por simulação'),
+    'relatorio': ('relatorio', 'gera os relatórios a partir dos templates, renderizando só as seções que mudaram'),
+    'cache': ('caches', 'mostra, limita ou apaga os caches de gráficos, população e vizinhanças'),
+    'servir': ('servico_consultas', 'serviço local de consultas HTTP/JSON sobre os casos'),
+}
+
+# orçamento de importação de cada subcomando: segundos e bibliotecas que não podem ser carregadas só por
+# importar o módulo. Numa máquina de um núcleo os módulos com pandas importam em cerca de 0,16 s (o pandas
+# sozinho leva 0,15 s) e o caches.py em 0,005 s; os limites dão folga de quase 4x para a variação entre
+# máquinas e a carga. Só são proibidas as bibliotecas de que o subcomando não precisa: quem desenha usa
+# matplotlib e seaborn (carregados por graficos.py na hora de desenhar), modelar e espacial usam scipy.
+_SEM_GRAFICOS = ['matplotlib', 'seaborn']
+_SEM_PESADAS = _SEM_GRAFICOS + ['scipy']
+ORCAMENTOS = {
+    'parse': (0.6, _SEM_PESADAS),
+    'microdados': (0.6, _SEM_PESADAS),
+    'anexar': (0.6, _SEM_PESADAS),
+    'validar': (0.6, _SEM_PESADAS),
+    'gerar': (0.6, ['scipy']),
+    'visualizar': (0.6, ['scipy']),
+    'correlacionar': (0.6, ['scipy']),
+    'dispersoes': (0.6, ['scipy']),
+    'modelar': (0.6, _SEM_GRAFICOS),
+    'espacial': (0.6, _SEM_GRAFICOS),
+    'surtos': (0.6, _SEM_PESADAS),
+    'prever': (0.6, _SEM_PESADAS),
+    'relatorio': (0.6, _SEM_PESADAS),
+    'cache': (0.05, _SEM_PESADAS + ['numpy', 'pandas']),
+    'servir': (0.6, _SEM_PESADAS),
+}
+REPETICOES = 3
+
+_MEDIR = """
+import json, sys, time
+inicio = time.perf_counter()
+import {modulo}
+segundos = time.perf_counter() - inicio
+print(json.dumps({{'segundos': segundos, 'modulos': sorted({{nome.split('.')[0] for nome in sys.modules}})}}))
+"""
+
+
+def medir_importacao(modulo, repeticoes=REPETICOES):
+    """
+    Tempo de importação de `modulo` num interpretador novo (o menor de
+    `repeticoes` tentativas) e os pacotes de topo que ficaram carregados.
+    """
+    medidas = []
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, '-c', _MEDIR.format(modulo=modulo)], capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout
+        medidas.append(json.loads(saida.splitlines()[-1]))
+    return min(medidas, key=lambda medida: medida['segundos'])
+
+
+def verificar_orcamentos(repeticoes=REPETICOES):
+    """Mede a importação de cada subcomando e imprime o que estourou o orçamento. Retorna True se todos couberam."""
+    dentro = True
+    for subcomando, (modulo, _) in SUBCOMANDOS.items():
+        limite, proibidos = ORCAMENTOS[subcomando]
+        medida = medir_importacao(modulo, repeticoes)
+        carregados = [nome for nome in proibidos if nome in medida['modulos']]
+        ok = medida['segundos'] <= limite and not carregados
+        dentro &= ok
+        print(f"  {subcomando:<14} {medida['segundos']:6.3f} s (limite {limite:.2f} s)"
+              + (f"  carregou {', '.join(carregados)}" if carregados else '') + ('' if ok else '  <- fora do orçamento'))
+    return dentro
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='dengue.py', description='Ponto de entrada único das etapas de análise de dengue.',
+        epilog='Subcomandos:\n' + '\n'.join(f'  {nome:<14} {descricao}' for nome, (_, descricao) in SUBCOMANDOS.items())
+        + '\n\nUse "dengue.py <subcomando> -h" para as opções de cada um.',
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('subcomando', nargs='?', choices=list(SUBCOMANDOS), metavar='subcomando')
+    parser.add_argument('argumentos', nargs=argparse.REMAINDER, help='argumentos do subcomando')
+    parser.add_argument('--orcamentos', action='store_true',
+                        help='mede o tempo de importação de cada subcomando e compara com os orçamentos')
+    args = parser.parse_args(argv)
+
+    if args.orcamentos:
+        if not verificar_orcamentos():
+            raise SystemExit(1)
+        return
+    if args.subcomando is None:
+        parser.print_help()
+        raise SystemExit(2)
+
+    modulo, _ = SUBCOMANDOS[args.subcomando]
+    sys.argv[0] = f"dengue.py {args.subcomando}"
+    importlib.import_module(modulo).main(args.argumentos)
+
+
+if __name__ == '__main__':
+    main()
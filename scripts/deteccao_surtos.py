@@ -0,0 +1,230 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from rastreamento import etapa
+
+MESES = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+ESTADO_PADRAO = "/home/ubuntu/deteccao_surtos.npz"
+
+# linha de base móvel (EWMA) e EWMA/CUSUM sobre o resíduo padronizado do esperado sazonal
+LAMBDA_BASE = 0.2
+LAMBDA_EWMA = 0.3
+LIMIAR_EWMA = 3.0  # L: o EWMA dispara acima de L * sqrt(λ / (2 - λ)), L desvios do seu valor estacionário
+LIMITE_EWMA = LIMIAR_EWMA * np.sqrt(LAMBDA_EWMA / (2 - LAMBDA_EWMA))
+FOLGA_CUSUM = 0.5
+LIMIAR_CUSUM = 4.0
+# esperado sazonal (mesmo período em ciclos anteriores), no estilo Farrington
+PESO_SAZONAL = 0.3
+Z_SAZONAL = 2.58
+CICLOS_MINIMOS = 2
+
+_CAMPOS = ('media', 'variancia', 'ewma', 'cusum', 'atualizacoes', 'sazonal', 'dispersao', 'ciclos')
+
+
+class DetectorSurtos:
+    """
+    Detector incremental de surtos para várias séries de contagens (UFs,
+    municípios). Cada série guarda só o estado corrente, em arrays:
+
+    - linha de base EWMA (média e variância), e o EWMA e o acumulador
+      CUSUM do resíduo padronizado do esperado sazonal;
+    - o esperado de cada período do ciclo (mês ou semana epidemiológica),
+      média exponencial entre ciclos, e a sobredispersão quasi-Poisson.
+
+    Cada chamada de atualizar() consome um período para todas as séries, em
+    O(séries), e devolve os alertas daquele período. Um período só gera
+    alertas depois de CICLOS_MINIMOS ciclos: sem esperado sazonal, o pico
+    normal do ano não se distingue de um surto.
+    """
+
+    def __init__(self, series=(), periodos_por_ciclo=12):
+        self.periodos_por_ciclo = periodos_por_ciclo
+        self.series = []
+        self._posicao = {}
+        self.media = np.zeros(0)
+        self.variancia = np.zeros(0)
+        self.ewma = np.zeros(0)
+        self.cusum = np.zeros(0)
+        self.atualizacoes = np.zeros(0, dtype=np.int32)
+        self.sazonal = np.zeros((0, periodos_por_ciclo), dtype=np.float32)
+        self.dispersao = np.ones(0)
+        self.ciclos = np.zeros((0, periodos_por_ciclo), dtype=np.int16)
+        self._incluir(series)
+
+    def _incluir(self, series):
+        novas = [serie for serie in dict.fromkeys(series) if serie not in self._posicao]
+        if not novas:
+            return
+        for serie in novas:
+            self._posicao[serie] = len(self.series)
+            self.series.append(serie)
+        n = len(novas)
+        self.media = np.concatenate([self.media, np.zeros(n)])
+        self.variancia = np.concatenate([self.variancia, np.zeros(n)])
+        self.ewma = np.concatenate([self.ewma, np.zeros(n)])
+        self.cusum = np.concatenate([self.cusum, np.zeros(n)])
+        self.atualizacoes = np.concatenate([self.atualizacoes, np.zeros(n, dtype=np.int32)])
+        self.sazonal = np.concatenate([self.sazonal, np.zeros((n, self.periodos_por_ciclo), dtype=np.float32)])
+        self.dispersao = np.concatenate([self.dispersao, np.ones(n)])
+        self.ciclos = np.concatenate([self.ciclos, np.zeros((n, self.periodos_por_ciclo), dtype=np.int16)])
+
+    def atualizar(self, series, contagens, periodo, rotulo=None):
+        """
+        Consome as contagens de um período (`periodo` é a posição no ciclo,
+        0 a periodos_por_ciclo - 1) para as séries indicadas; séries novas
+        são incluídas. Retorna um DataFrame com os alertas (pode ser vazio).
+        """
+        self._incluir(series)
+        i = np.fromiter((self._posicao[serie] for serie in series), dtype=np.intp, count=len(series))
+        x = np.asarray(contagens, dtype=float)
+
+        # esperado sazonal: limiar e + z * sqrt(phi * e)
+        esperado = self.sazonal[i, periodo].astype(float)
+        dispersao = self.dispersao[i]
+        desvio_sazonal = np.sqrt(dispersao * np.maximum(esperado, 1.0))
+        limiar_sazonal = esperado + Z_SAZONAL * desvio_sazonal
+        com_historico = self.ciclos[i, periodo] >= CICLOS_MINIMOS
+        alerta_sazonal = com_historico & (x > limiar_sazonal)
+
+        # EWMA e CUSUM sobre o resíduo do esperado sazonal; sem ele, nada se acumula nem dispara
+        # (contra a linha de base móvel, o pico de Mar-Mai seria sempre um surto)
+        residuo = (x - esperado) / desvio_sazonal
+        anterior = self.ewma[i]
+        ewma = np.where(com_historico, anterior + LAMBDA_EWMA * (residuo - anterior), 0.0)
+        cusum = np.where(com_historico, np.maximum(0.0, self.cusum[i] + residuo - FOLGA_CUSUM), 0.0)
+        alerta_ewma = com_historico & (ewma > LIMITE_EWMA)
+        alerta_cusum = com_historico & (cusum > LIMIAR_CUSUM)
+
+        # em alerta, as linhas de base absorvem o limiar e não o pico, para o surto não virar o novo normal
+        media, variancia = self.media[i], self.variancia[i]
+        desvio_base = np.sqrt(np.maximum.reduce([variancia, media, np.ones_like(media)]))
+        limiar_base = media + LIMIAR_EWMA * desvio_base
+        x_base = np.where(com_historico & (x > limiar_base), limiar_base, x)
+        primeira = self.atualizacoes[i] == 0
+        diferenca = x_base - media
+        self.media[i] = np.where(primeira, x_base, media + LAMBDA_BASE * diferenca)
+        self.variancia[i] = np.where(primeira, 0.0,
+                                     (1 - LAMBDA_BASE) * (variancia + LAMBDA_BASE * diferenca ** 2))
+        # o EWMA guarda o resíduo limitado a ±LIMIAR_EWMA: um pico isolado dispara no mês, mas não por meses a fio
+        self.ewma[i] = np.where(com_historico, anterior + LAMBDA_EWMA * (np.clip(residuo, -LIMIAR_EWMA, LIMIAR_EWMA)
+                                                                         - anterior), 0.0)
+        self.cusum[i] = np.where(alerta_cusum, 0.0, cusum)
+        self.atualizacoes[i] += 1
+
+        x_sazonal = np.where(alerta_sazonal, limiar_sazonal, x)
+        inicio_sazonal = self.ciclos[i, periodo] == 0
+        self.sazonal[i, periodo] = np.where(inicio_sazonal, x_sazonal,
+                                            esperado + PESO_SAZONAL * (x_sazonal - esperado))
+        pearson = (x_sazonal - esperado) ** 2 / np.maximum(esperado, 1.0)
+        self.dispersao[i] = np.where(com_historico, np.maximum(1.0, dispersao + PESO_SAZONAL * (pearson - dispersao)),
+                                     dispersao)
+        self.ciclos[i, periodo] = np.minimum(self.ciclos[i, periodo] + 1, np.iinfo(np.int16).max)
+
+        algum = alerta_ewma | alerta_cusum | alerta_sazonal
+        return pd.DataFrame({
+            'Serie': np.asarray(series, dtype=object)[algum],
+            'Periodo': rotulo if rotulo is not None else periodo,
+            'Casos': x[algum],
+            'Base': media[algum],
+            'Esperado_Sazonal': np.where(com_historico, esperado, np.nan)[algum],
+            'Limiar_Sazonal': np.where(com_historico, limiar_sazonal, np.nan)[algum],
+            'EWMA': ewma[algum],
+            'CUSUM': cusum[algum],
+            'Alerta_EWMA': alerta_ewma[algum],
+            'Alerta_CUSUM': alerta_cusum[algum],
+            'Sazonal': alerta_sazonal[algum],
+        })
+
+    def consumir_tabela(self, df, rotulo=None):
+        """
+        Consome uma tabela no esquema de dengue_data_raw.csv (um ano, UFs ×
+        Jan..Dez), mês a mês. A linha TOTAL vira uma série como as demais.
+        Retorna os alertas de todos os meses.
+        """
+        if self.periodos_por_ciclo != len(MESES):
+            raise ValueError("consumir_tabela só se aplica a detectores mensais")
+        series = list(df['UF_Notificacao'])
+        contagens = df[MESES].to_numpy(dtype=float)
+        alertas = [self.atualizar(series, contagens[:, mes], mes,
+                                  f"{rotulo} {nome}" if rotulo is not None else nome)
+                   for mes, nome in enumerate(MESES)]
+        return pd.concat(alertas, ignore_index=True)
+
+    def salvar(self, caminho=ESTADO_PADRAO):
+        """
+        Grava o estado em .npz, para retomar no próximo período sem reler o
+        histórico. A gravação é pelo arquivo aberto: com um nome, np.savez
+        acrescentaria '.npz' a `caminho` e carregar não o acharia.
+        """
+        with open(caminho, 'wb') as arquivo:
+            np.savez(arquivo, series=np.asarray(self.series, dtype=object).astype(str),
+                     periodos_por_ciclo=self.periodos_por_ciclo,
+                     **{campo: getattr(self, campo) for campo in _CAMPOS})
+
+    @classmethod
+    def carregar(cls, caminho=ESTADO_PADRAO):
+        with np.load(caminho) as arquivo:
+            detector = cls(periodos_por_ciclo=int(arquivo['periodos_por_ciclo']))
+            detector._incluir(arquivo['series'].tolist())
+            for campo in _CAMPOS:
+                # estados gravados antes do EWMA do resíduo não têm 'ewma': ele começa do zero
+                if campo in arquivo.files:
+                    setattr(detector, campo, arquivo[campo])
+        return detector
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Detecção incremental de surtos sobre tabelas mensais de casos.')
+    parser.add_argument('tabelas', nargs='*', help='CSVs no esquema de dengue_data_raw.csv, um por ano, em ordem')
+    parser.add_argument('--cubo', default=None,
+                        help='cubo com um ano por fatia (incremental.py), lido ano a ano antes das tabelas')
+    parser.add_argument('--estado', default=ESTADO_PADRAO, help='arquivo .npz com o estado do detector')
+    parser.add_argument('--reiniciar', action='store_true', help='ignora o estado gravado e começa do zero')
+    parser.add_argument('--saida', default=None, help='CSV onde gravar os alertas')
+    args = parser.parse_args(argv)
+    if not args.tabelas and not args.cubo:
+        parser.error("passe as tabelas anuais ou --cubo")
+    anuais = []  # (rótulo, DataFrame de um ano)
+    if args.cubo:
+        from cubo_casos import abrir_cubo
+        try:
+            cubo = abrir_cubo(args.cubo)
+        except FileNotFoundError:
+            parser.error(f"não há cubo em {args.cubo}")
+        compostas = [str(ano) for ano in cubo.anos if not str(ano).strip().isdigit()]
+        if compostas:
+            # um perfil com os anos somados não tem ciclos anteriores: nenhum mês teria esperado sazonal
+            parser.error(f"o cubo {args.cubo} tem fatias de vários anos ({', '.join(compostas)}); "
+                         f"monte um cubo por ano com 'dengue.py anexar'")
+        anuais += [(str(ano), cubo.para_dataframe(ano)) for ano in sorted(cubo.anos, key=int)]
+
+    if os.path.exists(args.estado) and not args.reiniciar:
+        detector = DetectorSurtos.carregar(args.estado)
+        print(f"Estado retomado de {args.estado} ({len(detector.series)} séries)")
+    else:
+        detector = DetectorSurtos()
+
+    anuais += [(os.path.splitext(os.path.basename(tabela))[0], tabela) for tabela in args.tabelas]
+    alertas = []
+    for rotulo, tabela in anuais:
+        with etapa('detectar_surtos', tabela=rotulo) as medida:
+            df = pd.read_csv(tabela) if isinstance(tabela, str) else tabela
+            alertas.append(detector.consumir_tabela(df, rotulo))
+            medida.linhas = len(df)
+    alertas = pd.concat(alertas, ignore_index=True)
+    os.makedirs(os.path.dirname(os.path.abspath(args.estado)), exist_ok=True)
+    detector.salvar(args.estado)
+
+    print(f"{len(alertas)} alerta(s)")
+    if len(alertas):
+        print(alertas.to_string(index=False))
+    if args.saida:
+        os.makedirs(os.path.dirname(os.path.abspath(args.saida)), exist_ok=True)
+        alertas.to_csv(args.saida, index=False)
+
+
+if __name__ == '__main__':
+    main()
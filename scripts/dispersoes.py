@@ -0,0 +1,141 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from geografia import CODIGOS_POR_NOME, IndiceGeografico
+from graficos import ARMAZEM_PADRAO, VARIANTES, grafico, renderizar
+from rastreamento import etapa
+
+SAIDA = '/home/ubuntu/analise_correlacao/dispersoes'
+CACHE = os.path.join(SAIDA, 'impressoes.json')
+
+# coluna: (rótulo do eixo x, nome no título)
+COVARIAVEIS = {
+    'Temperatura_Media': ('Temperatura Média Anual (°C)', 'Temperatura Média'),
+    'Precipitacao_Total': ('Precipitação Total Anual (mm)', 'Precipitação Total'),
+    'IDH': ('Índice de Desenvolvimento Humano (IDH)', 'IDH'),
+    'Renda_Per_Capita': ('Renda per Capita (R$)', 'Renda per Capita'),
+    'Taxa_Urbanizacao': ('Taxa de Urbanização (%)', 'Taxa de Urbanização'),
+    'Acesso_Saneamento': ('Acesso a Saneamento Básico (%)', 'Acesso a Saneamento'),
+    'Densidade_Demografica': ('Densidade Demográfica (hab/km²)', 'Densidade Demográfica'),
+}
+ROTULO_Y = 'Casos de Dengue por 100 mil habitantes'
+
+
+def ajustar_retas(x, y, pesos):
+    """
+    Mínimos quadrados de y contra x para muitos painéis de uma vez: cada
+    linha de `x`, `y` e `pesos` (painéis × pontos) é um painel, e `pesos`
+    0/1 marca os pontos que ele usa. Retorna (inclinação, intercepto, r),
+    um valor por painel; painéis com x constante ficam com NaN.
+    """
+    x, y, pesos = (np.asarray(valores, dtype=float) for valores in (x, y, pesos))
+    n = pesos.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media_x = (pesos * x).sum(axis=1) / n
+        media_y = (pesos * y).sum(axis=1) / n
+        dx = (x - media_x[:, None]) * pesos
+        dy = (y - media_y[:, None]) * pesos
+        sxx, syy, sxy = (dx * dx).sum(axis=1), (dy * dy).sum(axis=1), (dx * dy).sum(axis=1)
+        inclinacao = np.where(sxx > 0, sxy / sxx, np.nan)
+        r = sxy / np.sqrt(sxx * syy)
+    return inclinacao, media_y - inclinacao * media_x, r
+
+
+def especificar_dispersoes(paineis, y='Casos_por_100k', rotulo_y=ROTULO_Y, **opcoes):
+    """
+    Especificações de gráficos de dispersão com reta de regressão, com
+    todas as retas ajustadas numa única passada. `paineis` é uma lista de
+    (arquivo, título, DataFrame indexado pelos rótulos dos pontos, coluna x,
+    rótulo do eixo x); só as colunas x e `y` vão para a especificação.
+    """
+    if not paineis:
+        return []
+    n = max(len(df) for _, _, df, _, _ in paineis)
+    xs, ys, pesos = np.zeros((3, len(paineis), n))
+    for i, (_, _, df, coluna, _) in enumerate(paineis):
+        xs[i, :len(df)] = df[coluna].to_numpy(dtype=float)
+        ys[i, :len(df)] = df[y].to_numpy(dtype=float)
+        pesos[i, :len(df)] = 1
+    inclinacoes, interceptos, _ = ajustar_retas(xs, ys, pesos)
+
+    opcoes = dict({'tamanho': (10, 8), 'tamanho_titulo': 14}, **opcoes)
+    return [grafico('dispersao', arquivo, df[[coluna, y]], titulo, rotulo_x, rotulo_y, x=coluna, y=y,
+                    reta=(float(inclinacao), float(intercepto)), **opcoes)
+            for (arquivo, titulo, df, coluna, rotulo_x), inclinacao, intercepto
+            in zip(paineis, inclinacoes, interceptos)]
+
+
+def _nome_arquivo(texto):
+    return texto.replace('/', '-').replace(' ', '_')
+
+
+def paineis_covariaveis(covariaveis, incidencia, colunas=COVARIAVEIS, saida=SAIDA):
+    """
+    Um painel por covariável × ano × região (e Brasil): `covariaveis` é um
+    DataFrame UF × covariável e `incidencia` um DataFrame UF × ano com os
+    casos por 100 mil habitantes. Os PNGs ficam em saida/região/ano/covariável.png.
+    """
+    ufs = list(incidencia.index)
+    indice = IndiceGeografico([CODIGOS_POR_NOME[uf] for uf in ufs])
+    regiao_da_uf = np.asarray(indice.rotulos('regiao'))[indice.pais['uf']]
+    grupos = {'Brasil': np.ones(len(ufs), dtype=bool)}
+    grupos.update({regiao: regiao_da_uf == regiao for regiao in indice.rotulos('regiao')})
+
+    paineis = []
+    for regiao, selecao in grupos.items():
+        for ano in incidencia.columns:
+            df = covariaveis.loc[np.asarray(ufs)[selecao]].assign(Casos_por_100k=incidencia.loc[selecao, ano].to_numpy())
+            for coluna in colunas:
+                rotulo_x, nome = colunas[coluna]
+                paineis.append((os.path.join(saida, _nome_arquivo(regiao), _nome_arquivo(str(ano)), f'{coluna}.png'),
+                                f'{nome} e Casos de Dengue por 100 mil habitantes - {regiao}, {ano}',
+                                df, coluna, rotulo_x))
+    return paineis
+
+
+def carregar_dados():
+    """Covariáveis por UF e casos por 100 mil habitantes de cada UF em cada ano do cubo."""
+    from cubo_casos import abrir_cubo
+    from juncao import carregar_covariaveis, juntar
+    from populacao import carregar_populacao
+
+    cubo = abrir_cubo()
+    ufs = [uf for uf in cubo.ufs.categories if uf != 'Ignorado/exterior']
+    posicoes = [list(cubo.ufs.categories).index(uf) for uf in ufs]
+    casos = np.asarray(cubo.casos[posicoes], dtype=np.int64).sum(axis=2)  # UF × ano
+    incidencia = carregar_populacao().incidencia(casos, 'uf', cubo.anos, [CODIGOS_POR_NOME[uf] for uf in ufs])
+    covariaveis, _ = juntar(pd.DataFrame(index=pd.Index(ufs, name='UF')), carregar_covariaveis())
+    return covariaveis, pd.DataFrame(incidencia, index=ufs, columns=[str(ano) for ano in cubo.anos])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Dispersão de cada covariável contra casos por 100 mil habitantes, por ano e por região, '
+                    'com as retas ajustadas de uma vez e só os gráficos que mudaram redesenhados.')
+    parser.add_argument('--processos', type=int, default=None, help='processos de desenho (padrão: número de CPUs)')
+    parser.add_argument('--dpi', type=int, default=150)
+    parser.add_argument('--forcar', action='store_true', help='redesenha todos os gráficos')
+    parser.add_argument('--variantes', nargs='*', choices=list(VARIANTES), default=list(VARIANTES),
+                        help='versões gravadas ao lado de cada PNG (padrão: todas; sem valores, só o PNG)')
+    args = parser.parse_args(argv)
+
+    with etapa('carregar_dados') as medida:
+        covariaveis, incidencia = carregar_dados()
+        medida.linhas = incidencia.size
+    with etapa('especificar_graficos') as medida:
+        specs = especificar_dispersoes(paineis_covariaveis(covariaveis, incidencia), dpi=args.dpi)
+        medida.linhas = len(specs)
+    if args.forcar and os.path.exists(CACHE):
+        os.remove(CACHE)
+    with etapa('renderizar', linhas=len(specs), processos=args.processos):
+        # --forcar também ignora o armazém de gráficos
+        renderizar(specs, args.processos, cache=CACHE, variantes=args.variantes,
+                   armazem=None if args.forcar else ARMAZEM_PADRAO)
+    print(f"Gráficos de dispersão em {SAIDA}/")
+
+
+if __name__ == '__main__':
+    main()
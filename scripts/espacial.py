@@ -0,0 +1,257 @@
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import caches
+from geografia import CODIGOS_POR_NOME, UFS
+from rastreamento import etapa
+
+VIZINHANCA_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'vizinhanca_uf.csv')
+CACHE_PADRAO = caches.diretorio('espacial')
+DADOS_PADRAO = '/home/ubuntu/analise_correlacao/dados_correlacao.csv'
+SAIDA = '/home/ubuntu/analise_espacial'
+
+PERMUTACOES = 999
+# permutações avaliadas de uma vez: limita a memória (vizinhanças × permutações) do LISA
+BLOCO_PERMUTACOES = 100
+SIGNIFICANCIA = 0.05
+# casas decimais das coordenadas ao comparar vértices de fronteira
+CASAS_COORDENADAS = 6
+
+
+class Adjacencia:
+    """
+    Vizinhança entre unidades (UFs ou municípios, por código IBGE) em CSR:
+    os vizinhos da unidade i são indices[indptr[i]:indptr[i + 1]]. A matriz
+    esparsa padronizada por linha (cada linha soma 1) sai de `pesos()`.
+    """
+
+    def __init__(self, codigos, indptr, indices):
+        self.codigos = np.asarray(codigos, dtype=np.int64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+
+    @classmethod
+    def de_pares(cls, pares, codigos=None):
+        """A partir de pares (código, código vizinho), em qualquer sentido; a relação é tornada simétrica."""
+        pares = np.asarray(pares, dtype=np.int64).reshape(-1, 2)
+        pares = pares[pares[:, 0] != pares[:, 1]]
+        codigos = np.unique(pares) if codigos is None else np.asarray(codigos, dtype=np.int64)
+        posicoes = pd.Index(codigos).get_indexer(pares.ravel()).reshape(-1, 2)
+        posicoes = posicoes[(posicoes >= 0).all(axis=1)]
+        ligacoes = np.unique(np.vstack([posicoes, posicoes[:, ::-1]]), axis=0)
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(ligacoes[:, 0], minlength=len(codigos)))])
+        return cls(codigos, indptr, ligacoes[:, 1])
+
+    @classmethod
+    def de_csv(cls, caminho):
+        """CSV com as colunas codigo,vizinho (um par por linha)."""
+        tabela = pd.read_csv(caminho)
+        return cls.de_pares(tabela[['codigo', 'vizinho']].to_numpy())
+
+    @classmethod
+    def de_geojson(cls, caminho, propriedade='codigo'):
+        """
+        Contiguidade de primeira ordem (rainha) a partir das fronteiras:
+        unidades que compartilham ao menos um vértice são vizinhas. Os
+        vértices de todos os polígonos vão para uma tabela só, e os pares
+        saem de uma junção dela com ela mesma pelas coordenadas.
+        """
+        with open(caminho, encoding='utf-8') as arquivo:
+            colecao = json.load(arquivo)
+        codigos, coordenadas = [], []
+        for feicao in colecao['features']:
+            geometria = feicao['geometry']
+            poligonos = geometria['coordinates'] if geometria['type'] == 'MultiPolygon' else [geometria['coordinates']]
+            pontos = np.concatenate([np.asarray(anel, dtype=float)[:, :2] for poligono in poligonos for anel in poligono])
+            coordenadas.append(pontos)
+            codigos.append(np.full(len(pontos), int(feicao['properties'][propriedade])))
+        vertices = pd.DataFrame(np.round(np.concatenate(coordenadas), CASAS_COORDENADAS), columns=['x', 'y'])
+        vertices['codigo'] = np.concatenate(codigos)
+        vertices = vertices.drop_duplicates()
+        compartilhados = vertices[vertices.duplicated(['x', 'y'], keep=False)]
+        pares = compartilhados.merge(compartilhados, on=['x', 'y'])[['codigo_x', 'codigo_y']].to_numpy()
+        return cls.de_pares(pares, np.unique(vertices['codigo']))
+
+    @classmethod
+    def carregar(cls, caminho=VIZINHANCA_PADRAO, cache=CACHE_PADRAO):
+        """
+        Lê um CSV de pares ou um GeoJSON de fronteiras. A estrutura fica em
+        `cache`, sob o hash do conteúdo do arquivo, e é reaproveitada
+        enquanto o arquivo não mudar.
+        """
+        with open(caminho, 'rb') as arquivo:
+            chave = hashlib.sha256(arquivo.read()).hexdigest()[:16]
+        guardado = os.path.join(cache, f'adjacencia_{chave}.npz') if cache else None
+        if guardado and os.path.exists(guardado):
+            caches.usar(guardado)
+            with np.load(guardado) as dados:
+                return cls(dados['codigos'], dados['indptr'], dados['indices'])
+        if caminho.endswith(('.geojson', '.json')):
+            adjacencia = cls.de_geojson(caminho)
+        else:
+            adjacencia = cls.de_csv(caminho)
+        if guardado:
+            os.makedirs(cache, exist_ok=True)
+            np.savez(guardado, codigos=adjacencia.codigos, indptr=adjacencia.indptr, indices=adjacencia.indices)
+            caches.limitar(cache, caches.CACHES['espacial'])
+        return adjacencia
+
+    @property
+    def vizinhos(self):
+        """Número de vizinhos de cada unidade."""
+        return np.diff(self.indptr)
+
+    def reindexar(self, codigos):
+        """Adjacência restrita a `codigos`, nessa ordem (unidades ausentes ficam sem vizinhos)."""
+        linhas = np.repeat(np.arange(len(self.codigos)), self.vizinhos)
+        pares = np.column_stack([self.codigos[linhas], self.codigos[self.indices]])
+        return Adjacencia.de_pares(pares, codigos)
+
+    def pesos(self):
+        """Matriz esparsa CSR n × n padronizada por linha; unidades sem vizinhos ficam com a linha zerada."""
+        from scipy import sparse
+        dados = np.repeat(1 / np.maximum(self.vizinhos, 1), self.vizinhos)
+        return sparse.csr_matrix((dados, self.indices, self.indptr), shape=(len(self.codigos),) * 2)
+
+
+def _p_valor(observado, permutados):
+    """Pseudo p-valor unilateral, no sentido do valor observado: (extremos + 1) / (permutações + 1)."""
+    maiores = (permutados >= observado).sum(axis=-1)
+    extremos = np.minimum(maiores, permutados.shape[-1] - maiores)
+    return (extremos + 1) / (permutados.shape[-1] + 1)
+
+
+def moran_global(valores, adjacencia, permutacoes=PERMUTACOES, semente=None):
+    """
+    I de Moran global com inferência por permutação. As permutações viram as
+    colunas de uma matriz n × permutações e a defasagem espacial de todas
+    sai de um único produto esparso. Retorna {I, esperado, p_valor, z}.
+    """
+    pesos = adjacencia.pesos()
+    z = np.asarray(valores, dtype=float)
+    z = z - z.mean()
+    soma_pesos = pesos.sum()
+    fator = len(z) / soma_pesos / (z @ z)
+    observado = fator * z @ (pesos @ z)
+
+    rng = np.random.default_rng(semente)
+    permutados = z[rng.permuted(np.tile(np.arange(len(z)), (permutacoes, 1)), axis=1).T]
+    simulados = fator * (permutados * (pesos @ permutados)).sum(axis=0)
+    return {
+        'I': float(observado),
+        'esperado': -1 / (len(z) - 1),
+        'p_valor': float(_p_valor(observado, simulados)),
+        'z': float((observado - simulados.mean()) / simulados.std()),
+    }
+
+
+def moran_local(valores, adjacencia, permutacoes=PERMUTACOES, semente=None, significancia=SIGNIFICANCIA):
+    """
+    LISA (I de Moran local) com permutação condicional: para cada unidade,
+    o próprio valor fica fixo e os vizinhos recebem valores sorteados, sem
+    reposição, entre as demais unidades. Cada bloco de permutações é um
+    conjunto de permutações globais; a posição de cada vizinho lê o valor
+    que a permutação pôs ali, e quando esse valor é o da própria unidade
+    ele é trocado pelo que caiu na posição dela, o que mantém o sorteio
+    uniforme entre as outras. As defasagens de todas as unidades e
+    permutações saem de produtos esparsos (unidades × ligações) por bloco.
+
+    Retorna DataFrame por unidade: Ii, defasagem espacial, p-valor e
+    quadrante ('Alto-Alto', 'Baixo-Baixo', 'Alto-Baixo', 'Baixo-Alto' ou
+    'Não significativo').
+    """
+    from scipy import sparse
+
+    z = np.asarray(valores, dtype=float)
+    z = (z - z.mean()) / z.std()
+    pesos = adjacencia.pesos()
+    defasagem = pesos @ z
+    local = z * defasagem
+
+    n = len(z)
+    linhas = np.repeat(np.arange(n), adjacencia.vizinhos)
+    # soma, por unidade, das ligações que partem dela, já com o peso de cada uma
+    somar = sparse.csr_matrix((pesos.data, (linhas, np.arange(len(linhas)))), shape=(n, len(linhas)))
+    rng = np.random.default_rng(semente)
+    simulados = np.empty((n, permutacoes))
+    for inicio in range(0, permutacoes, BLOCO_PERMUTACOES):
+        bloco = min(BLOCO_PERMUTACOES, permutacoes - inicio)
+        permutacao = rng.permuted(np.tile(np.arange(n), (bloco, 1)), axis=1).T  # n × bloco
+        sorteados = permutacao[adjacencia.indices]
+        proprios = sorteados == linhas[:, None]
+        sorteados[proprios] = permutacao[linhas][proprios]
+        simulados[:, inicio:inicio + bloco] = z[:, None] * (somar @ z[sorteados])
+
+    p_valor = _p_valor(local[:, None], simulados)
+    quadrante = np.select([(z > 0) & (defasagem > 0), (z < 0) & (defasagem < 0), (z > 0) & (defasagem < 0)],
+                          ['Alto-Alto', 'Baixo-Baixo', 'Alto-Baixo'], 'Baixo-Alto')
+    sem_vizinhos = adjacencia.vizinhos == 0
+    quadrante = np.where((p_valor < significancia) & ~sem_vizinhos, quadrante, 'Não significativo')
+    return pd.DataFrame({'Ii': local, 'Defasagem': defasagem, 'p_valor': np.where(sem_vizinhos, np.nan, p_valor),
+                         'Quadrante': quadrante})
+
+
+def carregar_dados(caminho=DADOS_PADRAO):
+    """Tabela por unidade com a chave na primeira coluna (nome da UF ou código IBGE), indexada pelo código."""
+    dados = pd.read_csv(caminho, index_col=0)
+    chaves = dados.index.astype(str)
+    if chaves.str.fullmatch(r'\d+').all():
+        codigos = chaves.astype(np.int64)
+    else:
+        desconhecidas = [chave for chave in chaves if chave not in CODIGOS_POR_NOME]
+        if desconhecidas:
+            raise ValueError(f"unidades desconhecidas em {caminho}: {', '.join(desconhecidas)}")
+        codigos = [CODIGOS_POR_NOME[chave] for chave in chaves]
+    return dados.set_axis(pd.Index(codigos, name='codigo'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="I de Moran global e local (LISA) com inferência por permutação sobre uma matriz de "
+                    "vizinhança esparsa de UFs ou municípios.")
+    parser.add_argument('--dados', default=DADOS_PADRAO,
+                        help='CSV com a unidade (nome da UF ou código IBGE) na primeira coluna')
+    parser.add_argument('--variaveis', nargs='+', default=['Casos_por_100k', 'Total_Casos'])
+    parser.add_argument('--vizinhanca', default=VIZINHANCA_PADRAO,
+                        help='CSV de pares codigo,vizinho ou GeoJSON de fronteiras (propriedade "codigo")')
+    parser.add_argument('--permutacoes', type=int, default=PERMUTACOES)
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    with etapa('carregar_vizinhanca') as medida:
+        dados = carregar_dados(args.dados)
+        adjacencia = Adjacencia.carregar(args.vizinhanca).reindexar(dados.index)
+        medida.linhas = len(adjacencia.indices)
+    isoladas = dados.index[adjacencia.vizinhos == 0]
+    if len(isoladas):
+        print(f"{len(isoladas)} unidade(s) sem vizinhos: {', '.join(str(UFS.get(c, c)) for c in isoladas[:10])}")
+
+    globais, locais = [], []
+    for variavel in args.variaveis:
+        with etapa('moran', variavel=variavel, linhas=len(dados), permutacoes=args.permutacoes):
+            valores = dados[variavel].to_numpy(dtype=float)
+            resultado = moran_global(valores, adjacencia, args.permutacoes, args.semente)
+            lisa = moran_local(valores, adjacencia, args.permutacoes, args.semente)
+        globais.append(dict(Variavel=variavel, **resultado))
+        locais.append(lisa.assign(Variavel=variavel, Codigo=dados.index,
+                                  Unidade=[UFS.get(codigo, str(codigo)) for codigo in dados.index]))
+        print(f"  {variavel}: I = {resultado['I']:+.3f} (esperado {resultado['esperado']:+.3f}), "
+              f"p = {resultado['p_valor']:.3f}")
+        for quadrante, grupo in lisa.assign(Unidade=locais[-1]['Unidade']).groupby('Quadrante'):
+            if quadrante != 'Não significativo':
+                print(f"    {quadrante}: {', '.join(grupo['Unidade'])}")
+
+    os.makedirs(SAIDA, exist_ok=True)
+    pd.DataFrame(globais).to_csv(os.path.join(SAIDA, 'moran_global.csv'), index=False)
+    pd.concat(locais)[['Variavel', 'Codigo', 'Unidade', 'Ii', 'Defasagem', 'p_valor', 'Quadrante']].to_csv(
+        os.path.join(SAIDA, 'lisa.csv'), index=False)
+    print(f"Resultados em {SAIDA}/")
+
+
+if __name__ == '__main__':
+    main()
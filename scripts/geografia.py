@@ -0,0 +1,152 @@
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# UFs pelo código IBGE, na ordem das tabelas do TabNet; 0 reúne ignorados e exterior
+UFS = {
+    11: 'Rondônia', 12: 'Acre', 13: 'Amazonas', 14: 'Roraima', 15: 'Pará', 16: 'Amapá',
+    17: 'Tocantins', 21: 'Maranhão', 22: 'Piauí', 23: 'Ceará', 24: 'Rio Grande do Norte',
+    25: 'Paraíba', 26: 'Pernambuco', 27: 'Alagoas', 28: 'Sergipe', 29: 'Bahia',
+    31: 'Minas Gerais', 32: 'Espírito Santo', 33: 'Rio de Janeiro', 35: 'São Paulo',
+    41: 'Paraná', 42: 'Santa Catarina', 43: 'Rio Grande do Sul', 50: 'Mato Grosso do Sul',
+    51: 'Mato Grosso', 52: 'Goiás', 53: 'Distrito Federal', 0: 'Ignorado/exterior',
+}
+
+# o primeiro dígito do código da UF é o código da região
+REGIOES = {1: 'Norte', 2: 'Nordeste', 3: 'Sudeste', 4: 'Sul', 5: 'Centro-Oeste', 0: 'Ignorado/exterior'}
+
+NIVEIS = ['municipio', 'uf', 'regiao', 'brasil']
+
+MESES = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+
+# agrupamentos de meses: rótulos dos grupos e o grupo de cada mês
+PERIODOS = {
+    'trimestre': (['Verão (Jan-Mar)', 'Outono (Abr-Jun)', 'Inverno (Jul-Set)', 'Primavera (Out-Dez)'],
+                  [0, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3]),
+    'estacao': (['Verão', 'Outono', 'Inverno', 'Primavera'],
+                [0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0]),
+}
+
+
+def _ordem_alfabetica(nome):
+    return unicodedata.normalize('NFKD', nome).encode('ascii', 'ignore').decode().casefold()
+
+
+# as 27 UFs em ordem alfabética
+ESTADOS = sorted((nome for codigo, nome in UFS.items() if codigo), key=_ordem_alfabetica)
+CODIGOS_POR_NOME = {nome: codigo for codigo, nome in UFS.items()}
+
+
+def uf_do_municipio(codigos):
+    """Código da UF de códigos de município com 6 ou 7 dígitos (os dois primeiros)."""
+    codigos = np.asarray(codigos, dtype=np.int64)
+    return np.where(codigos >= 1000000, codigos // 100000, codigos // 10000)
+
+
+def regiao_da_uf(codigos):
+    return np.asarray(codigos, dtype=np.int64) // 10
+
+
+_SUBIR = {
+    'uf': uf_do_municipio,
+    'regiao': regiao_da_uf,
+    'brasil': np.zeros_like,
+}
+
+
+class IndiceGeografico:
+    """
+    Hierarquia município → UF → região → Brasil sobre códigos IBGE. Cada
+    nível guarda seus códigos e, para cada unidade, a posição do pai no
+    nível de cima, em arrays de inteiros; somar de um nível a outro é uma
+    única soma agrupada sobre esses ponteiros.
+    """
+
+    def __init__(self, codigos, nivel='uf'):
+        if nivel not in ('municipio', 'uf'):
+            raise ValueError(f"nível das folhas deve ser 'municipio' ou 'uf', não {nivel!r}")
+        self.niveis = NIVEIS[NIVEIS.index(nivel):]
+        self.codigos = {nivel: np.asarray(codigos, dtype=np.int64)}
+        self.pais = {}
+        # posição, em cada nível, do ancestral de cada folha
+        self._da_folha = {nivel: np.arange(len(self.codigos[nivel]))}
+        for filho, pai in zip(self.niveis, self.niveis[1:]):
+            acima = _SUBIR[pai](self.codigos[filho])
+            unicos = np.unique(acima)
+            unicos = np.concatenate([unicos[unicos != 0], unicos[unicos == 0]])  # ignorados por último
+            self.codigos[pai] = unicos
+            self.pais[filho] = pd.Index(unicos).get_indexer(acima)
+            self._da_folha[pai] = self.pais[filho][self._da_folha[filho]]
+
+    @property
+    def folhas(self):
+        return self.niveis[0]
+
+    @classmethod
+    def de_nomes(cls, nomes):
+        """Índice de UFs a partir dos nomes usados no TabNet."""
+        desconhecidos = [nome for nome in nomes if nome not in CODIGOS_POR_NOME]
+        if desconhecidos:
+            raise ValueError(f"UFs desconhecidas: {', '.join(desconhecidos)}")
+        return cls([CODIGOS_POR_NOME[nome] for nome in nomes])
+
+    def rotulos(self, nivel):
+        codigos = self.codigos[nivel]
+        if nivel == 'uf':
+            return [UFS.get(codigo, str(codigo)) for codigo in codigos]
+        if nivel == 'regiao':
+            return [REGIOES.get(codigo, str(codigo)) for codigo in codigos]
+        if nivel == 'brasil':
+            return ['Brasil']
+        return [str(codigo) for codigo in codigos]
+
+    def agregar(self, valores, nivel):
+        """Soma `valores` (folhas no eixo 0) até `nivel`."""
+        valores = np.asarray(valores)
+        soma = np.zeros((len(self.codigos[nivel]),) + valores.shape[1:], dtype=np.result_type(valores, np.int64))
+        np.add.at(soma, self._da_folha[nivel], valores)
+        return soma
+
+
+def agregar_periodos(valores, periodo):
+    """Soma as colunas mensais de `valores` (meses no último eixo) segundo um agrupamento de PERIODOS."""
+    _, grupos = PERIODOS[periodo]
+    valores = np.asarray(valores)
+    soma = np.zeros(valores.shape[:-1] + (max(grupos) + 1,), dtype=np.result_type(valores, np.int64))
+    np.add.at(np.moveaxis(soma, -1, 0), grupos, np.moveaxis(valores, -1, 0))
+    return soma
+
+
+class TabelaGeografica:
+    """
+    Valores por folha (linhas) e mês (colunas) com os agregados por nível e
+    por agrupamento de meses calculados na primeira consulta e guardados.
+    """
+
+    def __init__(self, indice, valores, colunas=MESES):
+        self.indice = indice
+        self.valores = np.asarray(valores)
+        self.colunas = list(colunas)
+        self._agregados = {}
+
+    @classmethod
+    def de_dataframe(cls, df, colunas=MESES):
+        """Tabela de UFs a partir de um DataFrame no esquema de dengue_data_raw.csv (a linha TOTAL é ignorada)."""
+        df = df[df['UF_Notificacao'] != 'TOTAL']
+        return cls(IndiceGeografico.de_nomes(list(df['UF_Notificacao'])), df[colunas].to_numpy(), colunas)
+
+    def agregado(self, nivel, periodo=None):
+        """DataFrame nível × meses (ou × grupos de `periodo`, ver PERIODOS)."""
+        chave = (nivel, periodo)
+        if chave not in self._agregados:
+            if periodo is not None:
+                if self.colunas != MESES:
+                    raise ValueError("agrupamentos de meses só se aplicam a tabelas mensais")
+                valores = agregar_periodos(self.agregado(nivel).to_numpy(), periodo)
+                colunas = PERIODOS[periodo][0]
+            else:
+                valores = self.indice.agregar(self.valores, nivel)
+                colunas = self.colunas
+            self._agregados[chave] = pd.DataFrame(valores, index=self.indice.rotulos(nivel), columns=colunas)
+        return self._agregados[chave]
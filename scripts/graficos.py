@@ -0,0 +1,381 @@
+import concurrent.futures
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import caches
+
+# rcParams aplicados uma vez em cada processo que desenha
+ESTILO = {
+    'font.family': 'DejaVu Sans',
+    'axes.unicode_minus': False,
+}
+DPI_PADRAO = 300
+
+# gráficos desenhados, por impressão: gráficos idênticos são desenhados uma vez e copiados daqui
+ARMAZEM_PADRAO = caches.diretorio('graficos')
+# variante: (sufixo do arquivo, largura em pixels; None para vetorial). Todas saem do mesmo desenho.
+VARIANTES = {
+    'miniatura': ('.miniatura.png', 320),
+    'web': ('.web.png', 1280),
+    'webp': ('.web.webp', 1280),
+    'svg': ('.svg', None),
+}
+
+# o código de desenho entra na impressão de cada gráfico: mudá-lo invalida o cache
+with open(__file__, 'rb') as _fonte:
+    _CODIGO = _fonte.read()
+
+
+def grafico(tipo, arquivo, dados, titulo, xlabel=None, ylabel=None, tamanho=(12, 6), dpi=DPI_PADRAO, **opcoes):
+    """
+    Especificação de um gráfico: só dados, tipo e rótulos, sem nenhum estado
+    do matplotlib. Pode ser enviada a outro processo e desenhada lá por
+    renderizar(). As opções aceitas dependem do tipo (ver DESENHOS).
+    """
+    return dict(opcoes, tipo=tipo, arquivo=arquivo, dados=dados, titulo=titulo,
+                xlabel=xlabel, ylabel=ylabel, tamanho=tamanho, dpi=dpi)
+
+
+def milhoes(x, pos):
+    return f'{x/1e6:.1f}M' if x >= 1e6 else f'{x/1e3:.0f}K'
+
+
+FORMATOS = {'milhoes': milhoes}
+
+
+def _rotular(ax, spec):
+    ax.set_title(spec['titulo'], fontsize=spec.get('tamanho_titulo', 16))
+    if spec['xlabel']:
+        ax.set_xlabel(spec['xlabel'], fontsize=12)
+    if spec['ylabel']:
+        ax.set_ylabel(spec['ylabel'], fontsize=12)
+    if spec.get('grade'):
+        ax.grid(True, axis=spec['grade'], linestyle='--', alpha=0.7)
+    if spec.get('formato_y'):
+        from matplotlib.ticker import FuncFormatter
+        ax.yaxis.set_major_formatter(FuncFormatter(FORMATOS[spec['formato_y']]))
+    if spec.get('legenda'):
+        ax.legend(title=spec['legenda'], fontsize=10)
+
+
+def _linhas(figura, spec):
+    """dados: {rótulo da série: valores}; opção `x` com as categorias do eixo."""
+    ax = figura.add_subplot()
+    for rotulo, valores in spec['dados'].items():
+        ax.plot(spec['x'], valores, marker='o', linewidth=2, markersize=spec.get('tamanho_marcador', 6), label=rotulo)
+    if spec.get('destaque') is not None:
+        i = spec['destaque']
+        valor = list(spec['dados'].values())[0][i]
+        ax.annotate(f'Pico: {valor:,.0f}', xy=(i, valor), xytext=(i, valor * 1.1),
+                    arrowprops=dict(facecolor='red', shrink=0.05), fontsize=12)
+    _rotular(ax, spec)
+
+
+def _barras(figura, spec):
+    """dados: {categoria: valor}; opções `paleta` (ou uma `cor` só), `rotacao` e `valores` (rótulos nas barras)."""
+    import seaborn as sns
+    ax = figura.add_subplot()
+    categorias = list(spec['dados'])
+    cores = spec.get('cor') or sns.color_palette(spec.get('paleta', 'viridis'), len(categorias))
+    barras = ax.bar(categorias, list(spec['dados'].values()), color=cores)
+    ax.tick_params(axis='x', labelrotation=spec.get('rotacao', 0))
+    if spec.get('valores'):
+        for barra in barras:
+            altura = barra.get_height()
+            ax.text(barra.get_x() + barra.get_width() / 2., altura, f'{altura:,.0f}',
+                    ha='center', va='bottom', rotation=0, fontsize=9)
+    _rotular(ax, spec)
+
+
+def _barras_agrupadas(figura, spec):
+    """dados: DataFrame, uma barra por coluna em cada linha."""
+    ax = figura.add_subplot()
+    spec['dados'].astype(float).plot(kind='bar', stacked=False, width=0.7, ax=ax)
+    _rotular(ax, spec)
+
+
+def _mapa_calor(figura, spec):
+    """
+    dados: matriz; opções `linhas`, `colunas`, `cmap`, `anotar`, `rotulo_barra`, os limites `vmin`/`vmax` e
+    `quadrado` (células quadradas e separadas) ou só `separar` (linhas entre as células).
+    """
+    import seaborn as sns
+    ax = figura.add_subplot()
+    opcoes = {chave: spec[chave] for chave in ('vmin', 'vmax') if chave in spec}
+    if spec.get('quadrado'):
+        opcoes.update(square=True, linewidths=0.5)
+    elif spec.get('separar'):
+        opcoes.update(linewidths=0.5)
+    sns.heatmap(spec['dados'], annot=spec.get('anotar', False), fmt=spec.get('formato', '.0f'), cmap=spec['cmap'],
+                xticklabels=spec.get('colunas', 'auto'), yticklabels=spec.get('linhas', 'auto'), ax=ax, **opcoes)
+    if spec.get('rotulo_barra'):
+        ax.collections[0].colorbar.set_label(spec['rotulo_barra'])
+    _rotular(ax, spec)
+
+
+def _pizza(figura, spec):
+    """dados: {fatia: valor}."""
+    import seaborn as sns
+    ax = figura.add_subplot()
+    n = len(spec['dados'])
+    ax.pie(list(spec['dados'].values()), labels=list(spec['dados']), autopct='%1.1f%%',
+           startangle=90, shadow=True, explode=[0.05] * n, colors=sns.color_palette('viridis', n))
+    ax.axis('equal')
+    _rotular(ax, spec)
+
+
+def _dispersao(figura, spec):
+    """
+    dados: DataFrame indexado pelos rótulos dos pontos; opções `x` e `y` com
+    as colunas e `reta` (inclinação, intercepto) já ajustada, que sem ela é
+    ajustada aqui.
+    """
+    import numpy as np
+    ax = figura.add_subplot()
+    df = spec['dados']
+    x = df[spec['x']].to_numpy(dtype=float)
+    y = df[spec['y']].to_numpy(dtype=float)
+    ax.scatter(x, y, s=100, alpha=0.7)
+    inclinacao, intercepto = spec.get('reta') or np.polyfit(x, y, 1)
+    if np.isfinite(inclinacao):
+        limites = np.array([x.min(), x.max()])
+        ax.plot(limites, intercepto + inclinacao * limites, color='red')
+    for rotulo, xi, yi in zip(df.index, x, y):
+        ax.text(xi, yi, rotulo, fontsize=8)
+    _rotular(ax, spec)
+
+
+def _dispersao_3d(figura, spec):
+    """dados: DataFrame indexado pelos rótulos; opções `x`, `y`, `z` (colunas) e `zlabel`."""
+    ax = figura.add_subplot(projection='3d')
+    df = spec['dados']
+    pontos = ax.scatter(df[spec['x']], df[spec['y']], df[spec['z']], c=df[spec['z']], cmap='viridis', s=100, alpha=0.7)
+    for i, txt in enumerate(df.index):
+        ax.text(df[spec['x']].iloc[i], df[spec['y']].iloc[i], df[spec['z']].iloc[i], txt, fontsize=8)
+    ax.set_zlabel(spec['zlabel'], fontsize=12)
+    barra = figura.colorbar(pontos, ax=ax)
+    barra.set_label(spec['zlabel'], fontsize=10)
+    _rotular(ax, spec)
+
+
+DESENHOS = {
+    'linhas': _linhas,
+    'barras': _barras,
+    'barras_agrupadas': _barras_agrupadas,
+    'mapa_calor': _mapa_calor,
+    'pizza': _pizza,
+    'dispersao': _dispersao,
+    'dispersao_3d': _dispersao_3d,
+}
+
+
+def _iniciar_processo():
+    """Backend Agg e estilo, uma vez por processo."""
+    import matplotlib
+    matplotlib.use('Agg')
+    matplotlib.rcParams.update(ESTILO)
+    import seaborn  # noqa: F401  (importado aqui para não pesar em cada gráfico)
+
+
+def arquivos_variantes(arquivo, variantes=VARIANTES):
+    """Caminhos das variantes ao lado do PNG principal: x.png → x.miniatura.png, x.web.png, x.web.webp, x.svg."""
+    base = os.path.splitext(arquivo)[0]
+    return {variante: base + VARIANTES[variante][0] for variante in variantes}
+
+
+def _gravar_variantes(figura, principal, variantes):
+    """
+    Variantes de um gráfico já desenhado: as rasterizadas são reduções do PNG
+    principal (sem redesenhar), o SVG sai da mesma Figure.
+    """
+    from PIL import Image
+
+    imagem = None
+    for variante, caminho in arquivos_variantes(principal, variantes).items():
+        _, largura = VARIANTES[variante]
+        if largura is None:
+            figura.savefig(caminho, format='svg', metadata={'Date': None})
+            continue
+        if imagem is None:
+            with Image.open(principal) as original:
+                imagem = original.convert('RGB')
+        reduzida = imagem
+        if imagem.width > largura:
+            reduzida = imagem.resize((largura, round(imagem.height * largura / imagem.width)), Image.LANCZOS)
+        if caminho.endswith('.webp'):
+            reduzida.save(caminho, 'WEBP', quality=80)
+        else:
+            reduzida.save(caminho, 'PNG', optimize=True)
+
+
+def desenhar(spec, arquivo=None, variantes=()):
+    """
+    Desenha uma especificação numa Figure própria (sem pyplot) e grava o PNG
+    em `arquivo` (por padrão, o da especificação) e as `variantes` ao lado
+    dele. Retorna os segundos gastos.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    inicio = time.perf_counter()
+    arquivo = arquivo or spec['arquivo']
+    figura = Figure(figsize=spec['tamanho'])
+    FigureCanvasAgg(figura)
+    DESENHOS[spec['tipo']](figura, spec)
+    figura.tight_layout()
+    os.makedirs(os.path.dirname(arquivo) or '.', exist_ok=True)
+    figura.savefig(arquivo, dpi=spec['dpi'])
+    _gravar_variantes(figura, arquivo, variantes)
+    return time.perf_counter() - inicio
+
+
+def impressao(spec):
+    """
+    Hash do conteúdo de uma especificação (dados, rótulos e opções) e do
+    código de desenho: muda sempre que o PNG gerado mudaria. O caminho de
+    destino não entra, e gráficos iguais gravados em lugares diferentes
+    têm a mesma impressão.
+    """
+    import numpy as np
+    import pandas as pd
+
+    soma = hashlib.sha256(_CODIGO)
+
+    def percorrer(valor):
+        if isinstance(valor, (pd.DataFrame, pd.Series)):
+            colunas = list(valor.columns) if isinstance(valor, pd.DataFrame) else [valor.name]
+            soma.update(repr((type(valor).__name__, valor.shape, colunas)).encode())
+            soma.update(pd.util.hash_pandas_object(valor, index=True).to_numpy().tobytes())
+        elif isinstance(valor, np.ndarray):
+            soma.update(repr((valor.shape, str(valor.dtype))).encode())
+            soma.update(np.ascontiguousarray(valor).tobytes() if valor.dtype != object else repr(valor.tolist()).encode())
+        elif isinstance(valor, dict):
+            for chave in sorted(valor, key=repr):
+                soma.update(repr(chave).encode())
+                percorrer(valor[chave])
+        elif isinstance(valor, (list, tuple)):
+            soma.update(f'[{len(valor)}'.encode())
+            for item in valor:
+                percorrer(item)
+        else:
+            soma.update(repr(valor).encode())
+
+    percorrer({chave: valor for chave, valor in spec.items() if chave != 'arquivo'})
+    return soma.hexdigest()
+
+
+def _ler_impressoes(cache):
+    try:
+        with open(cache, encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return {}
+
+
+def _no_armazem(armazem, chave):
+    return os.path.join(armazem, chave[:2], chave, 'grafico.png')
+
+
+def _copiar(origem, destino):
+    # cópia, não link: quem regrava o destino no lugar (o cache do pipeline, por exemplo) não pode alterar o armazém
+    os.makedirs(os.path.dirname(destino) or '.', exist_ok=True)
+    shutil.copyfile(origem, destino + '.tmp')
+    os.replace(destino + '.tmp', destino)
+
+
+def _desenhar_no_armazem(spec, principal, variantes):
+    """Desenha num diretório temporário e move os arquivos para o armazém, para que outro processo nunca veja um gráfico pela metade."""
+    temporario = os.path.join(os.path.dirname(principal), f'.tmp-{os.getpid()}', os.path.basename(principal))
+    segundos = desenhar(spec, temporario, variantes)
+    for origem, destino in zip([temporario] + list(arquivos_variantes(temporario, variantes).values()),
+                               [principal] + list(arquivos_variantes(principal, variantes).values())):
+        os.replace(origem, destino)
+    os.rmdir(os.path.dirname(temporario))
+    return segundos
+
+
+def renderizar(specs, processos=None, cache=None, variantes=(), armazem=ARMAZEM_PADRAO):
+    """
+    Desenha as especificações num pool de processos (`processos=1` desenha
+    neste mesmo processo) e imprime o tempo de cada gráfico. Cada gráfico
+    sai como o PNG principal mais as `variantes` pedidas (ver VARIANTES).
+
+    Com `armazem`, os gráficos são guardados por impressão: especificações
+    iguais são desenhadas uma vez e um gráfico já guardado é só copiado para
+    o destino; passado o limite de tamanho (ver caches.py), saem do armazém
+    os gráficos usados há mais tempo. Com `cache` (um JSON arquivo →
+    impressão), gráficos cujos arquivos existem e cuja especificação não
+    mudou desde a última execução nem são copiados. Retorna {arquivo:
+    segundos} dos gráficos desenhados.
+    """
+    specs = list(specs)
+    variantes = list(variantes)
+    impressoes = {spec['arquivo']: impressao(spec) for spec in specs} if cache or armazem else {}
+
+    def completos(principal):
+        return all(os.path.exists(caminho) for caminho in
+                   [principal] + list(arquivos_variantes(principal, variantes).values()))
+
+    if cache:
+        anteriores = _ler_impressoes(cache)
+        pendentes = [spec for spec in specs if anteriores.get(spec['arquivo']) != impressoes[spec['arquivo']]
+                     or not completos(spec['arquivo'])]
+        if len(pendentes) < len(specs):
+            print(f"{len(specs) - len(pendentes)} gráfico(s) sem mudança, não redesenhados")
+        specs = pendentes
+
+    if armazem:
+        # um desenho por impressão ainda ausente do armazém
+        a_desenhar = {}
+        for spec in specs:
+            chave = impressoes[spec['arquivo']]
+            if chave not in a_desenhar and not completos(_no_armazem(armazem, chave)):
+                a_desenhar[chave] = spec
+        tarefas = [(spec, _no_armazem(armazem, chave)) for chave, spec in a_desenhar.items()]
+        funcao = _desenhar_no_armazem
+        for _, principal in tarefas:
+            os.makedirs(os.path.dirname(principal), exist_ok=True)
+    else:
+        tarefas = [(spec, spec['arquivo']) for spec in specs]
+        funcao = desenhar
+
+    processos = min(processos or os.cpu_count() or 1, len(tarefas) or 1)
+    tempos = {}
+    inicio = time.perf_counter()
+    if tarefas and processos == 1:
+        _iniciar_processo()
+        for spec, destino in tarefas:
+            tempos[spec['arquivo']] = funcao(spec, destino, variantes)
+            print(f"  {tempos[spec['arquivo']]:6.2f} s  {spec['arquivo']}")
+    elif tarefas:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_processo) as executor:
+            futuros = {executor.submit(funcao, spec, destino, variantes): spec['arquivo'] for spec, destino in tarefas}
+            for futuro in concurrent.futures.as_completed(futuros):
+                tempos[futuros[futuro]] = futuro.result()
+                print(f"  {tempos[futuros[futuro]]:6.2f} s  {futuros[futuro]}")
+
+    if armazem:
+        for spec in specs:
+            principal = _no_armazem(armazem, impressoes[spec['arquivo']])
+            caches.usar(os.path.dirname(principal))
+            _copiar(principal, spec['arquivo'])
+            for variante, caminho in arquivos_variantes(spec['arquivo'], variantes).items():
+                _copiar(arquivos_variantes(principal, [variante])[variante], caminho)
+        if tarefas:
+            caches.limitar(armazem, caches.CACHES['graficos'])
+        reaproveitados = len(specs) - len(tarefas)
+        if reaproveitados:
+            print(f"{reaproveitados} gráfico(s) copiados do armazém {armazem}, não redesenhados")
+    print(f"{len(tarefas)} gráficos em {time.perf_counter() - inicio:.2f} s "
+          f"({sum(tempos.values()):.2f} s de desenho, {processos} processo(s))")
+    if cache:
+        # relido agora: outra execução pode ter gravado entradas de outros gráficos
+        atuais = _ler_impressoes(cache)
+        atuais.update({spec['arquivo']: impressoes[spec['arquivo']] for spec in specs})
+        os.makedirs(os.path.dirname(os.path.abspath(cache)), exist_ok=True)
+        with open(cache, 'w', encoding='utf-8') as arquivo:
+            json.dump(atuais, arquivo, ensure_ascii=False, indent=1, sort_keys=True)
+    return tempos
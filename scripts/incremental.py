@@ -0,0 +1,248 @@
+import argparse
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from cubo_casos import (CSV_ANUAL, DIRETORIO_ANUAL, DIRETORIO_DERIVADOS, MESES, AcumuladorCubo, CuboCasos, abrir_cubo,
+                        converter_por_ano, ler_ano, ler_eixos)
+from parse_dengue import TAMANHO_BLOCO, gerar_blocos, ler_linhas
+from populacao import anos_do_rotulo
+from rastreamento import etapa
+
+# somas correntes guardadas ao lado do cubo
+ARQUIVO_AGREGADOS = 'agregados.npz'
+
+
+class Agregados:
+    """
+    Somas correntes por UF e mês sobre todos os anos do cubo, e os casos com
+    mês ignorado por UF. Somas se combinam por adição: um ano novo (ou a
+    revisão de um ano já guardado) entra somando a diferença, e as tabelas
+    derivadas (regiões, trimestres, ranking, entradas da correlação) saem
+    daqui sem reler o histórico.
+    """
+
+    def __init__(self, ufs, casos=None, ignorados=None, anos=()):
+        self.ufs = list(ufs)
+        self.casos = np.zeros((len(self.ufs), len(MESES)), dtype=np.int64) if casos is None else np.asarray(casos, dtype=np.int64)
+        self.ignorados = np.zeros(len(self.ufs), dtype=np.int64) if ignorados is None else np.asarray(ignorados, dtype=np.int64)
+        self.anos = list(anos)
+
+    @classmethod
+    def do_cubo(cls, cubo):
+        """Somas de um cubo inteiro (o caminho lento, usado só quando não há somas guardadas)."""
+        return cls(cubo.ufs.categories, np.asarray(cubo.casos, dtype=np.int64).sum(axis=1),
+                   np.asarray(cubo.ignorados, dtype=np.int64).sum(axis=1), cubo.anos)
+
+    def _alinhar(self, ufs):
+        novas = [uf for uf in ufs if uf not in self.ufs]
+        if novas:
+            self.ufs += novas
+            self.casos = np.vstack([self.casos, np.zeros((len(novas), len(MESES)), dtype=np.int64)])
+            self.ignorados = np.concatenate([self.ignorados, np.zeros(len(novas), dtype=np.int64)])
+        return [self.ufs.index(uf) for uf in ufs]
+
+    def somar(self, ufs, casos, ignorados):
+        """Soma (ou, com valores negativos, desconta) contagens UF × mês das `ufs` dadas."""
+        posicoes = self._alinhar(list(ufs))
+        self.casos[posicoes] += np.asarray(casos, dtype=np.int64)
+        self.ignorados[posicoes] += np.asarray(ignorados, dtype=np.int64)
+
+    def combinar(self, outro):
+        """Junta as somas de outro Agregados (por exemplo, de anos processados à parte)."""
+        self.somar(outro.ufs, outro.casos, outro.ignorados)
+        self.anos += [ano for ano in outro.anos if ano not in self.anos]
+
+    def tabela(self):
+        """DataFrame no esquema de dengue_data_raw.csv (linha TOTAL primeiro)."""
+        valores = np.column_stack([self.ignorados, self.casos])
+        valores = np.column_stack([valores, valores.sum(axis=1)])
+        valores = np.vstack([valores.sum(axis=0), valores])
+        df = pd.DataFrame(valores, columns=['Ign_Em_Branco'] + MESES + ['Total'])
+        df.insert(0, 'UF_Notificacao', ['TOTAL'] + self.ufs)
+        return df
+
+    def salvar(self, diretorio=DIRETORIO_ANUAL):
+        np.savez(os.path.join(diretorio, ARQUIVO_AGREGADOS), ufs=np.array(self.ufs), casos=self.casos,
+                 ignorados=self.ignorados, anos=np.array(self.anos))
+
+    @classmethod
+    def carregar(cls, diretorio=DIRETORIO_ANUAL):
+        """Somas guardadas em `diretorio`, ou None se não houver."""
+        caminho = os.path.join(diretorio, ARQUIVO_AGREGADOS)
+        if not os.path.exists(caminho):
+            return None
+        with np.load(caminho) as dados:
+            return cls(dados['ufs'].tolist(), dados['casos'], dados['ignorados'], dados['anos'].tolist())
+
+
+def _sobrepostos(novos, existentes):
+    """
+    Pares (novo, existente) de rótulos diferentes que cobrem algum ano em
+    comum: '2024' contra '2014-2025', por exemplo, contaria 2024 duas vezes.
+    """
+    cobertos = {rotulo: set(anos_do_rotulo(rotulo)) for rotulo in list(novos) + list(existentes)}
+    return [(novo, existente) for novo in novos for existente in existentes
+            if novo != existente and cobertos[novo] & cobertos[existente]]
+
+
+def anexar(novo, diretorio=DIRETORIO_ANUAL):
+    """
+    Prepara a entrada no cubo por ano de `diretorio` dos anos de `novo` (um
+    CuboCasos mensal). Um ano que já existe é substituído, o que cobre meses
+    novos e revisões dos antigos. Só as fatias dos anos recebidos são lidas:
+    o custo não depende do tamanho do histórico. Retorna (cubo só com os anos
+    recebidos, nas UFs de todo o cubo, para CuboCasos.salvar_anos; Agregados
+    atualizados; diferença UF × ano × mês que entrou nas somas). Um rótulo
+    novo que cobre anos de outro já guardado é recusado com ValueError.
+    """
+    eixos = ler_eixos(diretorio)
+    conflitos = _sobrepostos(novo.anos, eixos['anos'] if eixos else [])
+    if conflitos:
+        raise ValueError('; '.join(f"{novo_ano!r} cobre anos de {existente!r}, já no cubo {diretorio}"
+                                   for novo_ano, existente in conflitos))
+    if eixos is not None and not eixos.get('por_ano'):
+        print("Cubo num arquivo só; convertendo para um arquivo por ano (uma única vez)")
+        converter_por_ano(diretorio)
+        eixos = ler_eixos(diretorio)
+    if eixos is None:
+        agregados = Agregados([])
+        ufs, anos = [], []
+    else:
+        ufs, anos = list(eixos['ufs']), list(eixos['anos'])
+        agregados = Agregados.carregar(diretorio)
+        if agregados is None or agregados.anos != anos:
+            print("Somas guardadas ausentes ou desatualizadas; recalculando a partir do cubo")
+            agregados = Agregados.do_cubo(abrir_cubo(diretorio))
+
+    ufs += [uf for uf in novo.ufs.categories if uf not in ufs]
+    linhas = [ufs.index(uf) for uf in novo.ufs.categories]
+    casos = np.zeros((len(ufs), len(novo.anos), len(MESES)), dtype=np.int32)
+    ignorados = np.zeros((len(ufs), len(novo.anos)), dtype=np.int32)
+    casos[linhas] = novo.casos
+    ignorados[linhas] = novo.ignorados
+
+    anterior_casos = np.zeros(casos.shape, dtype=np.int64)
+    anterior_ignorados = np.zeros(ignorados.shape, dtype=np.int64)
+    for j, ano in enumerate(novo.anos):
+        if ano in anos:
+            anterior_casos[:, j], anterior_ignorados[:, j] = ler_ano(diretorio, ano, len(ufs))
+    diferenca = casos.astype(np.int64) - anterior_casos
+    diferenca_ignorados = ignorados.astype(np.int64) - anterior_ignorados
+
+    agregados.somar(ufs, diferenca.sum(axis=1), diferenca_ignorados.sum(axis=1))
+    agregados.anos = anos + [ano for ano in novo.anos if ano not in anos]
+    return CuboCasos(casos, ignorados, ufs, novo.anos), agregados, diferenca
+
+
+def atualizar_derivados(agregados, caminho_csv=CSV_ANUAL, saida=DIRETORIO_DERIVADOS, covariaveis=None):
+    """
+    Regrava, a partir das somas, a tabela de todos os anos no esquema de
+    dengue_data_raw.csv (em `caminho_csv`, não no CSV do parse) e, em
+    `saida`, as tabelas derivadas: casos por região e por trimestre, ranking
+    dos estados e entradas da correlação. `saida` não é o diretório de
+    visualize_dengue.py nem o de correlation_analysis.py, cujas tabelas são
+    do parse e saem das etapas do pipeline. O custo depende do número de
+    UFs, não do de anos.
+    """
+    import correlation_analysis
+    import visualize_dengue
+    from juncao import carregar_covariaveis
+
+    df = agregados.tabela()
+    df.to_csv(caminho_csv, index=False)
+
+    df['Total_Calculado'] = df[MESES].sum(axis=1)
+    df_regioes, df_trimestres = visualize_dengue.preparar_dados(df)
+    os.makedirs(saida, exist_ok=True)
+    visualize_dengue.salvar_tabelas(df, df_regioes, df_trimestres, saida)
+
+    if covariaveis is None:
+        covariaveis = carregar_covariaveis()
+    df_correlacao = correlation_analysis.montar_dados_correlacao(df, covariaveis, agregados.anos)
+    df_correlacao.to_csv(os.path.join(saida, 'dados_correlacao.csv'))
+
+
+def _exportacoes(entradas):
+    """As entradas, com cada diretório trocado pelos seus arquivos em ordem."""
+    arquivos = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            arquivos += sorted(os.path.join(entrada, nome) for nome in os.listdir(entrada)
+                               if os.path.isfile(os.path.join(entrada, nome)))
+        else:
+            arquivos.append(entrada)
+    return arquivos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Acrescenta ao cubo os anos de novas exportações do TabNet e atualiza as tabelas derivadas '
+                    'sem reprocessar o histórico.')
+    parser.add_argument('entradas', nargs='+', help='exportações do TabNet com os períodos novos (ou diretórios com elas)')
+    parser.add_argument('--ano', default=None,
+                        help='rótulo do ano das entradas; um ano já guardado é substituído (meses novos e revisões). '
+                             'Sem ele, cada arquivo é um ano, com o rótulo no nome (2024.txt)')
+    parser.add_argument('--cubo', default=DIRETORIO_ANUAL,
+                        help='diretório do cubo por ano (separado do cubo de parse_dengue.py)')
+    parser.add_argument('--reiniciar', action='store_true', help='apaga o cubo antes: ele fica só com as entradas')
+    parser.add_argument('--csv', default=CSV_ANUAL,
+                        help='CSV no esquema de dengue_data_raw.csv a regravar com a soma de todos os anos')
+    parser.add_argument('--derivados', default=DIRETORIO_DERIVADOS,
+                        help='diretório das tabelas derivadas das somas (regiões, trimestres, ranking, correlação)')
+    parser.add_argument('--encoding', default='utf-8', help='codificação dos arquivos de entrada (TabNet usa latin-1)')
+    parser.add_argument('--tamanho-bloco', type=int, default=TAMANHO_BLOCO, help='linhas por bloco em memória')
+    parser.add_argument('--sem-derivados', action='store_true', help='atualiza só o cubo e as somas')
+    args = parser.parse_args(argv)
+
+    arquivos = _exportacoes(args.entradas)
+    if not arquivos:
+        parser.error(f"nenhuma exportação em {', '.join(args.entradas)}")
+    if args.ano is not None:
+        lotes = {args.ano: arquivos}
+    else:
+        lotes = {}
+        for arquivo in arquivos:
+            rotulo = os.path.splitext(os.path.basename(arquivo))[0]
+            if rotulo in lotes:
+                parser.error(f"duas exportações para o ano {rotulo}: {lotes[rotulo][0]} e {arquivo}")
+            lotes[rotulo] = [arquivo]
+    for rotulo in lotes:
+        try:
+            anos_do_rotulo(rotulo)
+        except ValueError as erro:
+            parser.error(str(erro))
+    if args.reiniciar and os.path.isdir(args.cubo):
+        shutil.rmtree(args.cubo)
+
+    for i, (ano, entradas) in enumerate(lotes.items()):
+        with etapa('parse_novos', arquivos=len(entradas), ano=ano) as medida:
+            acumulador = AcumuladorCubo(ano)
+            medida.linhas = sum(len(bloco) for bloco in acumulador.passar(
+                gerar_blocos(ler_linhas(entradas, args.encoding), args.tamanho_bloco)))
+            novo = acumulador.cubo()
+
+        with etapa('anexar', linhas=novo.casos.shape[0]):
+            try:
+                cubo, agregados, diferenca = anexar(novo, args.cubo)
+            except ValueError as erro:
+                parser.error(str(erro))
+
+        meses = [mes for mes, alterado in zip(MESES, diferenca.any(axis=(0, 1))) if alterado]
+        print(f"Ano {ano}: {int(diferenca.sum()):+d} casos; meses alterados: {', '.join(meses) or 'nenhum'}")
+
+        # as tabelas derivadas saem das somas de todos os anos: basta regravá-las depois do último
+        if not args.sem_derivados and i == len(lotes) - 1:
+            with etapa('atualizar_derivados', linhas=len(agregados.ufs)):
+                atualizar_derivados(agregados, args.csv, args.derivados)
+        # só os arquivos dos anos recebidos são escritos
+        with etapa('salvar_cubo', linhas=len(cubo.ufs)):
+            cubo.salvar_anos(args.cubo)
+            agregados.salvar(args.cubo)
+    print(f"Cubo com {len(agregados.anos)} ano(s) salvo em {args.cubo}")
+
+
+if __name__ == '__main__':
+    main()
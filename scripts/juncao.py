@@ -0,0 +1,85 @@
+import json
+import os
+import unicodedata
+
+import pandas as pd
+
+# tabelas de covariáveis a juntar aos casos; uma tabela nova entra só neste arquivo
+CONFIG_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'covariaveis.json')
+
+
+class ErroJuncao(KeyError):
+    """Chaves que não casaram numa junção feita com `estrito=True`."""
+
+    def __init__(self, sem_par):
+        self.sem_par = sem_par
+        super().__init__("; ".join(f"{nome}: sem covariável para {', '.join(chaves['sem_covariavel'])}"
+                                   for nome, chaves in sem_par.items() if chaves['sem_covariavel']))
+
+
+def normalizar_chaves(indice):
+    """Chaves geográficas comparáveis: texto em NFC, sem espaços nas pontas."""
+    return pd.Index([unicodedata.normalize('NFC', str(chave)).strip() for chave in indice], name=indice.name)
+
+
+def carregar_covariaveis(caminho_config=CONFIG_PADRAO):
+    """
+    Lê as tabelas de covariáveis declaradas em `caminho_config`: uma lista de
+    {"nome", "arquivo", "colunas": {coluna no arquivo: coluna na junção}}. A
+    primeira coluna de cada arquivo é a chave geográfica.
+    """
+    with open(caminho_config, encoding='utf-8') as arquivo:
+        declaracoes = json.load(arquivo)
+
+    tabelas = {}
+    for declaracao in declaracoes:
+        colunas = declaracao['colunas']
+        tabela = pd.read_csv(declaracao['arquivo'], index_col=0)
+        tabela = tabela[list(colunas)].rename(columns=colunas)
+        tabelas[declaracao['nome']] = tabela
+    return tabelas
+
+
+def juntar(base, tabelas, estrito=False):
+    """
+    Alinha as tabelas de covariáveis ({nome: DataFrame indexado pela chave
+    geográfica}) ao índice de `base` de uma vez, por reindexação, e devolve
+    `base` com as colunas novas.
+
+    As chaves que não casam são listadas por tabela ('sem_covariavel': da
+    base, sem linha na tabela; 'sem_caso': da tabela, fora da base) e
+    impressas; com `estrito=True`, chaves da base sem covariável levantam
+    ErroJuncao. Retorna (DataFrame, chaves sem par).
+    """
+    chaves = normalizar_chaves(base.index)
+    if chaves.has_duplicates:
+        raise ValueError(f"chaves repetidas na base: {', '.join(chaves[chaves.duplicated()].unique())}")
+
+    partes = []
+    sem_par = {}
+    colunas = base.columns
+    for nome, tabela in tabelas.items():
+        tabela = tabela.set_axis(normalizar_chaves(tabela.index), axis=0)
+        if tabela.index.has_duplicates:
+            raise ValueError(f"chaves repetidas em {nome}: "
+                             f"{', '.join(tabela.index[tabela.index.duplicated()].unique())}")
+        repetidas = colunas.intersection(tabela.columns)
+        if len(repetidas):
+            raise ValueError(f"colunas de {nome} já presentes na junção: {', '.join(repetidas)}")
+        colunas = colunas.append(tabela.columns)
+
+        sem_par[nome] = {'sem_covariavel': list(chaves.difference(tabela.index, sort=False)),
+                         'sem_caso': list(tabela.index.difference(chaves, sort=False))}
+        partes.append(tabela.reindex(chaves))
+
+    for nome, faltantes in sem_par.items():
+        if faltantes['sem_covariavel']:
+            print(f"Junção com {nome}: sem covariável para {', '.join(faltantes['sem_covariavel'])}")
+        if faltantes['sem_caso']:
+            print(f"Junção com {nome}: chaves sem casos ignoradas: {', '.join(faltantes['sem_caso'])}")
+    if estrito and any(faltantes['sem_covariavel'] for faltantes in sem_par.values()):
+        raise ErroJuncao(sem_par)
+
+    juntado = pd.concat([base.set_axis(chaves, axis=0)] + partes, axis=1)
+    juntado.index = base.index
+    return juntado, sem_par
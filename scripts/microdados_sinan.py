@@ -0,0 +1,163 @@
+import argparse
+import concurrent.futures
+import os
+
+import numpy as np
+import pandas as pd
+
+from cubo_casos import MESES, cubo_de_dataframes
+from geografia import UFS
+
+SAIDA_PADRAO = "/home/ubuntu/dengue_data_raw.csv"
+CONTAGENS_PADRAO = "/home/ubuntu/contagens_sinan.csv"
+TAMANHO_BLOCO = 500000
+
+# só as colunas usadas, nos menores tipos que comportam os códigos do SINAN
+COLUNAS = {
+    'DT_SIN_PRI': 'string',  # data dos primeiros sintomas
+    'NU_ANO': 'Int16',       # ano da notificação, usado quando falta a data
+    'SG_UF_NOT': 'Int8',
+    'ID_MUNICIP': 'Int32',
+    'NU_IDADE_N': 'Int16',   # unidade no primeiro dígito (1 hora, 2 dia, 3 mês, 4 ano) e valor nos demais
+    'SOROTIPO': 'Int8',
+    'CLASSI_FIN': 'Int8',
+}
+CLASSIFICACAO_DESCARTADO = 5
+
+# faixas etárias do TabNet; o código -1 é Ign/Branco
+LIMITES_IDADE = [1, 5, 10, 15, 20, 40, 60, 65, 70, 80]
+FAIXAS_ETARIAS = ['<1 Ano', '1-4', '5-9', '10-14', '15-19', '20-39', '40-59', '60-64', '65-69', '70-79', '80 e+']
+SOROTIPOS = {1: 'DENV1', 2: 'DENV2', 3: 'DENV3', 4: 'DENV4'}
+IGNORADO = 'Ign/Branco'
+
+CHAVES = ['Ano', 'Mes', 'UF', 'Municipio', 'Faixa_Etaria', 'Sorotipo']
+
+
+def _codigos_bloco(bloco, descartados=False):
+    """
+    Códigos inteiros de agrupamento de um bloco de notificações: ano e mês
+    dos primeiros sintomas (mês 0 quando a data falta), UF e município de
+    notificação (0 quando faltam), faixa etária e sorotipo (-1 e 0 quando
+    ignorados).
+    """
+    if not descartados:
+        bloco = bloco[bloco['CLASSI_FIN'].fillna(0) != CLASSIFICACAO_DESCARTADO]
+
+    data = pd.to_datetime(bloco['DT_SIN_PRI'].str.replace('-', '', regex=False), format='%Y%m%d', errors='coerce')
+    sem_data = data.isna().to_numpy()
+    ano = np.where(sem_data, bloco['NU_ANO'].fillna(0).to_numpy(dtype=np.int16),
+                   data.dt.year.fillna(0).to_numpy(dtype=np.int16))
+    mes = data.dt.month.fillna(0).to_numpy(dtype=np.int8)
+
+    idade = bloco['NU_IDADE_N'].fillna(0).to_numpy(dtype=np.int16)
+    unidade, valor = idade // 1000, idade % 1000
+    anos_idade = np.where(unidade == 4, valor, 0)
+    faixa = np.where((unidade >= 1) & (unidade <= 4), np.searchsorted(LIMITES_IDADE, anos_idade, side='right'), -1)
+
+    sorotipo = bloco['SOROTIPO'].fillna(0).to_numpy(dtype=np.int8)
+    return pd.DataFrame({
+        'Ano': ano,
+        'Mes': mes,
+        'UF': bloco['SG_UF_NOT'].fillna(0).to_numpy(dtype=np.int8),
+        'Municipio': bloco['ID_MUNICIP'].fillna(0).to_numpy(dtype=np.int32),
+        'Faixa_Etaria': faixa.astype(np.int8),
+        'Sorotipo': np.where(np.isin(sorotipo, list(SOROTIPOS)), sorotipo, 0).astype(np.int8),
+    })
+
+
+def agregar_arquivo(caminho, tamanho_bloco=TAMANHO_BLOCO, separador=',', encoding='latin-1', descartados=False):
+    """
+    Conta as notificações de um arquivo do SINAN por ano, mês, UF,
+    município, faixa etária e sorotipo, lendo-o em blocos de
+    `tamanho_bloco` linhas: só as contagens ficam na memória, somadas bloco
+    a bloco. Retorna uma Series de contagens com índice em CHAVES.
+    """
+    cabecalho = pd.read_csv(caminho, sep=separador, encoding=encoding, nrows=0).columns
+    faltantes = [coluna for coluna in COLUNAS if coluna not in cabecalho]
+    if faltantes:
+        raise ValueError(f"{caminho}: colunas ausentes: {', '.join(faltantes)}")
+
+    contagens = pd.Series(dtype=np.int64)
+    leitor = pd.read_csv(caminho, sep=separador, encoding=encoding, usecols=list(COLUNAS), dtype=COLUNAS,
+                         chunksize=tamanho_bloco)
+    for bloco in leitor:
+        parcial = _codigos_bloco(bloco, descartados).groupby(CHAVES).size()
+        contagens = contagens.add(parcial, fill_value=0) if len(contagens) else parcial
+    return contagens.astype(np.int64)
+
+
+def agregar_arquivos(caminhos, processos=None, **opcoes):
+    """
+    Agrega vários arquivos (um por ano, tipicamente) em paralelo, um
+    processo por arquivo, e soma as contagens. Retorna um DataFrame longo com
+    as colunas de CHAVES e Casos; faixa etária e sorotipo vêm como rótulos.
+    """
+    caminhos = list(caminhos)
+    processos = min(processos or os.cpu_count() or 1, len(caminhos) or 1)
+    if processos == 1:
+        partes = [agregar_arquivo(caminho, **opcoes) for caminho in caminhos]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processos) as executor:
+            futuros = [executor.submit(agregar_arquivo, caminho, **opcoes) for caminho in caminhos]
+            partes = [futuro.result() for futuro in futuros]
+
+    partes = [parte for parte in partes if len(parte)]
+    if not partes:
+        return pd.DataFrame(columns=CHAVES + ['Casos'])
+    contagens = pd.concat(partes).groupby(level=CHAVES).sum().rename('Casos').reset_index()
+    contagens['Faixa_Etaria'] = pd.Categorical.from_codes(contagens['Faixa_Etaria'].to_numpy(),
+                                                          FAIXAS_ETARIAS).add_categories(IGNORADO).fillna(IGNORADO)
+    contagens['Sorotipo'] = contagens['Sorotipo'].map(SOROTIPOS).fillna(IGNORADO)
+    return contagens
+
+
+def tabela_uf_mes(contagens, anos=None):
+    """
+    Monta, a partir das contagens, a tabela UF × mês no esquema de
+    dengue_data_raw.csv (linha TOTAL primeiro), somando os anos pedidos
+    (todos, por padrão). Códigos de UF desconhecidos vão para
+    Ignorado/exterior; casos sem data, para Ign_Em_Branco.
+    """
+    if anos is not None:
+        contagens = contagens[contagens['Ano'].isin(np.atleast_1d(anos))]
+    ufs = contagens['UF'].map(UFS).fillna('Ignorado/exterior')
+    por_mes = contagens.groupby([ufs, contagens['Mes']])['Casos'].sum().unstack(fill_value=0)
+    por_mes = por_mes.reindex(index=list(UFS.values()), columns=range(13), fill_value=0)
+
+    valores = por_mes.to_numpy(dtype=np.int64)
+    valores = np.column_stack([valores, valores.sum(axis=1)])
+    valores = np.vstack([valores.sum(axis=0), valores])
+    df = pd.DataFrame(valores, columns=['Ign_Em_Branco'] + MESES + ['Total'])
+    df.insert(0, 'UF_Notificacao', ['TOTAL'] + list(UFS.values()))
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Agrega microdados de notificações do SINAN nas tabelas UF × mês.')
+    parser.add_argument('arquivos', nargs='+', help='arquivos CSV do SINAN (um por ano)')
+    parser.add_argument('--saida', default=SAIDA_PADRAO, help='CSV UF × mês (esquema de dengue_data_raw.csv)')
+    parser.add_argument('--contagens', default=CONTAGENS_PADRAO,
+                        help='CSV com as contagens por ano, mês, UF, município, faixa etária e sorotipo')
+    parser.add_argument('--cubo', help='diretório onde gravar também o cubo UF × ano × mês (ver cubo_casos.py)')
+    parser.add_argument('--tamanho-bloco', type=int, default=TAMANHO_BLOCO, help='linhas lidas por bloco')
+    parser.add_argument('--separador', default=',', help='separador de campos dos arquivos')
+    parser.add_argument('--encoding', default='latin-1', help='codificação dos arquivos')
+    parser.add_argument('--descartados', action='store_true', help='inclui os casos descartados (CLASSI_FIN = 5)')
+    parser.add_argument('--processos', type=int, default=None, help='arquivos agregados em paralelo (padrão: número de CPUs)')
+    args = parser.parse_args(argv)
+
+    contagens = agregar_arquivos(args.arquivos, args.processos, tamanho_bloco=args.tamanho_bloco,
+                                 separador=args.separador, encoding=args.encoding, descartados=args.descartados)
+    contagens.to_csv(args.contagens, index=False)
+    tabela_uf_mes(contagens).to_csv(args.saida, index=False)
+    print(f"{contagens['Casos'].sum()} notificações agregadas em {len(contagens)} contagens")
+    print(f"Contagens salvas em {args.contagens}; tabela UF × mês em {args.saida}")
+
+    if args.cubo:
+        anos = sorted(contagens['Ano'].unique())
+        cubo_de_dataframes({int(ano): tabela_uf_mes(contagens, ano) for ano in anos}).salvar(args.cubo)
+        print(f"Cubo com {len(anos)} ano(s) salvo em {args.cubo}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,379 @@
+import argparse
+import concurrent.futures
+import itertools
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from geografia import CODIGOS_POR_NOME, MESES, REGIOES, IndiceGeografico
+from populacao import carregar_populacao, juntar_rotulos
+from rastreamento import etapa
+
+SAIDA = '/home/ubuntu/analise_correlacao'
+
+FAMILIAS = ['poisson', 'binomial_negativa']
+# covariáveis fixas por UF e tabelas mensais (UF × mês) que entram com defasagem
+ESTATICAS = ['IDH', 'Renda_Per_Capita', 'Taxa_Urbanizacao', 'Acesso_Saneamento', 'Densidade_Demografica']
+CLIMATICAS = ['temperatura', 'precipitacao']
+
+MAX_ITERACOES = 50
+TOLERANCIA = 1e-8
+LIMITE_ELEMENTOS = 1 << 22  # elementos de (modelos × observações × termos) por lote
+ALFA_MINIMO = 1e-6  # piso do alfa da NB: sem sobredispersão o máximo fica na fronteira alfa = 0
+
+_dados = None  # DadosModelo do processo, definido pelo inicializador do pool
+
+
+class DadosModelo:
+    """
+    Observações UF × mês empilhadas e a matriz de planejamento comum a todos
+    os modelos: intercepto, covariáveis fixas padronizadas e cada tabela
+    climática padronizada em cada defasagem. Um modelo é só uma escolha de
+    colunas dessa matriz e de um conjunto de UFs (região).
+
+    `casos` é um DataFrame UF × mês, `fixas` um DataFrame UF × covariável,
+    `mensais` um {nome: DataFrame UF × mês} e `exposicao` a população de
+    cada UF (entra como offset log).
+    """
+
+    def __init__(self, casos, fixas, mensais, exposicao, defasagens=range(4)):
+        ufs = list(casos.index)
+        n_ufs, n_meses = casos.shape
+        self.ufs = ufs
+        self.defasagens = list(defasagens)
+        self.y = casos.to_numpy(dtype=float).ravel()  # UF-major: uf0 jan, uf0 fev, ...
+        self.offset = np.repeat(np.log(np.asarray(exposicao, dtype=float) / n_meses), n_meses)
+
+        colunas = {'Intercepto': np.ones(len(self.y))}
+        for nome in fixas.columns:
+            colunas[nome] = np.repeat(fixas.loc[ufs, nome].to_numpy(dtype=float), n_meses)
+        for nome, tabela in mensais.items():
+            valores = tabela.loc[ufs, list(casos.columns)].to_numpy(dtype=float)
+            for defasagem in self.defasagens:
+                # na defasagem l, os casos do mês t ficam ao lado do clima do mês t - l (ciclo anual)
+                colunas[f'{nome}_d{defasagem}'] = np.roll(valores, defasagem, axis=1).ravel()
+        self.nomes = list(colunas)
+        matriz = np.column_stack(list(colunas.values()))
+        desvio = matriz[:, 1:].std(axis=0)
+        matriz[:, 1:] = (matriz[:, 1:] - matriz[:, 1:].mean(axis=0)) / np.where(desvio > 0, desvio, 1)
+        self.matriz = matriz
+        self.posicao = {nome: i for i, nome in enumerate(self.nomes)}
+
+        indice = IndiceGeografico([CODIGOS_POR_NOME[uf] for uf in ufs])
+        regiao = indice.rotulos('regiao')
+        por_uf = np.asarray(regiao)[indice.pais['uf']]
+        self.regioes = ['Brasil'] + [nome for nome in REGIOES.values() if nome in regiao]
+        self.pesos = np.stack([np.ones(len(self.y))] + [np.repeat(por_uf == nome, n_meses).astype(float)
+                                                         for nome in self.regioes[1:]])
+
+    def colunas(self, termos, defasagem):
+        return [0] + [self.posicao[termo if termo not in CLIMATICAS else f'{termo}_d{defasagem}'] for termo in termos]
+
+
+def especificacoes(estaticas=ESTATICAS, climaticas=CLIMATICAS, defasagens=range(4), regioes=('Brasil',),
+                   familias=FAMILIAS, max_termos=3):
+    """
+    Todas as combinações de família, região e subconjunto de até
+    `max_termos` covariáveis; subconjuntos com clima são repetidos para cada
+    defasagem (todas as tabelas climáticas de um modelo com a mesma). Inclui
+    o modelo só com intercepto, base do pseudo-R².
+    """
+    specs = []
+    for familia, regiao in itertools.product(familias, regioes):
+        for k in range(max_termos + 1):
+            for termos in itertools.combinations(list(estaticas) + list(climaticas), k):
+                lags = defasagens if any(termo in climaticas for termo in termos) else [None]
+                specs += [(familia, regiao, defasagem, termos) for defasagem in lags]
+    return specs
+
+
+def _desvio(y, mu, alfa):
+    """Deviance unitária de Poisson (alfa = 0) ou binomial negativa NB2."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        termo_y = np.where(y > 0, y * np.log(y / mu), 0.0)
+        poisson = termo_y - (y - mu)
+        alfa = alfa[:, None]
+        nb = termo_y - (y + 1 / alfa) * np.log((1 + alfa * y) / (1 + alfa * mu))
+    return 2 * np.where(alfa > 0, nb, poisson)
+
+
+def _log_verossimilhanca(y, mu, alfa, pesos):
+    from scipy import special
+    lgamma_y = special.gammaln(y + 1)
+    poisson = y * np.log(mu) - mu - lgamma_y
+    ll = (pesos * poisson).sum(axis=1)
+    nb = alfa > 0
+    if nb.any():
+        r = 1 / alfa[nb, None]
+        termos = (special.gammaln(y + r) - special.gammaln(r) - lgamma_y + r * np.log(r / (r + mu[nb])) + y * np.log(mu[nb] / (r + mu[nb])))
+        ll[nb] = (pesos[nb] * termos).sum(axis=1)
+    return ll
+
+
+def _passo_alfa(y, mu, alfa, pesos):
+    """
+    Um passo de Newton no log do alfa de cada modelo, maximizando a
+    log-verossimilhança NB2 com mu fixo (verossimilhança perfilada). Em
+    log alfa o passo não sai do domínio; é limitado a ±1 e, onde a curvatura
+    não é negativa, vira um passo de subida de tamanho 1.
+    """
+    from scipy import special
+    r = 1 / alfa[:, None]
+    soma = r + mu
+    # derivadas em r = 1/alfa, escritas sem diferenças de termos grandes quando r é grande
+    escore = (pesos * (special.digamma(y + r) - special.digamma(r) - np.log1p(mu / r) + (mu - y) / soma)).sum(axis=1)
+    curvatura = (pesos * (special.polygamma(1, y + r) - special.polygamma(1, r) + mu / (r * soma)
+                          - (mu - y) / soma ** 2)).sum(axis=1)
+    # em log alfa: dr/dlog(alfa) = -r
+    r = r[:, 0]
+    gradiente = -r * escore
+    hessiana = r ** 2 * curvatura + r * escore
+    with np.errstate(divide='ignore', invalid='ignore'):
+        passo = np.where(hessiana < 0, -gradiente / hessiana, np.sign(gradiente))
+    novo = np.maximum(alfa * np.exp(np.clip(passo, -1, 1)), ALFA_MINIMO)
+    # passo efetivo: no piso o alfa para de mudar mesmo com o gradiente apontando para baixo
+    return novo, np.log(novo / alfa)
+
+
+def _resolver(a, b, singular):
+    """
+    `np.linalg.solve` de um lote de sistemas. Se alguma matriz do lote for
+    singular, ela é marcada em `singular` (alterado no lugar) e resolvida
+    pela pseudoinversa, para que um modelo sem informação não derrube o lote.
+    """
+    try:
+        return np.linalg.solve(a, b)
+    except np.linalg.LinAlgError:
+        # caminho de exceção: descobre sistema a sistema quais são os singulares
+        x = np.empty(b.shape)
+        for i in range(len(a)):
+            try:
+                x[i] = np.linalg.solve(a[i], b[i])
+            except np.linalg.LinAlgError:
+                singular[i] = True
+        x[singular] = np.linalg.pinv(a[singular]) @ b[singular]
+        return x
+
+
+def ajustar_lote(x, y, offset, pesos, familia, max_iteracoes=MAX_ITERACOES, tolerancia=TOLERANCIA):
+    """
+    IRLS de um lote de GLMs log-lineares com o mesmo número de termos:
+    `x` é (modelos × observações × termos), `pesos` (modelos × observações)
+    escolhe as observações de cada modelo. Todas as iterações são produtos
+    matriciais e resoluções de sistemas empilhados. Na binomial negativa o
+    alfa de cada modelo parte do método dos momentos e, a cada iteração,
+    recebe um passo de Newton da verossimilhança perfilada (`_passo_alfa`);
+    na convergência é o alfa de máxima verossimilhança, e a NB entra no AIC
+    em pé de igualdade com a Poisson. Modelos cuja matriz de informação fica
+    singular em alguma iteração saem com `singular` e não contam como
+    ajustados.
+    """
+    b, n, k = x.shape
+    n_efetivo = pesos.sum(axis=1)
+    mu = np.broadcast_to((y + y.mean()) / 2, (b, n)).copy()
+    eta = np.log(mu)
+    alfa = np.zeros(b)
+    passo = np.zeros(b)
+    desvio = np.full(b, np.inf)
+    iteracoes = np.zeros(b, dtype=int)
+    convergiu = np.zeros(b, dtype=bool)
+    singular = np.zeros(b, dtype=bool)
+    for iteracao in range(1, max_iteracoes + 1):
+        w = pesos * mu / (1 + alfa[:, None] * mu)
+        z = eta - offset + (y - mu) / mu
+        xw = x * w[..., None]
+        informacao = np.einsum('bnk,bnj->bkj', xw, x)
+        beta = _resolver(informacao, np.einsum('bnk,bn->bk', xw, z)[..., None], singular)[..., 0]
+        eta = np.clip(np.einsum('bnk,bk->bn', x, beta) + offset, -50, 50)
+        mu = np.exp(eta)
+        if familia == 'binomial_negativa':
+            if iteracao == 1:
+                momentos = (pesos * ((y - mu) ** 2 - mu) / mu ** 2).sum(axis=1) / np.maximum(n_efetivo - k, 1)
+                alfa = np.maximum(momentos, ALFA_MINIMO)
+            else:
+                alfa, passo = _passo_alfa(y, mu, alfa, pesos)
+        novo = (pesos * _desvio(y, mu, alfa)).sum(axis=1)
+        # a deviance muda com o alfa; na NB o alfa também precisa ter parado
+        recem = ~convergiu & (np.abs(novo - desvio) <= tolerancia * (np.abs(novo) + 0.1)) \
+            & (np.abs(passo) <= math.sqrt(tolerancia))
+        iteracoes[~convergiu] = iteracao
+        convergiu |= recem
+        desvio = novo
+        if (convergiu | singular).all():
+            break
+
+    w = pesos * mu / (1 + alfa[:, None] * mu)
+    covariancia = _resolver(np.einsum('bnk,bnj->bkj', x * w[..., None], x),
+                             np.broadcast_to(np.eye(k), (b, k, k)), singular)
+    with np.errstate(invalid='ignore'):  # diagonal da pseudoinversa dos singulares, que são descartados
+        erro_padrao = np.sqrt(np.diagonal(covariancia, axis1=1, axis2=2))
+    return {
+        'beta': beta,
+        'erro_padrao': erro_padrao,
+        'alfa': alfa,
+        'desvio': desvio,
+        'log_verossimilhanca': _log_verossimilhanca(y, mu, alfa, pesos),
+        'iteracoes': iteracoes,
+        'convergiu': convergiu & ~singular,
+        'singular': singular,
+        'n': n_efetivo,
+    }
+
+
+def _iniciar(dados):
+    global _dados
+    _dados = dados
+
+
+def _ajustar_tarefa(familia, colunas, regioes):
+    """Ajusta um lote (mesma família e número de termos) a partir dos dados do processo."""
+    x = np.moveaxis(_dados.matriz[:, colunas], 0, 1)  # (modelos × observações × termos)
+    pesos = _dados.pesos[regioes]
+    # modelos sem posto completo nas observações da sua região não são identificáveis
+    posto = np.linalg.matrix_rank(x * np.sqrt(pesos)[..., None])
+    validos = posto == colunas.shape[1]
+    resultado = {'validos': validos}
+    if validos.any():
+        resultado.update(ajustar_lote(x[validos], _dados.y, _dados.offset, pesos[validos], familia))
+    return resultado
+
+
+def _tarefas(dados, specs):
+    """Agrupa as especificações em lotes de mesma família e número de termos."""
+    grupos = {}
+    for i, (familia, regiao, defasagem, termos) in enumerate(specs):
+        grupos.setdefault((familia, len(termos)), []).append(i)
+    tarefas = []
+    for (familia, k), indices in grupos.items():
+        tamanho = max(1, LIMITE_ELEMENTOS // (len(dados.y) * (k + 1)))
+        for inicio in range(0, len(indices), tamanho):
+            lote = indices[inicio:inicio + tamanho]
+            colunas = np.array([dados.colunas(specs[i][3], specs[i][2]) for i in lote])
+            regioes = np.array([dados.regioes.index(specs[i][1]) for i in lote])
+            tarefas.append((lote, familia, colunas, regioes))
+    return tarefas
+
+
+def ajustar_modelos(dados, specs, processos=None):
+    """
+    Ajusta todas as especificações (ver `especificacoes`) em lotes
+    vetorizados, distribuídos entre processos, e devolve a tabela de
+    modelos ordenada por AIC dentro de cada região, com peso de Akaike e
+    pseudo-R² de McFadden contra o modelo só com intercepto da mesma
+    família e região. Os ajustes que não convergiram vêm depois dos demais
+    da região, sem Delta_AIC nem peso de Akaike.
+    """
+    tarefas = _tarefas(dados, specs)
+    processos = min(processos or os.cpu_count() or 1, len(tarefas))
+    argumentos = [tarefa[1:] for tarefa in tarefas]
+    if processos <= 1:
+        _iniciar(dados)
+        resultados = [_ajustar_tarefa(*args) for args in argumentos]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processos, initializer=_iniciar,
+                                                    initargs=(dados,)) as executor:
+            resultados = list(executor.map(_ajustar_tarefa, *zip(*argumentos)))
+
+    termos_possiveis = sorted({termo for spec in specs for termo in spec[3]}, key=lambda t: (t in CLIMATICAS, t))
+    linhas = []
+    for (lote, familia, colunas, regioes), resultado in zip(tarefas, resultados):
+        ajustado = np.flatnonzero(resultado['validos'])
+        posicao = {indice: j for j, indice in enumerate(ajustado)}
+        for m, i in enumerate(lote):
+            _, regiao, defasagem, termos = specs[i]
+            linha = {'Regiao': regiao, 'Familia': familia, 'Defasagem': defasagem,
+                     'Termos': ' + '.join(termos) or '(intercepto)', 'k': len(termos) + 1,
+                     'Identificavel': m in posicao and not resultado['singular'][posicao[m]]}
+            if linha['Identificavel']:
+                j = posicao[m]
+                linha.update({
+                    'n': int(resultado['n'][j]), 'Convergiu': bool(resultado['convergiu'][j]),
+                    'Iteracoes': int(resultado['iteracoes'][j]), 'Alfa': resultado['alfa'][j],
+                    'Deviance': resultado['desvio'][j], 'LogVerossimilhanca': resultado['log_verossimilhanca'][j],
+                })
+                for termo, beta, erro in zip(('Intercepto',) + termos, resultado['beta'][j], resultado['erro_padrao'][j]):
+                    linha[f'coef_{termo}'] = beta
+                    linha[f'ep_{termo}'] = erro
+            linhas.append(linha)
+
+    tabela = pd.DataFrame(linhas)
+    # sem posto completo ou com informação singular no IRLS: não ajustados
+    tabela = tabela[tabela['Identificavel']].drop(columns='Identificavel')
+    tabela = tabela.astype({'n': int, 'Iteracoes': int, 'Convergiu': bool, 'Defasagem': 'Int64'})
+    parametros = tabela['k'] + (tabela['Familia'] == 'binomial_negativa')
+    tabela['AIC'] = -2 * tabela['LogVerossimilhanca'] + 2 * parametros
+    tabela['BIC'] = -2 * tabela['LogVerossimilhanca'] + np.log(tabela['n']) * parametros
+    nulo = tabela[tabela['k'] == 1].set_index(['Familia', 'Regiao'])['LogVerossimilhanca']
+    tabela['R2_McFadden'] = 1 - tabela['LogVerossimilhanca'] / nulo.reindex(
+        pd.MultiIndex.from_frame(tabela[['Familia', 'Regiao']])).to_numpy()
+
+    # ajustes que não convergiram ficam no fim da região, fora do Delta_AIC e dos pesos
+    tabela['Ordem_Regiao'] = tabela['Regiao'].map({nome: i for i, nome in enumerate(dados.regioes)})
+    tabela = tabela.sort_values(['Ordem_Regiao', 'Convergiu', 'AIC'], ascending=[True, False, True])
+    tabela = tabela.drop(columns='Ordem_Regiao')
+    aic = tabela['AIC'].where(tabela['Convergiu'])
+    tabela['Delta_AIC'] = aic - aic.groupby(tabela['Regiao']).transform('min')
+    relativa = np.exp(-tabela['Delta_AIC'] / 2)
+    tabela['Peso_Akaike'] = relativa / relativa.groupby(tabela['Regiao']).transform('sum')
+    tabela.insert(0, 'Posto', tabela.groupby('Regiao', sort=False).cumcount() + 1)
+
+    coeficientes = [f'{prefixo}_{termo}' for termo in ['Intercepto'] + termos_possiveis for prefixo in ('coef', 'ep')]
+    inicio = ['Posto', 'Regiao', 'Familia', 'Defasagem', 'Termos', 'k', 'n', 'AIC', 'BIC', 'Delta_AIC',
+              'Peso_Akaike', 'R2_McFadden', 'LogVerossimilhanca', 'Deviance', 'Alfa', 'Convergiu', 'Iteracoes']
+    return tabela.reindex(columns=inicio + coeficientes).reset_index(drop=True)
+
+
+def carregar_dados(defasagens=range(4)):
+    """
+    DadosModelo com os casos mensais de cada UF, as covariáveis de
+    covariaveis.json e as tabelas climáticas mensais. A exposição é a
+    população média de cada UF nos anos do cubo (ver populacao.py).
+    """
+    from correlation_analysis import CLIMA_MENSAL
+    from cubo_casos import abrir_cubo, carregar_casos
+    from juncao import carregar_covariaveis, juntar
+
+    df = carregar_casos()
+    casos = df[~df['UF_Notificacao'].isin(['TOTAL', 'Ignorado/exterior'])].set_index('UF_Notificacao')[MESES]
+    fixas, _ = juntar(pd.DataFrame(index=casos.index), carregar_covariaveis())
+    mensais = {nome: pd.read_csv(arquivo, index_col=0) for nome, arquivo in CLIMA_MENSAL.items()}
+    exposicao = carregar_populacao().populacao('uf', [juntar_rotulos(abrir_cubo().anos)],
+                                              [CODIGOS_POR_NOME[uf] for uf in casos.index]).iloc[:, 0]
+    return DadosModelo(casos, fixas[ESTATICAS], mensais, exposicao, defasagens)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Ajusta em lote GLMs de Poisson e binomial negativa (casos mensais por UF, com offset de população) '
+                    'sobre subconjuntos de covariáveis, defasagens do clima e regiões, e ordena os modelos por AIC.')
+    parser.add_argument('--max-termos', type=int, default=3, help='maior número de covariáveis por modelo')
+    parser.add_argument('--defasagem-maxima', type=int, default=3, help='maior defasagem (meses) do clima')
+    parser.add_argument('--familias', nargs='+', choices=FAMILIAS, default=FAMILIAS)
+    parser.add_argument('--regioes', action='store_true', help='ajusta também cada região separadamente')
+    parser.add_argument('--processos', type=int, default=None, help='processos de ajuste (padrão: número de CPUs)')
+    parser.add_argument('--saida', default=os.path.join(SAIDA, 'modelos.csv'), help='tabela de modelos')
+    args = parser.parse_args(argv)
+
+    with etapa('carregar_dados') as medida:
+        dados = carregar_dados(range(args.defasagem_maxima + 1))
+        medida.linhas = len(dados.y)
+    specs = especificacoes(defasagens=dados.defasagens, familias=args.familias, max_termos=args.max_termos,
+                           regioes=dados.regioes if args.regioes else ('Brasil',))
+    with etapa('ajustar_modelos', linhas=len(specs), processos=args.processos):
+        tabela = ajustar_modelos(dados, specs, args.processos)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.saida)), exist_ok=True)
+    tabela.to_csv(args.saida, index=False)
+    print(f"{len(tabela)} modelos ajustados ({len(specs) - len(tabela)} não identificáveis, "
+          f"{int((~tabela['Convergiu']).sum())} sem convergência); tabela em {args.saida}")
+    for regiao, grupo in tabela.groupby('Regiao', sort=False):
+        melhor = grupo.iloc[0]
+        print(f"  {regiao:<12} {melhor['Familia']:<17} {melhor['Termos']}"
+              + (f" (defasagem {int(melhor['Defasagem'])})" if pd.notna(melhor['Defasagem']) else '')
+              + f"  AIC {melhor['AIC']:.1f}  R² {melhor['R2_McFadden']:.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,125 +1,565 @@
-import pandas as pd
-import io
+import argparse
+import collections
+import functools
+import itertools
+import math
+import os
 import re
+import sys
+
+import numpy as np
+import pandas as pd
 
-raw_data = """
-TOTAL 1641.329.8382.594.7944.114.9394.304.4283.015.182980.148404.895237.338186.481191.331275.864438.73318.074.135
-11 Rondônia 28.89610.28910.8056.4924.0932.3011.6341.0648521.2982.6994.41654.841
-12 Acre -18.54813.6759.4065.2294.2551.9711.8283.2938.75511.09613.04013.208104.304
-13 Amazonas -9.1599.2019.9958.2545.3723.4552.9502.3132.6443.3394.0765.47066.228
-14 Roraima -5044184074275305805386495965035904836.225
-15 Pará -12.17616.75517.89313.4408.9124.5163.2973.2992.6822.5883.5704.81293.940
-16 Amapá -2.2923.9273.9972.8372.0571.5081.6661.6251.1621.14977146423.455
-17 Tocantins 212.11712.58212.84012.86610.9974.8942.3251.6251.1161.4303.6737.93784.404
-21 Maranhão 26.24213.33519.77516.8109.3924.2662.5421.9821.3491.2181.4171.84080.170
-22 Piauí -3.4707.52716.75025.26221.58912.3426.1943.2471.5091.1041.1181.317101.429
-23 Ceará 610.59819.40035.68360.30570.54552.33533.03119.9439.9356.0526.4265.522329.781
-24 Rio Grande do Norte 610.46328.43339.86639.48837.89127.35919.60013.2027.0975.3104.7414.556238.012
-25 Paraíba 39.26114.99824.49026.64430.38521.24115.97610.4366.8355.0074.4846.709176.469
-26 Pernambuco 2626.78134.18745.23652.94950.69632.38622.69416.87814.44114.44423.21323.228357.159
-27 Alagoas 36.3568.33811.65915.48325.52024.92721.01513.3128.7127.0717.3175.256154.969
-28 Sergipe 11.3302.3602.7103.1193.8494.0384.5803.6703.2222.3062.8241.51535.524
-29 Bahia 833.42986.204147.735142.082105.46250.95532.50718.82612.83011.19512.19915.067668.499
-31 Minas Gerais 28302.550715.242995.867878.012521.123127.43732.16615.64014.67118.28335.30069.5633.725.882
-32 Espírito Santo -21.90421.16624.93822.44524.42119.58712.2017.6125.8886.6167.75513.049187.582
-33 Rio de Janeiro 463.158128.685141.872110.05675.61631.31015.7549.7337.5127.72311.29821.823624.544
-35 São Paulo 37361.857725.9641.376.4471.535.4101.087.765277.19476.63435.13928.33431.22645.24288.9825.670.231
-41 Paraná 999.578218.589408.988446.164287.96762.98617.6207.5516.2067.82014.16627.1261.604.770
-42 Santa Catarina 17.88038.441143.409229.478159.17038.0658.5312.4711.2941.3251.5363.406635.007
-43 Rio Grande do Sul 15.31124.112100.090172.306101.82516.2943.4331.1618037699361.242428.283
-50 Mato Grosso do Sul -40.72355.26769.95060.48139.68013.6536.0983.4702.8993.8279.39015.725321.163
-51 Mato Grosso 338.51543.92642.73543.30635.51816.9798.7945.5264.2094.8059.29216.430270.038
-52 Goiás 21139.499221.198286.882284.263223.75497.20840.62626.79524.29627.55939.53259.1041.470.737
-53 Distrito Federal 177.240120.567114.51290.81866.79830.36110.6616.8766.6326.2689.25920.483560.476
-00 Ignorado/exterior -1822--------13
-"""
+from rastreamento import etapa
 
 # Define column headers based on the TabNet interface
 columns = ["UF_Notificacao", "Ign_Em_Branco", "Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez", "Total"]
+colunas_numericas = columns[1:]
+
+ENTRADA_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'tabnet_uf_mes.txt')
+SAIDA_PADRAO = "/home/ubuntu/dengue_data_raw.csv"
+TAMANHO_BLOCO = 65536
+TAMANHO_LOTE = 4096  # linhas separadas juntas por separar_lote
+
+N_CAMPOS = len(colunas_numericas)  # Ign + 12 meses + Total
+LIMITE_CANDIDATOS = 8
+LIMITE_CACHE = 1 << 17
+LIMITE_COMBINACOES = 1 << 12  # combinações de candidatos testadas contra a linha TOTAL
+
+_CODIGO_UF = re.compile(r"^\d+\s+")
+# linha de texto do TabNet: (nome da UF sem o código, números concatenados), ou ('', '') se não for de dados
+_LINHA_TEXTO = re.compile(r"^[^\S\n]*(?:\d+[^\S\n]+)?(\S.*?)[^\S\n]+([0-9.-]+)[^\S\n]*$|^.*$", re.M)
+_GRUPOS = re.compile(r"(?:\.[0-9]{3})*")  # grupos de milhar de um número
+_GRUPO = re.compile(r"\.[0-9]{3}")
+
+
+class ErroSeparacao(ValueError):
+    """
+    Linha do TabNet cujos números concatenados não têm exatamente uma
+    separação consistente com o total da linha.
+    """
+
+    def __init__(self, texto, caminhos=0, candidatos=()):
+        self.texto = texto
+        self.nome = None
+        self.caminhos = caminhos
+        self.candidatos = list(candidatos)
+        super().__init__(f"{caminhos} separações consistentes para {texto!r}")
 
-data = []
-# Regex to split the state name/code from the numbers, and then split the numbers
-# This regex is complex due to the concatenated numbers and potential '-'
-# It assumes state name ends before the first digit or '-' that starts the numeric data
-pattern = re.compile(r"^(.*?)\s+(-?\d{1,3}(?:\.\d{3})*|-)\s*(\d.*|-\d.*)$", re.UNICODE)
-# Regex to find numbers separated by dots (potential thousands separators) or just digits, including potential negatives starting a sequence
-num_pattern = re.compile(r"(-?\d{1,3}(?:\.\d{3})*|-)")
-
-for line in io.StringIO(raw_data):
-    line = line.strip()
-    if not line:
-        continue
-
-    match = pattern.match(line)
-    if match:
-        uf_name = match.group(1).strip()
-        ign_branco = match.group(2).strip()
-        numbers_str = match.group(3).strip()
-
-        # Clean up state name (remove leading code if present)
-        uf_name = re.sub(r"^\d+\s+", "", uf_name)
-
-        # Clean Ign_Em_Branco
-        ign_branco = ign_branco.replace('.', '').replace('-', '0')
-
-        # Extract numbers using the num_pattern on the remaining string
-        # This needs refinement as simple findall might not respect order/boundaries correctly
-        # Let's try a simpler split approach first based on typical number lengths or look for patterns
-        # Trying findall first, might need adjustment
-        numbers = num_pattern.findall(numbers_str)
-
-        # Handle the special case for 'Ignorado/exterior' with dashes
-        if uf_name == 'Ignorado/exterior':
-             cleaned_numbers = ['0'] * 12 # 12 months
-             # Extract the last number which should be the total
-             total_match = re.search(r'(\d+)$', numbers_str)
-             if total_match:
-                 cleaned_numbers.append(total_match.group(1).replace('.', ''))
-             else:
-                 cleaned_numbers.append('0')
+
+def ler_linhas(caminhos, encoding='utf-8'):
+    """
+    Percorre linha a linha um ou mais arquivos exportados do TabNet,
+    sem carregar nenhum deles inteiro na memória.
+    """
+    for caminho in caminhos:
+        with open(caminho, encoding=encoding, errors='replace') as arquivo:
+            for linha in arquivo:
+                linha = linha.strip()
+                if linha:
+                    yield linha
+
+
+def parsear_linha_csv(linha):
+    """
+    Interpreta uma linha do CSV do TabNet (campos separados por ';').
+    Retorna None para cabeçalhos, rodapés e linhas sem valores numéricos.
+    """
+    campos = [campo.strip().strip('"') for campo in linha.split(';')]
+    if len(campos) != len(columns):
+        return None
+
+    valores = []
+    for campo in campos[1:]:
+        campo = campo.replace('.', '')
+        if campo in ('-', ''):
+            valores.append(0)
+        elif campo.isdigit():
+            valores.append(int(campo))
         else:
-            # Clean numbers by removing dots and replacing '-' with '0'
-            cleaned_numbers = [num.replace('.', '').replace('-', '0') for num in numbers]
-
-        # Combine the row
-        row = [uf_name, ign_branco] + cleaned_numbers
-
-        # Ensure the row has the correct number of columns (15)
-        if len(row) < len(columns):
-             row.extend(['0'] * (len(columns) - len(row))) # Pad with 0
-        elif len(row) > len(columns):
-             row = row[:len(columns)] # Truncate if too long
-
-        data.append(row)
-    else:
-        # Handle the 'Ignorado/exterior' case specifically if the main pattern fails
-        if 'Ignorado/exterior' in line:
-            parts = line.split('-')
-            uf_name = parts[0].strip()
-            ign_branco = '0'
-            cleaned_numbers = ['0'] * 12 # 12 months
-            total = parts[-1].strip().replace('.', '') if parts[-1].strip() else '0'
-            cleaned_numbers.append(total)
-            row = [uf_name, ign_branco] + cleaned_numbers
-            if len(row) == len(columns):
-                 data.append(row)
-            else:
-                 print(f"Skipping line (Ignorado/exterior format error): {line}")
+            return None
+
+    uf_name = _CODIGO_UF.sub("", campos[0])
+    return uf_name, valores
+
+
+def _numeros_em(texto, inicio):
+    """
+    Números que podem começar em `inicio`, como pares (fim, valor): '-' (zero)
+    ou de 1 a 3 dígitos sem zero à esquerda seguidos dos seus grupos de
+    milhar. Um '.' sempre continua o número com três dígitos; um '.' sem eles
+    invalida a divisão.
+    """
+    if texto[inicio] == '-':
+        return [(inicio + 1, 0)]
+    if texto[inicio] not in '123456789':
+        return []
+    numeros = []
+    for fim in range(inicio + 1, min(inicio + 3, len(texto)) + 1):
+        if texto[fim - 1] not in '0123456789':
+            break
+        final = _GRUPOS.match(texto, fim).end()
+        if not texto.startswith('.', final):
+            numeros.append((final, int(texto[inicio:final].replace('.', ''))))
+    return numeros
+
+
+def _limites(texto, n_campos):
+    """
+    limites[posição][k] = (menor, maior) soma de uma divisão de texto[posição:]
+    em exatamente k números, ou None se não há nenhuma.
+    """
+    limites = [[None] * n_campos for _ in range(len(texto) + 1)]
+    limites[len(texto)][0] = (0, 0)
+    for posicao in range(len(texto) - 1, -1, -1):
+        for fim, valor in _numeros_em(texto, posicao):
+            for k in range(1, n_campos):
+                resto = limites[fim][k - 1]
+                if resto is not None:
+                    atual = limites[posicao][k]
+                    menor, maior = valor + resto[0], valor + resto[1]
+                    limites[posicao][k] = (menor, maior) if atual is None else \
+                        (min(menor, atual[0]), max(maior, atual[1]))
+    return limites
+
+
+def _separacoes(texto, total, n, limite):
+    """
+    Divisões de `texto` em `n` números que somam `total`, por programação
+    dinâmica sobre (posição, números lidos, soma deles), descartando os
+    estados cuja soma não pode mais chegar ao total (_limites). Retorna
+    (quantidade de divisões, até `limite` delas).
+    """
+    limites = _limites(texto, n + 1)
+    # estados[posição][(números, soma)] = [caminhos, [(posição anterior, soma anterior, valor), ...]]
+    estados = [{} for _ in range(len(texto) + 1)]
+    estados[0][0, 0] = [1, []]
+    for posicao in range(len(texto)):
+        for (lidos, soma), (chegam, _) in estados[posicao].items():
+            if lidos == n:
+                continue
+            for fim, valor in _numeros_em(texto, posicao):
+                resto = limites[fim][n - lidos - 1]
+                if resto is not None and resto[0] <= total - soma - valor <= resto[1]:
+                    estado = estados[fim].setdefault((lidos + 1, soma + valor), [0, []])
+                    estado[0] += chegam
+                    estado[1].append((posicao, soma, valor))
+
+    divisoes = []
+
+    def refazer(posicao, lidos, soma, depois):
+        if len(divisoes) == limite:
+            return
+        if posicao == 0:
+            divisoes.append(depois)
+            return
+        for anterior, soma_anterior, valor in estados[posicao][lidos, soma][1]:
+            refazer(anterior, lidos - 1, soma_anterior, [valor] + depois)
+
+    final = estados[len(texto)].get((n, total))
+    if final is None:
+        return 0, []
+    refazer(len(texto), n, total, [])
+    return final[0], divisoes
+
+
+def separar_referencia(texto, n_campos=N_CAMPOS):
+    """
+    Separação de uma linha por programação dinâmica direta, a referência de
+    separar_lote. O último número vai até o fim do texto, então só há
+    alguns totais possíveis; para cada um, _separacoes procura as divisões
+    do que vem antes em `n_campos` - 1 números que somam esse total.
+
+    Retorna a única separação ou levanta ErroSeparacao com o número de
+    separações e até LIMITE_CANDIDATOS delas.
+    """
+    caminhos = 0
+    separacoes = []
+    for inicio in range(1, len(texto)):
+        for fim, total in _numeros_em(texto, inicio):
+            if fim == len(texto):
+                quantidade, divisoes = _separacoes(texto[:inicio], total, n_campos - 1,
+                                                   LIMITE_CANDIDATOS - len(separacoes))
+                caminhos += quantidade
+                separacoes += [divisao + [total] for divisao in divisoes]
+    if caminhos != 1:
+        raise ErroSeparacao(texto, caminhos, separacoes)
+    return separacoes[0]
+
+
+@functools.lru_cache(maxsize=LIMITE_CACHE)
+def _separar(texto, n_campos):
+    """
+    Separações de uma linha, com as mesmas regras de separar_referencia,
+    mas com os limites calculados uma vez só para a linha inteira. Como um
+    número só termina antes de um caractere que não é '.', os números que
+    terminam até o começo do total são os mesmos no texto todo e no trecho
+    antes dele; limites[posição][k] = (menor, maior) soma de uma divisão de
+    texto[:posição] em k números serve então a todos os totais possíveis.
+    De cada total a busca volta pelo texto com (posição, números que faltam,
+    soma que falta), memorizada, descartando o que os limites não permitem.
+
+    Retorna (quantidade de separações, até LIMITE_CANDIDATOS delas); as
+    linhas repetidas saem do cache.
+    """
+    fim_texto = len(texto)
+    # grupos[posição]: fim dos grupos de milhar que começam na posição (ela mesma se não há nenhum)
+    grupos = list(range(fim_texto + 1))
+    for posicao in range(fim_texto - 4, -1, -1):
+        if _GRUPO.match(texto, posicao):
+            grupos[posicao] = grupos[posicao + 4]
+    terminam = [[] for _ in range(fim_texto + 1)]  # (início, valor) dos números que terminam em cada posição
+    totais = []
+    for inicio, caractere in enumerate(texto):
+        numeros = []
+        if caractere == '-':
+            numeros.append((inicio + 1, 0))
+        elif caractere in '123456789':
+            for fim in range(inicio + 1, min(inicio + 3, fim_texto) + 1):
+                if texto[fim - 1] not in '0123456789':
+                    break
+                final = grupos[fim]
+                if final == fim_texto or texto[final] != '.':
+                    numeros.append((final, int(texto[inicio:final].replace('.', ''))))
+        for fim, valor in numeros:
+            (totais if fim == fim_texto else terminam[fim]).append((inicio, valor))
+    limites = [{} for _ in range(fim_texto + 1)]
+    limites[0][0] = (0, 0)
+    for fim in range(1, fim_texto):
+        destino = limites[fim]
+        for inicio, valor in terminam[fim]:
+            for k, (menor, maior) in limites[inicio].items():
+                if k < n_campos - 1:
+                    atual = destino.get(k + 1)
+                    destino[k + 1] = (valor + menor, valor + maior) if atual is None else \
+                        (min(valor + menor, atual[0]), max(valor + maior, atual[1]))
+
+    memoria = {}
+
+    def caminhos(fim, k, resto):
+        """Divisões de texto[:fim] em k números que somam `resto`."""
+        if k == 0:
+            return int(fim == 0 and resto == 0)
+        quantidade = memoria.get((fim, k, resto))
+        if quantidade is None:
+            quantidade = 0
+            for inicio, valor in terminam[fim]:
+                limite = limites[inicio].get(k - 1)
+                if limite is not None and limite[0] <= resto - valor <= limite[1]:
+                    quantidade += caminhos(inicio, k - 1, resto - valor)
+            memoria[fim, k, resto] = quantidade
+        return quantidade
+
+    separacoes = []
+
+    def refazer(fim, k, resto, depois):
+        if len(separacoes) == LIMITE_CANDIDATOS:
+            return
+        if k == 0:
+            separacoes.append(depois)
+            return
+        for inicio, valor in terminam[fim]:
+            if resto >= valor and caminhos(inicio, k - 1, resto - valor):
+                refazer(inicio, k - 1, resto - valor, [valor] + depois)
+
+    total_caminhos = 0
+    for inicio, total in totais:
+        limite = limites[inicio].get(n_campos - 1)
+        if inicio and limite is not None and limite[0] <= total <= limite[1]:
+            quantidade = caminhos(inicio, n_campos - 1, total)
+            if quantidade:
+                total_caminhos += quantidade
+                refazer(inicio, n_campos - 1, total, [total])
+    return total_caminhos, tuple(map(tuple, separacoes))
+
+
+def separar_lote(textos, n_campos=N_CAMPOS):
+    """
+    Separa os números concatenados de várias linhas do TabNet, feitas só de
+    dígitos, '.' e '-'. Retorna (valores, erros): uma matriz linhas ×
+    n_campos e um dicionário posição -> ErroSeparacao das linhas sem
+    exatamente uma separação. Cada linha passa por _separar, e o resultado
+    é o de separar_referencia aplicada a cada linha.
+    """
+    valores = np.zeros((len(textos), n_campos), dtype=np.int64)
+    erros = {}
+    for k, texto in enumerate(textos):
+        caminhos, separacoes = _separar(texto, n_campos)
+        if caminhos == 1:
+            valores[k] = separacoes[0]
         else:
-            print(f"Skipping line (no match): {line}") # Debugging unmatched lines
+            erros[k] = ErroSeparacao(texto, caminhos, map(list, separacoes))
+    return valores, erros
+
+
+def separar_numeros(texto, n_campos=N_CAMPOS):
+    """
+    Separa os números concatenados de uma linha copiada do TabNet (por exemplo
+    '28.89610.28910.805...'). Retorna a única separação consistente com o
+    total da linha ou levanta ErroSeparacao; ver separar_lote.
+    """
+    valores, erros = separar_lote([texto], n_campos)
+    if erros:
+        raise erros[0]
+    return valores[0].tolist()
+
+
+def parsear_linha_texto(linha):
+    """
+    Interpreta uma linha copiada da tabela do TabNet, em que os números
+    aparecem concatenados. Retorna None se a linha não for de dados e levanta
+    ErroSeparacao (com o nome da UF em `nome`) se os números não puderem ser
+    separados sem ambiguidade.
+    """
+    partes = linha.rsplit(None, 1)
+    if len(partes) != 2 or partes[1].strip('0123456789.-'):
+        return None
+
+    uf_name = _CODIGO_UF.sub("", partes[0].strip())
+    try:
+        return uf_name, separar_numeros(partes[1])
+    except ErroSeparacao as erro:
+        erro.nome = uf_name
+        raise
+
+
+def parsear_linha(linha):
+    """Escolhe o interpretador conforme o formato da linha."""
+    if ';' in linha:
+        return parsear_linha_csv(linha)
+    return parsear_linha_texto(linha)
+
+
+def parsear_lote(linhas):
+    """
+    Interpreta um lote de linhas, com os números de todas as linhas de texto
+    separados juntos por separar_lote. Retorna (nomes, valores, erros): o
+    nome da UF de cada linha (None se a linha não for de dados), a matriz
+    linhas × N_CAMPOS e um dicionário posição -> ErroSeparacao, com o nome
+    da UF em `nome`.
+    """
+    junto = '\n'.join(linhas)
+    nomes, textos = zip(*_LINHA_TEXTO.findall(junto)) if linhas else ((), ())
+    nomes = [nome or None for nome in nomes]
+    valores = np.zeros((len(linhas), N_CAMPOS), dtype=np.int64)
+    csv = []
+    if ';' in junto:
+        for i, linha in enumerate(linhas):
+            if ';' in linha:
+                csv.append(i)
+                registro = parsear_linha_csv(linha)
+                nomes[i] = None if registro is None else registro[0]
+                if registro is not None:
+                    valores[i] = registro[1]
+    posicoes = [i for i, texto in enumerate(textos) if texto]
+    posicoes = sorted(set(posicoes).difference(csv)) if csv else posicoes
+
+    separados, erros = separar_lote([textos[i] for i in posicoes])
+    valores[posicoes] = separados
+    for k, erro in erros.items():
+        erro.nome = nomes[posicoes[k]]
+    return nomes, valores, {posicoes[k]: erro for k, erro in erros.items()}
+
+
+def gerar_blocos(linhas, tamanho_bloco=TAMANHO_BLOCO, descartes=None, estrito=False):
+    """
+    Converte as linhas em blocos colunares tipados (DataFrames de cerca de
+    `tamanho_bloco` linhas). As linhas são lidas em lotes de TAMANHO_LOTE
+    (parsear_lote) e seus valores vão direto para um buffer NumPy
+    pré-alocado.
+
+    Linhas com mais de uma separação consistente ficam reservadas no buffer e
+    são decididas pela linha TOTAL da tabela quando ela termina (na próxima
+    linha TOTAL ou no fim da entrada); enquanto houver alguma pendente o bloco
+    não é emitido.
+
+    Cada linha descartada é avisada em stderr e contada por motivo em
+    `descartes` (um Counter), se dado. Com `estrito`, uma linha de dados
+    sem uma única separação levanta o seu ErroSeparacao em vez de ser
+    descartada.
+    """
+    nomes = []
+    valores = np.zeros((tamanho_bloco, N_CAMPOS), dtype=np.int64)
+    descartadas = []
+    total = None  # linha TOTAL da tabela atual
+    soma_emitida = np.zeros(N_CAMPOS, dtype=np.int64)  # linhas da tabela em blocos já emitidos
+    inicio_tabela = 0  # primeira linha da tabela atual no buffer
+    pendentes = []
+
+    def descartar(linha, erro=None):
+        motivo = 'no match' if erro is None else 'ambiguous' if erro.caminhos else 'no consistent split'
+        if estrito and erro is not None:
+            raise erro
+        print(f"Skipping line ({motivo}): {linha}", file=sys.stderr)
+        if descartes is not None:
+            descartes[motivo] += 1
+
+    # linhas do lote já no buffer cujos valores ainda não foram copiados, que são as últimas
+    origens = []
+
+    def copiar():
+        valores[len(nomes) - len(origens):len(nomes)] = valores_lote[origens]
+        origens.clear()
+
+    def acrescentar(inicio, fim):
+        nonlocal valores
+        while len(nomes) + fim - inicio > len(valores):
+            # buffer cheio enquanto há linhas pendentes
+            valores = np.concatenate([valores, np.zeros_like(valores)])
+        origens.extend(range(inicio, fim))
+        nomes.extend(nomes_lote[inicio:fim])
+
+    linhas = iter(linhas)
+    while lote := list(itertools.islice(linhas, TAMANHO_LOTE)):
+        nomes_lote, valores_lote, erros = parsear_lote(lote)
+        # só as linhas sem dados, com erro ou TOTAL são vistas uma a uma; as demais entram em trechos
+        especiais = sorted(erros.keys() | {i for i, nome in enumerate(nomes_lote) if nome is None or nome == 'TOTAL'})
+        especiais.append(len(lote))
+        proxima = 0
+        i = 0
+        while i < len(lote):
+            if i < especiais[proxima]:
+                fim = especiais[proxima] if pendentes else min(especiais[proxima], i + tamanho_bloco - len(nomes))
+                acrescentar(i, fim)
+                i = fim
+            else:
+                linha, nome, erro = lote[i], nomes_lote[i], erros.get(i)
+                proxima += 1
+                i += 1
+                if nome is None or erro is not None and (
+                        total is None or not erro.caminhos or erro.caminhos > len(erro.candidatos)):
+                    descartar(linha, erro)
+                    continue
+                if erro is not None:
+                    pendentes.append((len(nomes), linha, erro))
+                if nome == 'TOTAL':
+                    copiar()
+                    if pendentes:
+                        soma = soma_emitida + valores[inicio_tabela:len(nomes)].sum(axis=0)
+                        for posicao, linha_pendente, erro_pendente in _reconciliar(valores, total, soma, pendentes):
+                            descartar(linha_pendente, erro_pendente)
+                            descartadas.append(posicao)
+                        pendentes = []
+                    total = valores_lote[i - 1]
+                    soma_emitida[:] = 0
+                    inicio_tabela = len(nomes) + 1
+                acrescentar(i - 1, i)
+
+            if len(nomes) >= tamanho_bloco and not pendentes:
+                copiar()
+                soma_emitida += valores[inicio_tabela:len(nomes)].sum(axis=0)
+                yield montar_bloco(nomes, valores[:len(nomes)], descartadas)
+                nomes = []
+                descartadas = []
+                inicio_tabela = 0
+        copiar()
+
+    if pendentes:
+        soma = soma_emitida + valores[inicio_tabela:len(nomes)].sum(axis=0)
+        for posicao, linha_pendente, erro_pendente in _reconciliar(valores, total, soma, pendentes):
+            descartar(linha_pendente, erro_pendente)
+            descartadas.append(posicao)
+    if len(nomes) > len(descartadas):
+        yield montar_bloco(nomes, valores[:len(nomes)], descartadas)
+
+
+def _reconciliar(valores, total, soma, pendentes):
+    """
+    Decide as linhas ambíguas de uma tabela pela linha TOTAL: entre as
+    combinações dos candidatos de cada linha, fica a única que completa o
+    total junto com as linhas já resolvidas (`soma`). Grava os valores
+    escolhidos no buffer e retorna as pendentes que não puderam ser decididas.
+    """
+    grupos = [np.array(erro.candidatos, dtype=np.int64) for _, _, erro in pendentes]
+    formato = tuple(map(len, grupos))
+    if math.prod(formato) <= LIMITE_COMBINACOES:
+        # somas de todas as combinações, na ordem de np.unravel_index
+        somas = np.zeros((1, len(total)), dtype=np.int64)
+        for candidatos in grupos:
+            somas = (somas[:, None] + candidatos).reshape(-1, len(total))
+        encontradas = np.flatnonzero((somas == total - soma).all(axis=1))
+        if len(encontradas) == 1:
+            for (posicao, _, _), candidatos, escolha in zip(pendentes, grupos,
+                                                         np.unravel_index(encontradas[0], formato)):
+                valores[posicao] = candidatos[escolha]
+            return []
+    return pendentes
+
+
+def montar_bloco(nomes, valores, descartadas=()):
+    """Monta o DataFrame de um bloco a partir do buffer de valores."""
+    bloco = pd.DataFrame(valores.copy(), columns=colunas_numericas)
+    bloco.insert(0, 'UF_Notificacao', nomes)
+    if descartadas:
+        bloco = bloco.drop(index=descartadas).reset_index(drop=True)
+    return bloco
+
+
+def escrever_csv(blocos, caminho_saida):
+    """
+    Grava os blocos em sequência no CSV de saída, com o mesmo esquema de
+    dengue_data_raw.csv. Retorna o número de linhas gravadas.
+    """
+    total_linhas = 0
+    with open(caminho_saida, 'w', encoding='utf-8', newline='') as saida:
+        for bloco in blocos:
+            bloco.to_csv(saida, index=False, header=total_linhas == 0)
+            total_linhas += len(bloco)
+
+    if total_linhas == 0:
+        pd.DataFrame(columns=columns).to_csv(caminho_saida, index=False)
+    return total_linhas
+
+
+def parsear_arquivos(caminhos, caminho_saida, tamanho_bloco=TAMANHO_BLOCO, encoding='utf-8'):
+    """Processa os arquivos do TabNet em streaming e grava o CSV consolidado."""
+    return escrever_csv(gerar_blocos(ler_linhas(caminhos, encoding), tamanho_bloco), caminho_saida)
+
 
-# Create DataFrame
-df = pd.DataFrame(data, columns=columns)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Converte exportações do TabNet (texto ou CSV) em dengue_data_raw.csv.')
+    parser.add_argument('entradas', nargs='*', default=[ENTRADA_PADRAO], help='arquivos exportados do TabNet')
+    parser.add_argument('--saida', default=SAIDA_PADRAO, help='CSV de saída')
+    parser.add_argument('--tamanho-bloco', type=int, default=TAMANHO_BLOCO, help='linhas por bloco em memória')
+    parser.add_argument('--encoding', default='utf-8', help='codificação dos arquivos de entrada (TabNet usa latin-1)')
+    parser.add_argument('--cubo', help='diretório onde gravar também o cubo UF × ano × mês (ver cubo_casos.py)')
+    parser.add_argument('--ano', default=None, help='rótulo do ano das entradas no cubo')
+    parser.add_argument('--estrito', action='store_true',
+                        help='falha na primeira linha de dados sem uma única separação em vez de descartá-la')
+    args = parser.parse_args(argv)
+    if args.cubo:
+        from cubo_casos import ler_eixos
+        if (ler_eixos(args.cubo) or {}).get('por_ano'):
+            parser.error(f"{args.cubo} guarda um cubo por ano (incremental.py); use outro diretório em --cubo")
 
-# Convert numeric columns to appropriate types
-for col in columns[1:]: # Skip UF_Notificacao
-    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
+    output_path = args.saida
+    descartes = collections.Counter()
+    with etapa('parse', arquivos=len(args.entradas)) as medida:
+        blocos = gerar_blocos(ler_linhas(args.entradas, args.encoding), args.tamanho_bloco,
+                              descartes, args.estrito)
+        if args.cubo:
+            import cubo_casos
+            acumulador = cubo_casos.AcumuladorCubo(args.ano or cubo_casos.ANO_PADRAO)
+            blocos = acumulador.passar(blocos)
+        try:
+            total_linhas = medida.linhas = escrever_csv(blocos, output_path)
+        except ErroSeparacao as erro:
+            print(f"Linha de {erro.nome} sem uma única separação ({erro.caminhos} encontradas): {erro.texto}",
+                  file=sys.stderr)
+            raise SystemExit(1)
+        medida.atributos['descartadas'] = sum(descartes.values())
 
-# Save to CSV
-output_path = "/home/ubuntu/dengue_data_raw.csv"
-df.to_csv(output_path, index=False)
+    if descartes:
+        print(f"{sum(descartes.values())} linha(s) descartada(s): "
+              + ', '.join(f"{quantidade} {motivo}" for motivo, quantidade in descartes.most_common()),
+              file=sys.stderr)
+    print(f"Data saved to {output_path}")
+    if args.cubo:
+        with etapa('salvar_cubo'):
+            acumulador.cubo().salvar(args.cubo)
+        print(f"Cube saved to {args.cubo}")
+    print(f"{total_linhas} linhas processadas de {len(args.entradas)} arquivo(s)")
 
-print(f"Data saved to {output_path}")
-print(df.head().to_string())
-print(df.info())
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,387 @@
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import modulefinder
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from graficos import arquivos_variantes
+from rastreamento import RASTREIO
+
+DIRETORIO_SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_BASE = "/home/ubuntu"
+DIRETORIO_CACHE = os.path.join(DIRETORIO_BASE, '.cache_pipeline')
+
+CSV_DENGUE = os.path.join(DIRETORIO_BASE, 'dengue_data_raw.csv')
+CUBO_DENGUE = os.path.join(DIRETORIO_BASE, 'cubo_dengue')
+# cubo com um ano por fatia, montado pela etapa cubo_anual com incremental.py a partir de uma exportação do
+# TabNet por ano (<ano>.txt em EXPORTACOES_ANUAIS); o parse gera um só período
+CUBO_ANUAL = os.path.join(DIRETORIO_BASE, 'cubo_anual')
+EXPORTACOES_ANUAIS = os.path.join(DIRETORIO_SCRIPTS, '..', 'data', 'tabnet_anual')
+COMPLEMENTARES = os.path.join(DIRETORIO_BASE, 'dados_complementares')
+VISUALIZACOES = os.path.join(DIRETORIO_BASE, 'visualizacoes')
+CORRELACAO = os.path.join(DIRETORIO_BASE, 'analise_correlacao')
+VALIDACAO = os.path.join(DIRETORIO_BASE, 'validacao.json')
+SURTOS = os.path.join(DIRETORIO_BASE, 'surtos')
+COVARIAVEIS = os.path.join(DIRETORIO_SCRIPTS, '..', 'data', 'covariaveis.json')
+
+
+def _script(nome):
+    return os.path.join(DIRETORIO_SCRIPTS, nome)
+
+
+def _cubo_por_ano(diretorio):
+    """
+    Condição das etapas de previsão e de surtos: motivo para pular se
+    `diretorio` não tem um cubo com um ano por fatia (o mesmo critério de
+    previsao.py e deteccao_surtos.py).
+    """
+    try:
+        with open(os.path.join(diretorio, 'eixos.json'), encoding='utf-8') as arquivo:
+            anos = json.load(arquivo)['anos']
+    except FileNotFoundError:
+        return f"não há cubo em {diretorio}"
+    compostas = [str(ano) for ano in anos if not str(ano).strip().isdigit()]
+    if compostas:
+        return f"o cubo {diretorio} tem fatias de vários anos ({', '.join(compostas)})"
+    return None
+
+
+def _exportacoes_anuais():
+    """Condição da etapa cubo_anual: motivo para pular se não há exportações por ano."""
+    if not os.path.isdir(EXPORTACOES_ANUAIS) or not os.listdir(EXPORTACOES_ANUAIS):
+        return f"não há exportações por ano em {os.path.normpath(EXPORTACOES_ANUAIS)}"
+    return None
+
+
+def _com_variantes(caminhos):
+    """Os caminhos e, para cada PNG, as variantes que graficos.renderizar grava ao lado dele."""
+    return [saida for caminho in caminhos
+            for saida in [caminho] + (list(arquivos_variantes(caminho).values()) if caminho.endswith('.png') else [])]
+
+
+def modulos_locais(script, _memo={}):
+    """
+    Módulos de scripts/ que `script` importa, direta ou indiretamente,
+    inclusive os importados dentro de funções. A busca fica restrita a
+    scripts/: pandas, numpy e a biblioteca padrão não são percorridos.
+    """
+    if script not in _memo:
+        buscador = modulefinder.ModuleFinder(path=[DIRETORIO_SCRIPTS])
+        buscador.run_script(script)
+        _memo[script] = sorted(modulo.__file__ for nome, modulo in buscador.modules.items()
+                               if nome != '__main__' and modulo.__file__)
+    return _memo[script]
+
+
+class Etapa:
+    """
+    Um script do pipeline: o que ele lê (arquivos, diretórios e o próprio
+    código) e o que ele grava. As dependências entre etapas saem daí: uma
+    etapa depende de quem produz alguma de suas entradas. O código é o
+    script e os módulos de scripts/ que ele importa (ver `modulos_locais`),
+    mais os arquivos de `codigo`.
+    """
+
+    def __init__(self, nome, script, entradas=(), saidas=(), argumentos=(), codigo=(), condicao=None):
+        self.nome = nome
+        # função sem argumentos que devolve o motivo para pular a etapa, ou None
+        self.condicao = condicao
+        self.script = _script(script)
+        self.entradas = list(entradas)
+        self.saidas = list(saidas)
+        self.argumentos = list(argumentos)
+        self.extras = [_script(modulo) for modulo in codigo]
+
+    @property
+    def codigo(self):
+        return [self.script] + modulos_locais(self.script) + self.extras
+
+    def comando(self):
+        return [sys.executable, self.script] + self.argumentos
+
+
+ETAPAS = [
+    Etapa('parse', 'parse_dengue.py',
+          entradas=[os.path.join(DIRETORIO_SCRIPTS, '..', 'data', 'tabnet_uf_mes.txt')],
+          saidas=[CSV_DENGUE, CUBO_DENGUE],
+          argumentos=['--saida', CSV_DENGUE, '--cubo', CUBO_DENGUE]),
+    Etapa('clima', 'climate_socioeconomic_data.py',
+          saidas=_com_variantes(os.path.join(COMPLEMENTARES, arquivo) for arquivo in (
+              'temperatura_media_por_estado.csv', 'precipitacao_por_estado.csv',
+              'dados_socioeconomicos_por_estado.csv', 'heatmap_temperatura.png', 'heatmap_precipitacao.png',
+              'idh_por_estado.png', 'renda_por_estado.png', 'urbanizacao_por_estado.png',
+              'saneamento_por_estado.png'))),
+    # falha com dados inconsistentes, e as etapas que desenham ficam bloqueadas
+    Etapa('validacao', 'validacao.py',
+          entradas=[CSV_DENGUE, CUBO_DENGUE, COVARIAVEIS] + [os.path.join(COMPLEMENTARES, arquivo) for arquivo in (
+              'temperatura_media_por_estado.csv', 'precipitacao_por_estado.csv',
+              'dados_socioeconomicos_por_estado.csv')],
+          saidas=[VALIDACAO],
+          argumentos=['--saida', VALIDACAO]),
+    Etapa('visualizacoes', 'visualize_dengue.py',
+          entradas=[CSV_DENGUE, CUBO_DENGUE, VALIDACAO],
+          saidas=_com_variantes(os.path.join(VISUALIZACOES, arquivo) for arquivo in (
+              'casos_por_mes.png', 'top10_estados.png', 'heatmap_estados_meses.png', 'casos_por_regiao.png',
+              'distribuicao_por_regiao.png', 'casos_por_trimestre.png', 'dengue_por_regiao.csv',
+              'dengue_por_trimestre.csv', 'top10_estados.csv'))),
+    Etapa('correlacao', 'correlation_analysis.py',
+          entradas=[CSV_DENGUE, CUBO_DENGUE, VALIDACAO, COVARIAVEIS,
+                    os.path.join(DIRETORIO_SCRIPTS, '..', 'data', 'populacao_uf.csv')]
+          + [os.path.join(COMPLEMENTARES, arquivo) for arquivo in (
+              'temperatura_media_por_estado.csv', 'precipitacao_por_estado.csv',
+              'dados_socioeconomicos_por_estado.csv')],
+          saidas=_com_variantes(os.path.join(CORRELACAO, arquivo) for arquivo in (
+              'dados_correlacao.csv', 'matriz_correlacao.csv', 'correlacoes_ic.csv', 'matriz_correlacao.png',
+              'temp_vs_dengue.png', 'precip_vs_dengue.png', 'idh_vs_dengue.png', 'saneamento_vs_dengue.png',
+              'urbanizacao_vs_dengue.png', 'analise_multivariada.png', 'defasagem_temperatura.csv',
+              'defasagem_precipitacao.csv', 'defasagem_temperatura.png', 'defasagem_precipitacao.png'))),
+    # o cubo é refeito do zero a partir das exportações, sem tocar em dengue_data_raw.csv (que é do parse)
+    Etapa('cubo_anual', 'incremental.py',
+          entradas=[EXPORTACOES_ANUAIS],
+          saidas=[CUBO_ANUAL],
+          argumentos=[EXPORTACOES_ANUAIS, '--cubo', CUBO_ANUAL, '--reiniciar', '--sem-derivados'],
+          condicao=_exportacoes_anuais),
+    # o estado começa do zero a cada execução, para o cache não somar o mesmo ano duas vezes; o perfil de um
+    # ano só de dengue_data_raw.csv não tem ciclos anteriores, então a etapa lê o cubo por ano
+    Etapa('surtos', 'deteccao_surtos.py',
+          entradas=[CUBO_ANUAL],
+          saidas=[os.path.join(SURTOS, 'estado.npz'), os.path.join(SURTOS, 'alertas.csv')],
+          argumentos=['--cubo', CUBO_ANUAL, '--reiniciar', '--estado', os.path.join(SURTOS, 'estado.npz'),
+                      '--saida', os.path.join(SURTOS, 'alertas.csv')],
+          condicao=lambda: _cubo_por_ano(CUBO_ANUAL)),
+    Etapa('espacial', 'espacial.py',
+          entradas=[os.path.join(CORRELACAO, 'dados_correlacao.csv'),
+                    os.path.join(DIRETORIO_SCRIPTS, '..', 'data', 'vizinhanca_uf.csv')],
+          saidas=[os.path.join(DIRETORIO_BASE, 'analise_espacial', arquivo) for arquivo in (
+              'moran_global.csv', 'lisa.csv')]),
+    Etapa('previsao', 'previsao.py',
+          entradas=[CUBO_ANUAL],
+          saidas=[os.path.join(DIRETORIO_BASE, 'previsao', arquivo) for arquivo in (
+              'previsoes.csv', 'nowcast.csv', 'avaliacao.csv')],
+          argumentos=['--cubo', CUBO_ANUAL],
+          condicao=lambda: _cubo_por_ano(CUBO_ANUAL)),
+    Etapa('relatorios', 'relatorio.py',
+          entradas=[CSV_DENGUE, CUBO_DENGUE, os.path.join(CORRELACAO, 'matriz_correlacao.csv'),
+                    os.path.join(CORRELACAO, 'dados_correlacao.csv'), os.path.join(DIRETORIO_SCRIPTS, '..', 'templates')]
+          + [os.path.join(VISUALIZACOES, arquivo) for arquivo in (
+              'casos_por_mes.png', 'top10_estados.png', 'heatmap_estados_meses.png', 'casos_por_regiao.png',
+              'distribuicao_por_regiao.png', 'casos_por_trimestre.png')]
+          + [os.path.join(CORRELACAO, arquivo) for arquivo in (
+              'temp_vs_dengue.png', 'saneamento_vs_dengue.png', 'analise_multivariada.png', 'matriz_correlacao.png')],
+          saidas=[os.path.join(DIRETORIO_SCRIPTS, '..', 'relatorio_dengue.md'),
+                  os.path.join(DIRETORIO_SCRIPTS, '..', 'relatorio_expandido.md')]),
+]
+
+
+def _arquivos(caminho):
+    """O próprio arquivo, ou os arquivos de um diretório em ordem."""
+    if os.path.isdir(caminho):
+        for raiz, diretorios, arquivos in os.walk(caminho):
+            diretorios.sort()
+            for arquivo in sorted(arquivos):
+                yield os.path.join(raiz, arquivo)
+    elif os.path.exists(caminho):
+        yield caminho
+
+
+def hash_arquivo(caminho, _memo={}):
+    """SHA-256 do conteúdo, memorizado por (caminho, mtime, tamanho)."""
+    estado = os.stat(caminho)
+    chave = (caminho, estado.st_mtime_ns, estado.st_size)
+    if chave not in _memo:
+        sha = hashlib.sha256()
+        with open(caminho, 'rb') as arquivo:
+            for pedaco in iter(lambda: arquivo.read(1 << 20), b''):
+                sha.update(pedaco)
+        _memo[chave] = sha.hexdigest()
+    return _memo[chave]
+
+
+def chave_etapa(etapa):
+    """
+    Chave da etapa no cache: hash do comando, do código e do conteúdo de
+    todas as entradas. Entradas ausentes entram como tal na chave.
+    """
+    sha = hashlib.sha256()
+    sha.update(json.dumps(etapa.comando()[1:]).encode())
+    for caminho in etapa.codigo + etapa.entradas:
+        sha.update(os.path.normpath(caminho).encode())
+        arquivos = list(_arquivos(caminho))
+        if not arquivos:
+            sha.update(b'<ausente>')
+        for arquivo in arquivos:
+            sha.update(os.path.relpath(arquivo, caminho).encode())
+            sha.update(hash_arquivo(arquivo).encode())
+    return sha.hexdigest()
+
+
+def dependencias(etapas):
+    """Para cada etapa, as etapas que produzem alguma de suas entradas."""
+    produtores = {}
+    for etapa in etapas:
+        for saida in etapa.saidas:
+            produtores[os.path.normpath(saida)] = etapa.nome
+    return {etapa.nome: {produtores[os.path.normpath(entrada)] for entrada in etapa.entradas
+                         if os.path.normpath(entrada) in produtores} - {etapa.nome}
+            for etapa in etapas}
+
+
+class Cache:
+    """
+    Artefatos guardados por hash de conteúdo em `diretorio/objetos` e, para
+    cada chave de etapa, o manifesto de quais saídas ela produziu.
+    """
+
+    def __init__(self, diretorio=DIRETORIO_CACHE):
+        self.diretorio = diretorio
+        self.objetos = os.path.join(diretorio, 'objetos')
+        self.manifestos = os.path.join(diretorio, 'etapas')
+        os.makedirs(self.objetos, exist_ok=True)
+        os.makedirs(self.manifestos, exist_ok=True)
+
+    def _manifesto(self, etapa, chave):
+        return os.path.join(self.manifestos, f'{etapa.nome}-{chave}.json')
+
+    def restaurar(self, etapa, chave):
+        """
+        Deixa as saídas da etapa como na execução registrada sob `chave`,
+        copiando do cache só o que falta ou mudou. Retorna False sem registro.
+        """
+        try:
+            with open(self._manifesto(etapa, chave), encoding='utf-8') as arquivo:
+                saidas = json.load(arquivo)
+        except FileNotFoundError:
+            return False
+        if not all(os.path.exists(os.path.join(self.objetos, sha)) for sha in saidas.values()):
+            return False
+        for caminho, sha in saidas.items():
+            if not os.path.exists(caminho) or hash_arquivo(caminho) != sha:
+                os.makedirs(os.path.dirname(caminho), exist_ok=True)
+                shutil.copyfile(os.path.join(self.objetos, sha), caminho)
+        return True
+
+    def guardar(self, etapa, chave):
+        saidas = {}
+        for caminho in etapa.saidas:
+            arquivos = list(_arquivos(caminho))
+            if not arquivos:
+                raise FileNotFoundError(f"a etapa {etapa.nome} não gerou {caminho}")
+            for arquivo in arquivos:
+                sha = hash_arquivo(arquivo)
+                objeto = os.path.join(self.objetos, sha)
+                if not os.path.exists(objeto):
+                    shutil.copyfile(arquivo, objeto + '.tmp')
+                    os.replace(objeto + '.tmp', objeto)
+                saidas[arquivo] = sha
+        with open(self._manifesto(etapa, chave), 'w', encoding='utf-8') as arquivo:
+            json.dump(saidas, arquivo, ensure_ascii=False, indent=1)
+
+
+def _executar(etapa):
+    inicio = time.perf_counter()
+    # os registros de rastreamento das etapas saem com o identificador desta execução
+    resultado = subprocess.run(etapa.comando(), cwd=DIRETORIO_SCRIPTS, capture_output=True, text=True,
+                               env=dict(os.environ, DENGUE_RASTREIO_ID=RASTREIO))
+    return resultado, time.perf_counter() - inicio
+
+
+def executar(etapas=ETAPAS, selecionadas=None, processos=None, forcar=False, cache=None):
+    """
+    Roda as etapas em ordem de dependência, até `processos` ao mesmo tempo.
+    Uma etapa cujas entradas e código não mudaram desde uma execução
+    registrada não roda: suas saídas são restauradas do cache. Retorna
+    {etapa: 'cache' | 'executada' | 'pulada' | 'falhou' | 'bloqueada'}. Uma
+    etapa com `condicao` não atendida é pulada sem bloquear as que dependem
+    dela, que usam o que houver no disco (e têm suas próprias condições); as
+    que dependem de uma etapa que falhou ficam bloqueadas. As puladas são
+    repetidas no fim, com o motivo, para não se perderem na saída das outras.
+    """
+    cache = cache or Cache()
+    por_nome = {etapa.nome: etapa for etapa in etapas}
+    pendentes = dependencias(etapas)
+    if selecionadas:
+        # as etapas pedidas e tudo de que elas dependem
+        alvo = set()
+        fila = list(selecionadas)
+        while fila:
+            nome = fila.pop()
+            if nome not in alvo:
+                alvo.add(nome)
+                fila += pendentes[nome]
+        pendentes = {nome: deps for nome, deps in pendentes.items() if nome in alvo}
+
+    estados = {}
+    puladas = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=processos or os.cpu_count()) as executor:
+        rodando = {}
+        while pendentes or rodando:
+            resolvidas = len(estados)
+            for nome in [nome for nome, deps in pendentes.items() if deps <= estados.keys()]:
+                deps = pendentes.pop(nome)
+                if any(estados[dep] in ('falhou', 'bloqueada') for dep in deps):
+                    estados[nome] = 'bloqueada'
+                    print(f"[{nome}] bloqueada por falha em {', '.join(sorted(deps))}")
+                    continue
+                etapa = por_nome[nome]
+                motivo = etapa.condicao() if etapa.condicao else None
+                if motivo:
+                    estados[nome] = 'pulada'
+                    puladas[nome] = motivo
+                    print(f"[{nome}] pulada: {motivo}")
+                    continue
+                chave = chave_etapa(etapa)
+                if not forcar and cache.restaurar(etapa, chave):
+                    estados[nome] = 'cache'
+                    print(f"[{nome}] sem mudanças, saídas do cache")
+                    continue
+                print(f"[{nome}] executando {os.path.basename(etapa.script)}")
+                rodando[executor.submit(_executar, etapa)] = (etapa, chave)
+
+            if not rodando:
+                if pendentes and len(estados) == resolvidas:
+                    raise ValueError(f"dependência circular entre {', '.join(sorted(pendentes))}")
+                continue
+            prontos, _ = concurrent.futures.wait(rodando, return_when=concurrent.futures.FIRST_COMPLETED)
+            for futuro in prontos:
+                etapa, chave = rodando.pop(futuro)
+                resultado, segundos = futuro.result()
+                saida = (resultado.stdout + resultado.stderr).strip()
+                if resultado.returncode != 0:
+                    estados[etapa.nome] = 'falhou'
+                    print(f"[{etapa.nome}] falhou ({resultado.returncode}) em {segundos:.1f} s\n{saida}")
+                    continue
+                cache.guardar(etapa, chave)
+                estados[etapa.nome] = 'executada'
+                print(f"[{etapa.nome}] concluída em {segundos:.1f} s" + (f"\n{saida}" if saida else ''))
+    if puladas:
+        print(f"{len(puladas)} etapa(s) não rodaram:")
+        for nome, motivo in puladas.items():
+            print(f"  {nome}: {motivo}")
+    return estados
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Roda os scripts da análise em ordem de dependência, com cache por conteúdo.')
+    parser.add_argument('etapas', nargs='*', help='etapas a rodar, com suas dependências (padrão: todas)')
+    parser.add_argument('--processos', type=int, default=None, help='etapas em paralelo (padrão: número de CPUs)')
+    parser.add_argument('--forcar', action='store_true', help='roda as etapas mesmo sem mudanças nas entradas')
+    parser.add_argument('--cache', default=DIRETORIO_CACHE, help='diretório do cache')
+    parser.add_argument('--listar', action='store_true', help='mostra as etapas e suas dependências')
+    args = parser.parse_args()
+
+    if args.listar:
+        for nome, deps in dependencias(ETAPAS).items():
+            print(f"{nome}: {', '.join(sorted(deps)) or '-'}")
+        sys.exit(0)
+
+    desconhecidas = set(args.etapas) - {etapa.nome for etapa in ETAPAS}
+    if desconhecidas:
+        parser.error(f"etapas desconhecidas: {', '.join(sorted(desconhecidas))}")
+
+    estados = executar(ETAPAS, args.etapas, args.processos, args.forcar, Cache(args.cache))
+    sys.exit(0 if all(estado in ('cache', 'executada', 'pulada') for estado in estados.values()) else 1)
@@ -0,0 +1,179 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+import caches
+from geografia import IndiceGeografico
+
+# contagens dos censos (ou estimativas) por código IBGE: colunas codigo, ano, populacao
+ARQUIVOS_PADRAO = [os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'populacao_uf.csv')]
+# denominadores já calculados, por conteúdo dos arquivos, nível e anos
+CACHE_PADRAO = caches.diretorio('populacao')
+
+POR_HABITANTES = 100000
+
+_carregadas = {}
+
+
+def anos_do_rotulo(rotulo):
+    """
+    Anos cobertos por um rótulo do cubo: '2024' → [2024], '2014-2025' →
+    [2014, ..., 2025]; rótulos juntos com '+' (ver `juntar_rotulos`) somam os anos.
+    """
+    anos = set()
+    for trecho in str(rotulo).split('+'):
+        partes = trecho.split('-')
+        if len(partes) > 2 or not all(parte.strip().isdigit() for parte in partes):
+            raise ValueError(f"rótulo de ano inválido: {rotulo!r}")
+        anos.update(range(int(partes[0]), int(partes[-1]) + 1))
+    return sorted(anos)
+
+
+def juntar_rotulos(rotulos):
+    """Um período só com todos os anos de `rotulos` (para casos somados entre eles)."""
+    return '+'.join(str(rotulo) for rotulo in rotulos)
+
+
+def nivel_dos_codigos(codigos):
+    """
+    Nível dos códigos IBGE pelo número de dígitos de cada um: 'uf' (2) ou
+    'municipio' (6, ou 7 com o dígito verificador). Códigos de outro tamanho,
+    ou de níveis misturados, são erro.
+    """
+    digitos = pd.Series(np.asarray(codigos, dtype=np.int64)).astype(str).str.len()
+    niveis = digitos.map({2: 'uf', 6: 'municipio', 7: 'municipio'})
+    if niveis.isna().any():
+        invalidos = np.asarray(codigos)[niveis.isna().to_numpy()]
+        raise ValueError(f"códigos IBGE com tamanho inválido: {', '.join(map(str, invalidos[:10]))}")
+    if niveis.nunique() > 1:
+        raise ValueError("a tabela de população mistura códigos de UF e de município; use um arquivo por nível")
+    return niveis.iloc[0] if len(niveis) else 'uf'
+
+
+class TabelaPopulacao:
+    """
+    População de referência por código IBGE (UFs ou municípios) nos anos
+    dos censos/estimativas, num array unidades × anos. Para outros anos a
+    população é interpolada geometricamente entre os anos de referência
+    (e extrapolada com a taxa do intervalo mais próximo). Os denominadores
+    de cada nível e conjunto de anos são calculados uma vez e guardados em
+    memória e em `cache`.
+    """
+
+    def __init__(self, codigos, anos, valores, chave=None, cache=CACHE_PADRAO, nivel=None):
+        self.codigos = np.asarray(codigos, dtype=np.int64)
+        self.anos = np.asarray(anos, dtype=np.int64)
+        self.valores = np.asarray(valores, dtype=float)
+        if self.valores.shape != (len(self.codigos), len(self.anos)):
+            raise ValueError(f"população com forma {self.valores.shape}, esperado "
+                             f"({len(self.codigos)}, {len(self.anos)})")
+        self.nivel = nivel or nivel_dos_codigos(self.codigos)
+        self.indice = IndiceGeografico(self.codigos, self.nivel)
+        self.chave = chave
+        self.cache = cache
+        self._denominadores = {}
+
+    @classmethod
+    def de_arquivos(cls, caminhos=ARQUIVOS_PADRAO, cache=CACHE_PADRAO, nivel=None):
+        """
+        Lê os CSVs de população (codigo, ano, populacao). Anos que faltam para
+        uma unidade são preenchidos pela interpolação entre os que ela tem.
+        `nivel` ('uf' ou 'municipio') é deduzido do tamanho dos códigos se
+        não for dado.
+        """
+        conteudo = hashlib.sha256()
+        partes = []
+        for caminho in caminhos:
+            with open(caminho, 'rb') as arquivo:
+                conteudo.update(arquivo.read())
+            partes.append(pd.read_csv(caminho, dtype={'codigo': 'int64', 'ano': 'int64', 'populacao': 'float64'}))
+        longa = pd.concat(partes)
+        if longa.duplicated(['codigo', 'ano']).any():
+            raise ValueError("população repetida para o mesmo código e ano")
+        larga = longa.pivot(index='codigo', columns='ano', values='populacao').sort_index()
+        if (larga <= 0).any().any():
+            raise ValueError("populações devem ser positivas")
+        if larga.isna().any().any():
+            larga = np.exp(np.log(larga).T.interpolate(method='index', limit_direction='both').T)
+        return cls(larga.index, larga.columns, larga.to_numpy(), conteudo.hexdigest()[:16], cache, nivel)
+
+    def estimar(self, anos):
+        """População de cada unidade (linhas, na ordem de `codigos`) em cada um dos `anos` (colunas)."""
+        anos = np.asarray(anos, dtype=float)
+        log = np.log(self.valores)
+        if len(self.anos) == 1:
+            return np.repeat(self.valores, len(anos), axis=1)
+        i = np.clip(np.searchsorted(self.anos, anos, side='right') - 1, 0, len(self.anos) - 2)
+        fracao = (anos - self.anos[i]) / (self.anos[i + 1] - self.anos[i])
+        return np.exp(log[:, i] + fracao * (log[:, i + 1] - log[:, i]))
+
+    def _arquivo_cache(self, nivel, rotulos):
+        if self.cache is None or self.chave is None:
+            return None
+        anos = hashlib.sha256(repr(rotulos).encode()).hexdigest()[:16]
+        return os.path.join(self.cache, f"{self.chave}_{nivel}_{anos}.npy")
+
+    def denominador(self, nivel, anos):
+        """
+        População das unidades de `nivel` (linhas, na ordem de
+        indice.codigos[nivel]) em cada ano ou período de `anos` (colunas). Um
+        período como '2014-2025' usa a população média dos seus anos.
+        """
+        rotulos = tuple(str(ano) for ano in anos)
+        chave = (nivel, rotulos)
+        if chave not in self._denominadores:
+            arquivo = self._arquivo_cache(nivel, rotulos)
+            if arquivo is not None and os.path.exists(arquivo):
+                self._denominadores[chave] = np.load(arquivo)
+                caches.usar(arquivo)
+            else:
+                cobertos = [anos_do_rotulo(rotulo) for rotulo in rotulos]
+                unicos = sorted({ano for lista in cobertos for ano in lista})
+                por_ano = self.estimar(unicos)
+                colunas = [[unicos.index(ano) for ano in lista] for lista in cobertos]
+                medias = np.column_stack([por_ano[:, posicoes].mean(axis=1) for posicoes in colunas])
+                self._denominadores[chave] = self.indice.agregar(medias, nivel)
+                if arquivo is not None:
+                    os.makedirs(self.cache, exist_ok=True)
+                    np.save(arquivo, self._denominadores[chave])
+                    caches.limitar(self.cache, caches.CACHES['populacao'])
+        return self._denominadores[chave]
+
+    def populacao(self, nivel, anos, codigos=None):
+        """Denominador de `nivel` como DataFrame unidade × ano, opcionalmente só para `codigos`."""
+        valores = self.denominador(nivel, anos)
+        rotulos = self.indice.rotulos(nivel)
+        if codigos is not None:
+            posicoes = self._posicoes(nivel, codigos)
+            valores, rotulos = valores[posicoes], [rotulos[i] for i in posicoes]
+        return pd.DataFrame(valores, index=rotulos, columns=[str(ano) for ano in anos])
+
+    def _posicoes(self, nivel, codigos):
+        posicoes = pd.Index(self.indice.codigos[nivel]).get_indexer(np.asarray(codigos, dtype=np.int64))
+        if (posicoes < 0).any():
+            faltam = np.asarray(codigos)[posicoes < 0]
+            raise ValueError(f"sem população para os códigos: {', '.join(map(str, faltam))}")
+        return posicoes
+
+    def incidencia(self, casos, nivel, anos, codigos=None, por=POR_HABITANTES):
+        """
+        Casos por `por` habitantes numa única operação: `casos` tem as
+        unidades de `nivel` no eixo 0 (na ordem de `codigos`, ou na do
+        índice), os anos ou períodos de `anos` no eixo 1 e quaisquer eixos
+        depois (meses, por exemplo).
+        """
+        denominador = self.denominador(nivel, anos)
+        if codigos is not None:
+            denominador = denominador[self._posicoes(nivel, codigos)]
+        casos = np.asarray(casos, dtype=float)
+        return casos / denominador.reshape(denominador.shape + (1,) * (casos.ndim - 2)) * por
+
+
+def carregar_populacao(caminhos=ARQUIVOS_PADRAO, cache=CACHE_PADRAO, nivel=None):
+    """TabelaPopulacao dos arquivos, lida uma vez por processo (enquanto os arquivos não mudarem)."""
+    chave = tuple((os.path.abspath(caminho), os.path.getmtime(caminho)) for caminho in caminhos) + (cache, nivel)
+    if chave not in _carregadas:
+        _carregadas[chave] = TabelaPopulacao.de_arquivos(caminhos, cache, nivel)
+    return _carregadas[chave]
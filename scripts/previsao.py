@@ -0,0 +1,338 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from cubo_casos import DIRETORIO_ANUAL, MESES, abrir_cubo
+from rastreamento import etapa
+
+SAIDA = '/home/ubuntu/previsao'
+
+PERIODO = 12
+HORIZONTE = 6
+SIMULACOES = 1000
+NIVEL = 0.9
+# séries simuladas de uma vez: limita a memória dos caminhos (simulações × séries × horizonte)
+BLOCO_SERIES = 2000
+
+# fração dos casos de um mês já notificada no corte, do último mês fechado para trás. É uma suposição
+# conservadora; com cubos de cortes sucessivos, completude_de_instantaneos() estima a curva dos próprios dados.
+COMPLETUDE_PADRAO = (0.6, 0.85, 0.95)
+
+# grade de suavização do Holt-Winters (nível, tendência, sazonalidade), avaliada para todas as séries de uma vez
+GRADE_HOLT_WINTERS = [(alfa, beta, gama) for alfa in (0.1, 0.3, 0.5) for beta in (0.0, 0.05) for gama in (0.05, 0.2)]
+HARMONICOS = 2
+
+
+def fatias_de_varios_anos(anos):
+    """Rótulos do eixo de anos que não são um único ano (por exemplo '2014-2025', do parse_dengue.py)."""
+    return [rotulo for rotulo in anos if not str(rotulo).strip().isdigit()]
+
+
+def series_do_cubo(cubo, ultimo=None, excluir=('Ignorado/exterior',)):
+    """
+    Séries mensais do cubo em ordem cronológica: (rótulos das séries,
+    matriz séries × meses, rótulos 'AAAA-MM'). Cada fatia do cubo tem de ser
+    um único ano. A série termina em `ultimo` ('AAAA-MM') ou, por padrão, no
+    último mês com algum caso.
+    """
+    compostas = fatias_de_varios_anos(cubo.anos)
+    if compostas:
+        raise ValueError(f"a previsão precisa de um ano por fatia do cubo; {compostas[0]!r} cobre vários anos")
+    anos = [int(rotulo) for rotulo in cubo.anos]
+    if cubo.periodos != MESES:
+        raise ValueError("a previsão usa cubos mensais")
+    ordem = np.argsort(anos)
+    ufs = list(cubo.ufs.categories)
+    manter = [i for i, uf in enumerate(ufs) if uf not in excluir]
+    casos = np.asarray(cubo.casos, dtype=np.float64)[manter][:, ordem].reshape(len(manter), -1)
+    meses = [f'{anos[i]}-{mes:02d}' for i in ordem for mes in range(1, PERIODO + 1)]
+    if ultimo is None:
+        com_casos = np.flatnonzero(casos.sum(axis=0) > 0)
+        fim = com_casos[-1] + 1 if len(com_casos) else 0
+    else:
+        fim = meses.index(ultimo) + 1
+    return [ufs[i] for i in manter], casos[:, :fim], meses[:fim]
+
+
+def meses_seguintes(ultimo, n):
+    ano, mes = (int(parte) for parte in ultimo.split('-'))
+    return [f'{ano + (mes - 1 + i) // PERIODO}-{(mes - 1 + i) % PERIODO + 1:02d}' for i in range(1, n + 1)]
+
+
+def completude_de_instantaneos(instantaneos, atraso_maximo=len(COMPLETUDE_PADRAO)):
+    """
+    Completude da notificação por atraso, pelo método chain-ladder, a partir
+    de matrizes séries × meses de cortes sucessivos (um mês entre cortes, a
+    do corte mais antigo primeiro; cada uma tem um mês a mais que a
+    anterior). O fator de desenvolvimento do atraso d é a razão, somada
+    sobre séries e meses, entre o que um mês tinha com atraso d + 1 e com
+    atraso d; a completude do atraso d é o inverso do produto dos fatores
+    de d em diante. Retorna a completude do atraso 0 (último mês) em diante.
+    """
+    fatores = np.ones(atraso_maximo)
+    for d in range(atraso_maximo):
+        antes, depois = 0.0, 0.0
+        for anterior, seguinte in zip(instantaneos, instantaneos[1:]):
+            mes = anterior.shape[1] - 1 - d
+            if mes >= 0:
+                antes += anterior[:, mes].sum()
+                depois += seguinte[:, mes].sum()
+        if antes > 0:
+            fatores[d] = max(depois / antes, 1.0)
+    return 1 / np.cumprod(fatores[::-1])[::-1]
+
+
+def corrigir_atraso(casos, completude=COMPLETUDE_PADRAO):
+    """Nowcast: os últimos meses divididos pela fração já notificada (completude[0] para o último mês)."""
+    completude = np.asarray(completude, dtype=float)[:casos.shape[1]]
+    corrigidos = np.asarray(casos, dtype=float).copy()
+    if len(completude):
+        corrigidos[:, -len(completude):] /= completude[::-1]
+    return corrigidos
+
+
+def _reamostrar(residuos, formato, rng):
+    """Resíduos sorteados com reposição dentro de cada série: formato (simulações, séries, horizonte)."""
+    n_simulacoes, n_series, horizonte = formato
+    sorteio = rng.integers(0, residuos.shape[1], size=formato)
+    return residuos[np.arange(n_series)[None, :, None], sorteio]
+
+
+def sazonal_ingenuo(z, horizonte, simulacoes, rng):
+    """
+    Cada mês repete o mesmo mês do ano anterior. Os caminhos somam, mês a
+    mês, diferenças sazonais sorteadas da própria série. Retorna (previsão
+    pontual séries × horizonte, caminhos simulações × séries × horizonte).
+    """
+    T = z.shape[1]
+    pontual = z[:, T - PERIODO + np.arange(horizonte) % PERIODO]
+    residuos = z[:, PERIODO:] - z[:, :-PERIODO]
+    choques = _reamostrar(residuos, (simulacoes, z.shape[0], horizonte), rng)
+    caminhos = np.empty_like(choques)
+    for h in range(horizonte):
+        base = z[None, :, T - PERIODO + h] if h < PERIODO else caminhos[:, :, h - PERIODO]
+        caminhos[:, :, h] = base + choques[:, :, h]
+    return pontual, caminhos
+
+
+def _planejamento_harmonico(t, T, harmonicos=HARMONICOS):
+    colunas = [np.ones_like(t, dtype=float), t / T]
+    for k in range(1, harmonicos + 1):
+        colunas += [np.cos(2 * np.pi * k * t / PERIODO), np.sin(2 * np.pi * k * t / PERIODO)]
+    return np.column_stack(colunas)
+
+
+def harmonico(z, horizonte, simulacoes, rng):
+    """
+    Regressão de tendência linear e harmônicos anuais. A matriz de
+    planejamento é a mesma para todas as séries, e um único lstsq ajusta
+    todas elas; os caminhos somam resíduos sorteados à previsão. Os
+    resíduos do ajuste saem menores que o ruído (divididos por
+    sqrt(1 - alavanca) voltam à escala dele), e o erro da própria reta
+    cresce com o horizonte: cada choque é multiplicado por
+    sqrt(1 + alavanca do mês previsto), como no intervalo de predição de
+    mínimos quadrados.
+    """
+    T = z.shape[1]
+    x = _planejamento_harmonico(np.arange(T), T)
+    coeficientes, *_ = np.linalg.lstsq(x, z.T, rcond=None)
+    inversa = np.linalg.pinv(x)
+    alavanca = (x * inversa.T).sum(axis=1)
+    residuos = (z - (x @ coeficientes).T) / np.sqrt(1 - alavanca)
+    futuro = _planejamento_harmonico(np.arange(T, T + horizonte), T)
+    alavanca_futuro = ((futuro @ inversa) ** 2).sum(axis=1)
+    pontual = (futuro @ coeficientes).T
+    choques = _reamostrar(residuos, (simulacoes, z.shape[0], horizonte), rng) * np.sqrt(1 + alavanca_futuro)
+    return pontual, pontual[None] + choques
+
+
+def _passo_holt_winters(nivel, tendencia, sazonal, erro, alfa, beta, gama):
+    return nivel + tendencia + alfa * erro, tendencia + beta * erro, sazonal + gama * erro
+
+
+def holt_winters(z, horizonte, simulacoes, rng):
+    """
+    Holt-Winters aditivo na forma de correção de erro. Todas as combinações
+    de GRADE_HOLT_WINTERS rodam juntas para todas as séries, em arrays
+    combinações × séries, numa única passada pelo tempo; cada série fica com
+    a combinação de menor erro quadrático um passo à frente. Os caminhos
+    propagam erros sorteados pelas mesmas equações.
+    """
+    n_series, T = z.shape
+    alfa, beta, gama = (np.array(valores)[:, None] for valores in zip(*GRADE_HOLT_WINTERS))
+    inicio = z[:, :PERIODO].mean(axis=1)
+    nivel = np.broadcast_to(inicio, (len(alfa), n_series)).copy()
+    tendencia = np.broadcast_to((z[:, PERIODO:2 * PERIODO].mean(axis=1) - inicio) / PERIODO,
+                                (len(alfa), n_series)).copy()
+    sazonal = np.broadcast_to(z[:, :PERIODO] - inicio[:, None], (len(alfa), n_series, PERIODO)).copy()
+    erros = np.empty((len(alfa), n_series, T))
+    for t in range(T):
+        m = t % PERIODO
+        erros[:, :, t] = z[None, :, t] - (nivel + tendencia + sazonal[:, :, m])
+        nivel, tendencia, sazonal[:, :, m] = _passo_holt_winters(nivel, tendencia, sazonal[:, :, m], erros[:, :, t],
+                                                                alfa, beta, gama)
+
+    # o primeiro ano só inicializa os componentes
+    escolha = (erros[:, :, PERIODO:] ** 2).sum(axis=2).argmin(axis=0)
+    series = np.arange(n_series)
+    nivel, tendencia, sazonal = nivel[escolha, series], tendencia[escolha, series], sazonal[escolha, series]
+    alfa, beta, gama = alfa[escolha, 0], beta[escolha, 0], gama[escolha, 0]
+    residuos = erros[escolha, series, PERIODO:]
+
+    passos = np.arange(1, horizonte + 1)
+    pontual = nivel[:, None] + passos * tendencia[:, None] + sazonal[:, (T + passos - 1) % PERIODO]
+
+    choques = _reamostrar(residuos, (simulacoes, n_series, horizonte), rng)
+    nivel, tendencia, sazonal = (np.broadcast_to(valor, (simulacoes,) + valor.shape).copy()
+                                 for valor in (nivel, tendencia, sazonal))
+    caminhos = np.empty_like(choques)
+    for h in range(horizonte):
+        m = (T + h) % PERIODO
+        caminhos[:, :, h] = nivel + tendencia + sazonal[:, :, m] + choques[:, :, h]
+        nivel, tendencia, sazonal[:, :, m] = _passo_holt_winters(nivel, tendencia, sazonal[:, :, m], choques[:, :, h],
+                                                                alfa, beta, gama)
+    return pontual, caminhos
+
+
+# modelo: (função, meses mínimos de histórico)
+MODELOS = {
+    'sazonal_ingenuo': (sazonal_ingenuo, PERIODO + 1),
+    'harmonico': (harmonico, PERIODO + 2 * HARMONICOS + 2),
+    'holt_winters': (holt_winters, 2 * PERIODO + 1),
+}
+
+
+def avaliar(casos, horizonte=HORIZONTE, modelos=MODELOS):
+    """
+    Erro absoluto médio de cada modelo nos últimos `horizonte` meses,
+    ajustado sem eles: DataFrame séries × modelos (em casos).
+    """
+    treino, teste = casos[:, :-horizonte], casos[:, -horizonte:]
+    rng = np.random.default_rng(0)
+    erros = {}
+    for nome, (funcao, minimo) in modelos.items():
+        if treino.shape[1] >= minimo:
+            pontual, _ = funcao(np.log1p(treino), horizonte, 1, rng)
+            erros[nome] = np.abs(np.expm1(pontual).clip(0) - teste).mean(axis=1)
+    return pd.DataFrame(erros)
+
+
+def prever(casos, horizonte=HORIZONTE, simulacoes=SIMULACOES, nivel=NIVEL, modelos=None, semente=None,
+           escolha=None):
+    """
+    Previsões de todas as séries (linhas de `casos`, já corrigidas do
+    atraso) na escala log(1 + casos). `escolha` dá o modelo de cada série
+    (por padrão, o primeiro de `modelos`). Retorna arrays séries × horizonte:
+    (pontual, limite inferior, limite superior) em casos, com os limites
+    tirados dos caminhos simulados.
+    """
+    modelos = modelos or list(MODELOS)
+    escolha = np.asarray(escolha if escolha is not None else [modelos[0]] * len(casos))
+    rng = np.random.default_rng(semente)
+    z = np.log1p(np.asarray(casos, dtype=float))
+    pontual, inferior, superior = (np.zeros((len(casos), horizonte)) for _ in range(3))
+    quantis = [(1 - nivel) / 2, (1 + nivel) / 2]
+    for nome in modelos:
+        funcao, minimo = MODELOS[nome]
+        if z.shape[1] < minimo:
+            raise ValueError(f"{nome} precisa de pelo menos {minimo} meses; a série tem {z.shape[1]}")
+        linhas = np.flatnonzero(escolha == nome)
+        for inicio in range(0, len(linhas), BLOCO_SERIES):
+            bloco = linhas[inicio:inicio + BLOCO_SERIES]
+            ponto, caminhos = funcao(z[bloco], horizonte, simulacoes, rng)
+            pontual[bloco] = ponto
+            inferior[bloco], superior[bloco] = np.quantile(caminhos, quantis, axis=0)
+    return tuple(np.expm1(valores).clip(0) for valores in (pontual, inferior, superior))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Previsão sazonal dos casos de todas as séries do cubo de uma vez, com correção do atraso '
+                    'de notificação e intervalos por simulação.')
+    parser.add_argument('--cubo', default=DIRETORIO_ANUAL, help='cubo com um ano por fatia')
+    parser.add_argument('--ultimo-mes', default=None, help="último mês observado, 'AAAA-MM' (padrão: o último com casos)")
+    parser.add_argument('--horizonte', type=int, default=HORIZONTE, help='meses à frente')
+    parser.add_argument('--modelo', choices=['melhor'] + list(MODELOS), default='melhor',
+                        help="'melhor' escolhe, por série, o de menor erro nos últimos meses")
+    parser.add_argument('--simulacoes', type=int, default=SIMULACOES)
+    parser.add_argument('--nivel', type=float, default=NIVEL, help='cobertura dos intervalos de previsão')
+    parser.add_argument('--completude', type=float, nargs='*', default=list(COMPLETUDE_PADRAO),
+                        help='fração já notificada do último mês, do penúltimo...; sem valores, sem correção')
+    parser.add_argument('--instantaneos', nargs='+', default=None,
+                        help='cubos de cortes mensais sucessivos (mais antigo primeiro) para estimar a completude')
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    cubos = {}
+    for diretorio in [args.cubo] + (args.instantaneos or []):
+        try:
+            cubos[diretorio] = abrir_cubo(diretorio)
+        except FileNotFoundError:
+            parser.error(f"não há cubo em {diretorio}")
+        compostas = fatias_de_varios_anos(cubos[diretorio].anos)
+        if compostas:
+            parser.error(f"o cubo {diretorio} tem fatias que cobrem vários anos ({', '.join(map(str, compostas))}); "
+                         f"a previsão precisa de um ano por fatia. Monte antes um cubo ano a ano, com "
+                         f"'dengue.py anexar <exportação do ano> --ano AAAA --cubo <diretório>' para cada ano")
+
+    with etapa('carregar_series') as medida:
+        series, casos, meses = series_do_cubo(cubos[args.cubo], args.ultimo_mes)
+        medida.linhas = casos.size
+    completude = args.completude
+    if args.instantaneos:
+        with etapa('estimar_completude', linhas=len(args.instantaneos)):
+            completude = completude_de_instantaneos([series_do_cubo(cubos[diretorio])[1]
+                                                     for diretorio in args.instantaneos])
+        print("Completude estimada por atraso: " + ", ".join(f"{d}m {c:.2f}" for d, c in enumerate(completude)))
+    corrigidos = corrigir_atraso(casos, completude)
+
+    if args.modelo == 'melhor':
+        with etapa('avaliar_modelos', linhas=len(series)):
+            erros = avaliar(corrigidos, args.horizonte)
+        if erros.empty:
+            parser.error(f"série curta demais ({len(meses)} meses) para avaliar os modelos; use --modelo")
+        escolha = erros.columns[erros.to_numpy().argmin(axis=1)]
+        modelos = list(erros.columns)
+    else:
+        escolha = np.array([args.modelo] * len(series))
+        modelos = [args.modelo]
+
+    with etapa('prever', linhas=len(series), simulacoes=args.simulacoes):
+        pontual, inferior, superior = prever(corrigidos, args.horizonte, args.simulacoes, args.nivel, modelos,
+                                             args.semente, escolha)
+
+    futuros = meses_seguintes(meses[-1], args.horizonte)
+    previsoes = pd.DataFrame({
+        'Serie': np.repeat(series, args.horizonte),
+        'Mes': np.tile(futuros, len(series)),
+        'Modelo': np.repeat(np.asarray(escolha), args.horizonte),
+        'Previsao': pontual.ravel().round(1),
+        'Inferior': inferior.ravel().round(1),
+        'Superior': superior.ravel().round(1),
+    })
+    recentes = min(len(completude), len(meses))
+    nowcast = pd.DataFrame({
+        'Serie': np.repeat(series, recentes),
+        'Mes': np.tile(meses[len(meses) - recentes:], len(series)),
+        'Notificados': casos[:, len(meses) - recentes:].ravel().astype(np.int64),
+        'Estimados': corrigidos[:, len(meses) - recentes:].ravel().round(1),
+    })
+    os.makedirs(SAIDA, exist_ok=True)
+    previsoes.to_csv(os.path.join(SAIDA, 'previsoes.csv'), index=False)
+    nowcast.to_csv(os.path.join(SAIDA, 'nowcast.csv'), index=False)
+    if args.modelo == 'melhor':
+        erros.set_axis(series).rename_axis('Serie').assign(Escolhido=escolha).to_csv(
+            os.path.join(SAIDA, 'avaliacao.csv'))
+
+    total = previsoes.groupby('Mes', sort=False)[['Previsao', 'Inferior', 'Superior']].sum()
+    print(f"Previsão de {len(series)} séries até {futuros[-1]} (último mês observado: {meses[-1]})")
+    for mes, linha in total.iterrows():
+        print(f"  {mes}: {linha['Previsao']:12,.0f}  (soma dos limites por série: "
+              f"{linha['Inferior']:,.0f} a {linha['Superior']:,.0f})")
+    print(f"Previsões em {SAIDA}/")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+import contextlib
+import cProfile
+import collections
+import datetime
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+import uuid
+
+# arquivo JSON Lines que recebe um registro por etapa ('-' para stderr); sem ele nada é gravado
+VARIAVEL_ARQUIVO = 'DENGUE_RASTREIO'
+# nome da etapa a perfilar, e o modo: 'cprofile' (determinístico) ou 'amostragem'
+VARIAVEL_PERFIL = 'DENGUE_PERFIL'
+VARIAVEL_MODO = 'DENGUE_PERFIL_MODO'
+
+INTERVALO_AMOSTRAGEM = 0.005
+FUNCOES_NO_PERFIL = 20
+
+# um identificador por execução; processos filhos herdam o do pai pelo ambiente
+RASTREIO = os.environ.setdefault('DENGUE_RASTREIO_ID', uuid.uuid4().hex[:12])
+
+_abertas = []
+_contador = 0
+
+
+def _pico_rss_kb():
+    """Pico de memória residente do processo desde o último _zerar_pico (VmHWM), em kB."""
+    try:
+        with open('/proc/self/status') as status:
+            for linha in status:
+                if linha.startswith('VmHWM:'):
+                    return int(linha.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _rss_kb():
+    try:
+        with open('/proc/self/status') as status:
+            for linha in status:
+                if linha.startswith('VmRSS:'):
+                    return int(linha.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _zerar_pico():
+    """Reinicia o VmHWM (Linux); em outros sistemas o pico fica sendo o da vida do processo."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        pass
+
+
+class Intervalo:
+    """
+    Uma etapa em andamento. O código dentro dela pode informar quantas
+    linhas processou (`linhas`) e outros atributos (`atributos`), que vão
+    para o registro JSON.
+    """
+
+    def __init__(self, nome, linhas=None, **atributos):
+        global _contador
+        _contador += 1
+        self.nome = nome
+        self.id = f"{os.getpid()}-{_contador}"
+        self.pai = _abertas[-1].id if _abertas else None
+        self.linhas = linhas
+        self.atributos = atributos
+        self.pico_kb = 0
+        self.perfil = None
+
+    def registro(self, segundos, cpu, pico_filhos_kb):
+        registro = {
+            'rastreio': RASTREIO,
+            'id': self.id,
+            'pai': self.pai,
+            'script': os.path.basename(sys.argv[0]),
+            'etapa': self.nome,
+            'inicio': self.inicio,
+            'segundos': round(segundos, 6),
+            'cpu_segundos': round(cpu, 6),
+            'pico_rss_mb': round(self.pico_kb / 1024, 1),
+            'rss_final_mb': round(_rss_kb() / 1024, 1),
+        }
+        if pico_filhos_kb:
+            registro['pico_rss_filhos_mb'] = round(pico_filhos_kb / 1024, 1)
+        if self.linhas is not None:
+            registro['linhas'] = int(self.linhas)
+            if segundos > 0:
+                registro['linhas_por_segundo'] = round(self.linhas / segundos, 1)
+        registro.update(self.atributos)
+        if self.perfil is not None:
+            registro['perfil'] = self.perfil
+        return registro
+
+
+class _Amostrador(threading.Thread):
+    """Perfil por amostragem: a cada intervalo, anota a pilha da thread observada."""
+
+    def __init__(self, alvo, intervalo=INTERVALO_AMOSTRAGEM):
+        super().__init__(daemon=True)
+        self.alvo = alvo
+        self.intervalo = intervalo
+        self.amostras = 0
+        self.proprias = collections.Counter()
+        self.inclusivas = collections.Counter()
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            quadro = sys._current_frames().get(self.alvo)
+            if quadro is None:
+                continue
+            self.amostras += 1
+            vistas = set()
+            topo = True
+            while quadro is not None:
+                codigo = quadro.f_code
+                funcao = f"{codigo.co_filename}:{codigo.co_firstlineno}({codigo.co_name})"
+                if topo:
+                    self.proprias[funcao] += 1
+                    topo = False
+                if funcao not in vistas:
+                    self.inclusivas[funcao] += 1
+                    vistas.add(funcao)
+                quadro = quadro.f_back
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+        return [{'funcao': funcao, 'fracao_inclusiva': round(n / self.amostras, 4),
+                 'fracao_propria': round(self.proprias[funcao] / self.amostras, 4)}
+                for funcao, n in self.inclusivas.most_common(FUNCOES_NO_PERFIL)] if self.amostras else []
+
+
+def _resumo_cprofile(perfilador, nome):
+    """Grava o .prof ao lado do arquivo de rastreio e resume as funções de maior tempo acumulado."""
+    destino = os.environ.get(VARIAVEL_ARQUIVO)
+    if destino and destino != '-':
+        perfilador.dump_stats(os.path.join(os.path.dirname(os.path.abspath(destino)),
+                                           f"perfil_{nome.replace('/', '-')}_{os.getpid()}.prof"))
+    estatisticas = pstats.Stats(perfilador).stats
+    ordenadas = sorted(estatisticas.items(), key=lambda item: item[1][3], reverse=True)[:FUNCOES_NO_PERFIL]
+    return [{'funcao': f"{arquivo}:{linha}({funcao})", 'chamadas': chamadas,
+             'segundos_proprios': round(proprio, 6), 'segundos_acumulados': round(acumulado, 6)}
+            for (arquivo, linha, funcao), (_, chamadas, proprio, acumulado, _) in ordenadas]
+
+
+def _gravar(registro):
+    destino = os.environ.get(VARIAVEL_ARQUIVO)
+    if not destino:
+        return
+    linha = json.dumps(registro, ensure_ascii=False, default=str) + "\n"
+    if destino == '-':
+        sys.stderr.write(linha)
+    else:
+        with open(destino, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(linha)
+
+
+@contextlib.contextmanager
+def etapa(nome, linhas=None, **atributos):
+    """
+    Mede uma etapa lógica: tempo de relógio, tempo de CPU, pico de memória
+    residente (do processo e dos filhos que terminaram dentro dela) e linhas
+    processadas. Com DENGUE_RASTREIO definido, grava um registro JSON por
+    etapa; com DENGUE_PERFIL igual ao nome da etapa, perfila só ela. Etapas
+    podem ser aninhadas: cada registro aponta para o `pai`.
+    """
+    intervalo = Intervalo(nome, linhas, **atributos)
+    # o pico de quem está aberto até aqui é guardado antes de zerar o contador
+    pico = _pico_rss_kb()
+    for aberta in _abertas:
+        aberta.pico_kb = max(aberta.pico_kb, pico)
+    _zerar_pico()
+    _abertas.append(intervalo)
+
+    perfilador = amostrador = None
+    if os.environ.get(VARIAVEL_PERFIL) == nome:
+        if os.environ.get(VARIAVEL_MODO, 'cprofile') == 'amostragem':
+            amostrador = _Amostrador(threading.get_ident())
+            amostrador.start()
+        else:
+            perfilador = cProfile.Profile()
+            perfilador.enable()
+
+    filhos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    intervalo.inicio = datetime.datetime.now().isoformat(timespec='milliseconds')
+    relogio, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield intervalo
+    finally:
+        segundos, cpu = time.perf_counter() - relogio, time.process_time() - cpu
+        if perfilador is not None:
+            perfilador.disable()
+            intervalo.perfil = _resumo_cprofile(perfilador, nome)
+        if amostrador is not None:
+            intervalo.perfil = amostrador.parar()
+        _abertas.pop()
+        intervalo.pico_kb = max(intervalo.pico_kb, _pico_rss_kb())
+        if _abertas:
+            _abertas[-1].pico_kb = max(_abertas[-1].pico_kb, intervalo.pico_kb)
+        filhos_depois = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        _gravar(intervalo.registro(segundos, cpu, filhos_depois if filhos_depois > filhos else 0))
@@ -0,0 +1,342 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+
+from cubo_casos import CSV_PADRAO, DIRETORIO_PADRAO
+from rastreamento import etapa
+
+DIRETORIO_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+TEMPLATES = os.path.join(DIRETORIO_BASE, 'templates')
+# template: relatório gerado
+RELATORIOS = {
+    os.path.join(TEMPLATES, 'relatorio_dengue.md'): os.path.join(DIRETORIO_BASE, 'relatorio_dengue.md'),
+    os.path.join(TEMPLATES, 'relatorio_expandido.md'): os.path.join(DIRETORIO_BASE, 'relatorio_expandido.md'),
+}
+# texto de cada seção já renderizada, pela impressão do template e dos dados
+CACHE_PADRAO = '/home/ubuntu/.cache_relatorio.json'
+
+CORRELACAO = '/home/ubuntu/analise_correlacao'
+
+NOMES_MESES = ['janeiro', 'fevereiro', 'março', 'abril', 'maio', 'junho', 'julho', 'agosto', 'setembro',
+               'outubro', 'novembro', 'dezembro']
+TRIMESTRES = ['verão (janeiro a março)', 'outono (abril a junho)', 'inverno (julho a setembro)',
+              'primavera (outubro a dezembro)']
+PICO_NACIONAL = [2, 3, 4]  # março a maio
+# resíduo padronizado, na regressão da incidência sobre temperatura e saneamento, a partir do qual a UF é outlier
+Z_OUTLIER = 2.0
+
+# início de seção no template: <!-- secao: nome; fontes: casos, correlacao -->
+_SECAO = re.compile(r'^<!-- secao: *(?P<nome>[\w-]+) *(?:; *fontes: *(?P<fontes>[\w, ]*))? *-->\n', re.MULTILINE)
+_FIGURA = re.compile(r'!\[[^\]]*\]\(([^)\s]+)\)')
+
+
+def inteiro(valor):
+    """4304428 → '4.304.428'."""
+    return f'{int(round(valor)):,}'.replace(',', '.')
+
+
+def decimal(valor, casas=2):
+    return f'{valor:.{casas}f}'.replace('.', ',')
+
+
+def milhoes(valor):
+    return f'{decimal(valor / 1e6)} milhões'
+
+
+def percentual(fracao, casas=1):
+    return f'{decimal(fracao * 100, casas)}%'
+
+
+def juntar_nomes(nomes):
+    nomes = list(nomes)
+    return ', '.join(nomes[:-1]) + ' e ' + nomes[-1] if len(nomes) > 1 else ''.join(nomes)
+
+
+def _hash_arquivos(caminhos):
+    soma = hashlib.sha256()
+    for caminho in caminhos:
+        for raiz, diretorios, arquivos in os.walk(caminho) if os.path.isdir(caminho) else [('', [], [caminho])]:
+            diretorios.sort()
+            for nome in sorted(arquivos):
+                if nome.startswith('.'):
+                    continue
+                arquivo = os.path.join(raiz, nome)
+                soma.update(arquivo.encode())
+                try:
+                    with open(arquivo, 'rb') as conteudo:
+                        soma.update(conteudo.read())
+                except OSError:
+                    soma.update(b'ausente')
+    return soma.hexdigest()
+
+
+def dados_casos():
+    """Pico mensal, meses de menor incidência, ranking dos estados e participação das regiões."""
+    from cubo_casos import abrir_cubo, carregar_casos
+    from geografia import MESES, TabelaGeografica
+
+    df = carregar_casos()
+    mensal = df[df['UF_Notificacao'] == 'TOTAL'][MESES].to_numpy()[0]
+    estados = df[~df['UF_Notificacao'].isin(['TOTAL', 'Ignorado/exterior'])]
+    totais = estados.set_index('UF_Notificacao')[MESES].sum(axis=1).sort_values(ascending=False)
+    regioes = TabelaGeografica.de_dataframe(df).agregado('regiao').drop(index='Ignorado/exterior', errors='ignore')
+    por_regiao = regioes.sum(axis=1).sort_values(ascending=False) / regioes.to_numpy().sum()
+
+    anos = [str(ano) for ano in abrir_cubo().anos]
+    pico = int(mensal.argmax())
+    menores = sorted(mensal.argsort()[:3])
+
+    por_uf = estados.set_index('UF_Notificacao')[MESES]
+    picos_uf = por_uf.to_numpy().argmax(axis=1)
+    fora_do_pico = [f'{uf} ({NOMES_MESES[mes]})' for uf, mes in zip(por_uf.index, picos_uf)
+                    if mes not in PICO_NACIONAL]
+    mensal_regioes = regioes.to_numpy()
+    picos_regioes = mensal_regioes.argmax(axis=1)
+    # fração dos casos de cada região no seu mês de pico: quanto menor, mais uniforme ao longo do ano
+    concentracao = mensal_regioes.max(axis=1) / mensal_regioes.sum(axis=1)
+    trimestres = mensal_regioes.reshape(len(regioes), 4, 3).sum(axis=2)
+    trimestres_pais = trimestres.sum(axis=0)
+    ordem_trimestres = trimestres_pais.argsort()[::-1]
+    menor_trimestre = int(ordem_trimestres[-1])
+    maiores_por_regiao = {}
+    for regiao, maior in zip(regioes.index, trimestres.argmax(axis=1)):
+        maiores_por_regiao.setdefault(int(maior), []).append(regiao)
+    valores = {
+        'periodo': juntar_nomes(ano.replace('-', ' a ') for ano in anos),
+        'pico_mes': NOMES_MESES[pico],
+        'pico_casos': inteiro(mensal[pico]),
+        'pico_milhoes': f'{decimal(mensal[pico] / 1e6, 1)} milhões',
+        'menores_meses': juntar_nomes(NOMES_MESES[i] for i in menores),
+        'top3_nomes': juntar_nomes(totais.index[:3]),
+        'top3_pct': percentual(totais.iloc[:3].sum() / totais.sum(), 0),
+        'regiao_lider': por_regiao.index[0],
+        'regiao_lider_pct': percentual(por_regiao.iloc[0]),
+        'lista_regioes': '\n'.join(f'- A região {regiao} concentra {percentual(fracao)} dos casos'
+                                   for regiao, fracao in por_regiao.items()),
+        'meses_antes_pico': f'{NOMES_MESES[(pico - 3) % 12]} a {NOMES_MESES[(pico - 1) % 12]}',
+        'estados_picos': '\n'.join(
+            f'- {uf} tem pico em {NOMES_MESES[int(por_uf.loc[uf].to_numpy().argmax())]}, com '
+            f'{percentual(por_uf.loc[uf].iloc[PICO_NACIONAL].sum() / por_uf.loc[uf].sum())} dos seus casos '
+            f'entre março e maio' for uf in totais.index[:3]),
+        'estados_no_pico': f'{len(por_uf) - len(fora_do_pico)} das {len(por_uf)} UFs',
+        'estados_fora_do_pico': juntar_nomes(fora_do_pico) or 'nenhuma',
+        'regiao_uniforme': regioes.index[int(concentracao.argmin())],
+        'regiao_uniforme_pct': percentual(concentracao.min()),
+        'regiao_menor': por_regiao.index[-1],
+        'lista_regioes_pico': '\n'.join(
+            f'- A região {regiao} tem pico em {NOMES_MESES[mes]}, com {percentual(fracao)} dos seus casos nesse mês'
+            for regiao, mes, fracao in zip(regioes.index, picos_regioes, concentracao)),
+        'picos_regioes': juntar_nomes(f'{NOMES_MESES[mes]} no {regiao}'
+                                      for regiao, mes in zip(regioes.index, picos_regioes)),
+        'trimestres_maiores': f'{TRIMESTRES[ordem_trimestres[0]]} e o {TRIMESTRES[ordem_trimestres[1]]}',
+        'trimestres_maiores_pct': percentual(trimestres_pais[ordem_trimestres[:2]].sum() / trimestres_pais.sum()),
+        'lista_trimestres_regioes': '\n'.join(
+            f'- O {TRIMESTRES[trimestre]} é o trimestre com mais casos {juntar_nomes("no " + nome for nome in nomes)}'
+            for trimestre, nomes in sorted(maiores_por_regiao.items())),
+        'trimestre_menor': TRIMESTRES[menor_trimestre],
+        'trimestre_menor_regioes': f'{int((trimestres.argmin(axis=1) == menor_trimestre).sum())} das '
+                                   f'{len(regioes)} regiões',
+    }
+    for i in range(3):
+        valores[f'uf{i + 1}'] = totais.index[i]
+        valores[f'uf{i + 1}_milhoes'] = milhoes(totais.iloc[i])
+    return valores
+
+
+def _sentido(r):
+    return 'positiva' if r > 0 else 'negativa'
+
+
+def _forca(r):
+    r = abs(r)
+    return 'forte' if r >= 0.7 else 'moderada' if r >= 0.4 else 'fraca'
+
+
+def dados_correlacao():
+    """
+    Coeficientes da matriz de Spearman, acessíveis no template como
+    {r[Variavel_1][Variavel_2]}, com {sentido[...][...]} e {forca[...][...]}.
+    """
+    import pandas as pd
+
+    matriz = pd.read_csv(os.path.join(CORRELACAO, 'matriz_correlacao.csv'), index_col=0)
+    socio = ['IDH', 'Renda_Per_Capita', 'Taxa_Urbanizacao', 'Acesso_Saneamento']
+    entre_socio = [matriz.loc[a, b] for i, a in enumerate(socio) for b in socio[i + 1:]]
+    return {
+        'r': {linha: {coluna: decimal(valor) for coluna, valor in matriz.loc[linha].items()} for linha in matriz.index},
+        'sentido': {linha: {coluna: _sentido(valor) for coluna, valor in matriz.loc[linha].items()}
+                    for linha in matriz.index},
+        'forca': {linha: {coluna: _forca(valor) for coluna, valor in matriz.loc[linha].items()}
+                  for linha in matriz.index},
+        'socio_min': decimal(min(entre_socio)),
+        'socio_max': decimal(max(entre_socio)),
+    }
+
+
+def dados_indicadores():
+    """
+    Incidência por UF contra temperatura e saneamento (dados_correlacao.csv):
+    as UFs que se afastam da tendência (resíduo padronizado da regressão
+    linear acima de Z_OUTLIER) e a incidência dos grupos frio e saneado /
+    quente e sem saneamento (em relação às medianas).
+    """
+    import numpy as np
+    import pandas as pd
+
+    dados = pd.read_csv(os.path.join(CORRELACAO, 'dados_correlacao.csv'), index_col=0)
+    incidencia = dados['Casos_por_100k'].to_numpy()
+    temperatura = dados['Temperatura_Media'].to_numpy()
+    saneamento = dados['Acesso_Saneamento'].to_numpy()
+    planejamento = np.column_stack([np.ones(len(dados)), temperatura, saneamento])
+    coeficientes = np.linalg.lstsq(planejamento, incidencia, rcond=None)[0]
+    esperada = planejamento @ coeficientes
+    residuo = incidencia - esperada
+    z = residuo / residuo.std(ddof=planejamento.shape[1])
+    ordem = np.argsort(-np.abs(z))
+    outliers = [i for i in ordem if abs(z[i]) > Z_OUTLIER]
+
+    def descrever(i):
+        return (f"{dados.index[i]} ({inteiro(incidencia[i])} casos por 100 mil habitantes, contra "
+                f"{inteiro(max(esperada[i], 0))} esperados pela tendência)")
+
+    if outliers:
+        frase = (f"{juntar_nomes(descrever(i) for i in outliers)} "
+                 f"{'destaca-se' if len(outliers) == 1 else 'destacam-se'} da tendência de temperatura e saneamento, "
+                 f"a mais de {decimal(Z_OUTLIER, 0)} desvios-padrão")
+    else:
+        frase = (f"Nenhuma UF se afasta da tendência de temperatura e saneamento por mais de {decimal(Z_OUTLIER, 0)} "
+                 f"desvios-padrão; a mais distante é {descrever(ordem[0])}")
+    frios = (temperatura < np.median(temperatura)) & (saneamento > np.median(saneamento))
+    quentes = (temperatura > np.median(temperatura)) & (saneamento < np.median(saneamento))
+    return {
+        'outliers_frase': frase,
+        'outliers_nomes': juntar_nomes(dados.index[i] for i in outliers) or 'nenhuma UF',
+        'frios_nomes': juntar_nomes(dados.index[frios]),
+        'frios_min': inteiro(incidencia[frios].min()),
+        'frios_max': inteiro(incidencia[frios].max()),
+        'quentes_nomes': juntar_nomes(dados.index[quentes]),
+        'quentes_mediana': inteiro(np.median(incidencia[quentes])),
+        'mediana_pais': inteiro(np.median(incidencia)),
+        'quentes_abaixo': f'{int((incidencia[quentes] < np.median(incidencia)).sum())} de {int(quentes.sum())}',
+    }
+
+
+# fonte: (arquivos de que depende, função que calcula os valores do template)
+FONTES = {
+    'casos': ([DIRETORIO_PADRAO, CSV_PADRAO], dados_casos),
+    'correlacao': ([os.path.join(CORRELACAO, 'matriz_correlacao.csv')], dados_correlacao),
+    'indicadores': ([os.path.join(CORRELACAO, 'dados_correlacao.csv')], dados_indicadores),
+}
+
+
+def secoes(template):
+    """Divide o texto do template em [(nome, fontes, corpo)]; o que vem antes do primeiro marcador é a seção 'inicio'."""
+    marcas = list(_SECAO.finditer(template))
+    partes = [('inicio', [], template[:marcas[0].start()] if marcas else template)]
+    for marca, seguinte in zip(marcas, marcas[1:] + [None]):
+        fontes = [fonte.strip() for fonte in (marca['fontes'] or '').split(',') if fonte.strip()]
+        desconhecidas = [fonte for fonte in fontes if fonte not in FONTES]
+        if desconhecidas:
+            raise ValueError(f"seção {marca['nome']}: fontes desconhecidas {', '.join(desconhecidas)}")
+        partes.append((marca['nome'], fontes, template[marca.end():seguinte.start() if seguinte else len(template)]))
+    return partes
+
+
+class Construtor:
+    """
+    Monta os relatórios seção a seção. A impressão de uma seção junta o
+    texto do template, o conteúdo dos arquivos das fontes que ela usa e o
+    das figuras que ela referencia; só seções com impressão nova são
+    renderizadas, e cada fonte é calculada no máximo uma vez.
+    """
+
+    def __init__(self, cache=CACHE_PADRAO):
+        self.cache = cache
+        try:
+            with open(cache, encoding='utf-8') as arquivo:
+                self.anteriores = json.load(arquivo)
+        except (OSError, ValueError):
+            self.anteriores = {}
+        self.atuais = {}
+        self._hashes = {}
+        self._valores = {}
+        self.renderizadas = []
+
+    def _hash_fonte(self, fonte):
+        if fonte not in self._hashes:
+            self._hashes[fonte] = _hash_arquivos(FONTES[fonte][0])
+        return self._hashes[fonte]
+
+    def _valores_fontes(self, fontes):
+        valores = {}
+        for fonte in fontes:
+            if fonte not in self._valores:
+                with etapa(f'fonte_{fonte}'):
+                    self._valores[fonte] = FONTES[fonte][1]()
+            valores.update(self._valores[fonte])
+        return valores
+
+    def secao(self, relatorio, nome, fontes, corpo):
+        soma = hashlib.sha256(corpo.encode())
+        for fonte in fontes:
+            soma.update(f'{fonte}:{self._hash_fonte(fonte)}'.encode())
+        for figura in _FIGURA.findall(corpo):
+            soma.update(f'{figura}:{_hash_arquivos([figura])}'.encode())
+        impressao = soma.hexdigest()
+        chave = f'{relatorio}#{nome}'
+        anterior = self.anteriores.get(chave)
+        if anterior and anterior['impressao'] == impressao:
+            texto = anterior['texto']
+        else:
+            texto = corpo.format_map(self._valores_fontes(fontes)) if fontes else corpo
+            self.renderizadas.append(chave)
+        self.atuais[chave] = {'impressao': impressao, 'texto': texto}
+        return texto
+
+    def construir(self, template, saida):
+        """Renderiza um relatório; grava `saida` só se o texto mudou. Retorna True se gravou."""
+        with open(template, encoding='utf-8') as arquivo:
+            texto = arquivo.read()
+        relatorio = os.path.basename(saida)
+        corpo = ''.join(self.secao(relatorio, nome, fontes, trecho) for nome, fontes, trecho in secoes(texto))
+        try:
+            with open(saida, encoding='utf-8') as arquivo:
+                if arquivo.read() == corpo:
+                    return False
+        except OSError:
+            pass
+        with open(saida, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(corpo)
+        return True
+
+    def salvar(self):
+        atuais = dict(self.anteriores, **self.atuais)
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache)), exist_ok=True)
+        with open(self.cache, 'w', encoding='utf-8') as arquivo:
+            json.dump(atuais, arquivo, ensure_ascii=False, indent=1, sort_keys=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Gera os relatórios em Markdown a partir dos templates e dos dados atuais, '
+                    'renderizando só as seções cujos dados ou figuras mudaram.')
+    parser.add_argument('--cache', default=CACHE_PADRAO, help='JSON com as seções já renderizadas')
+    parser.add_argument('--forcar', action='store_true', help='renderiza todas as seções')
+    args = parser.parse_args(argv)
+
+    construtor = Construtor(args.cache)
+    if args.forcar:
+        construtor.anteriores = {}
+    for template, saida in RELATORIOS.items():
+        with etapa('relatorio', arquivo=os.path.basename(saida)):
+            gravado = construtor.construir(template, saida)
+        print(f"{os.path.relpath(saida, DIRETORIO_BASE)}: {'atualizado' if gravado else 'sem mudanças'}")
+    construtor.salvar()
+    print(f"{len(construtor.renderizadas)} seção(ões) renderizada(s)"
+          + (f": {', '.join(construtor.renderizadas)}" if construtor.renderizadas else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+import argparse
+import asyncio
+import collections
+import json
+import time
+import unicodedata
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from correlacao import correlacao_defasada, matriz_correlacao
+from cubo_casos import MESES, abrir_cubo, carregar_casos
+from geografia import CODIGOS_POR_NOME, PERIODOS, IndiceGeografico, agregar_periodos
+from juncao import carregar_covariaveis, juntar
+from populacao import POR_HABITANTES, carregar_populacao, juntar_rotulos
+
+HOST_PADRAO = '127.0.0.1'
+PORTA_PADRAO = 8050
+CACHE_MB = 64
+
+# tabelas mensais (UF × mês) de clima disponíveis para correlação defasada
+CLIMA_MENSAL = {
+    'temperatura': '/home/ubuntu/dados_complementares/temperatura_media_por_estado.csv',
+    'precipitacao': '/home/ubuntu/dados_complementares/precipitacao_por_estado.csv',
+}
+
+# parâmetros cuja ordem não muda a resposta: entram ordenados na chave do cache
+_CONJUNTOS = {'unidades', 'anos'}
+
+
+class CacheLRU:
+    """
+    Respostas já serializadas (bytes), da menos para a mais recentemente
+    usada. Ao passar de `limite_bytes`, as menos recentes são descartadas.
+    """
+
+    def __init__(self, limite_bytes):
+        self.limite_bytes = limite_bytes
+        self.bytes = 0
+        self.acertos = 0
+        self.faltas = 0
+        self._itens = collections.OrderedDict()
+
+    def obter(self, chave):
+        corpo = self._itens.get(chave)
+        if corpo is None:
+            self.faltas += 1
+            return None
+        self._itens.move_to_end(chave)
+        self.acertos += 1
+        return corpo
+
+    def guardar(self, chave, corpo):
+        if len(corpo) > self.limite_bytes:
+            return
+        if chave in self._itens:
+            self.bytes -= len(self._itens.pop(chave))
+        self._itens[chave] = corpo
+        self.bytes += len(corpo)
+        while self.bytes > self.limite_bytes:
+            _, antigo = self._itens.popitem(last=False)
+            self.bytes -= len(antigo)
+
+    def estado(self):
+        return {'itens': len(self._itens), 'bytes': self.bytes, 'limite_bytes': self.limite_bytes,
+                'acertos': self.acertos, 'faltas': self.faltas}
+
+
+def _normalizar(texto):
+    return unicodedata.normalize('NFC', texto).strip().casefold()
+
+
+def _lista(valor):
+    return [item.strip() for item in valor.split(',') if item.strip()] if valor else []
+
+
+def _booleano(valor):
+    return _normalizar(valor) in ('1', 'sim', 'true')
+
+
+class Dados:
+    """
+    Casos (cubo UF × ano × mês), covariáveis por UF e clima mensal, lidos
+    uma vez e mantidos em memória para todas as consultas.
+    """
+
+    def __init__(self):
+        inicio = time.perf_counter()
+        df = carregar_casos()
+        self.cubo = abrir_cubo()
+        self.casos = np.array(self.cubo.casos)
+        self.indice = IndiceGeografico(self.cubo.codigos_uf)
+
+        estados = df[~df['UF_Notificacao'].isin(['TOTAL', 'Ignorado/exterior'])]
+        base = pd.DataFrame({'Total_Casos': estados[MESES].sum(axis=1).to_numpy()},
+                            index=pd.Index(estados['UF_Notificacao'], name='UF'))
+        self.covariaveis, _ = juntar(base, carregar_covariaveis())
+        self.populacao = carregar_populacao()
+        self.covariaveis['Casos_por_100k'] = self.populacao.incidencia(
+            self.covariaveis[['Total_Casos']].to_numpy(), 'uf', [juntar_rotulos(self.cubo.anos)],
+            [CODIGOS_POR_NOME[uf] for uf in self.covariaveis.index])[:, 0]
+        self.casos_mensais = estados.set_index('UF_Notificacao')[MESES]
+        self.clima = {nome: pd.read_csv(arquivo, index_col=0)[MESES] for nome, arquivo in CLIMA_MENSAL.items()}
+        self.segundos_carga = time.perf_counter() - inicio
+
+    def _unidades(self, nivel, pedidas):
+        rotulos = self.indice.rotulos(nivel)
+        if not pedidas:
+            return list(range(len(rotulos)))
+        posicoes = {_normalizar(rotulo): i for i, rotulo in enumerate(rotulos)}
+        desconhecidas = [unidade for unidade in pedidas if _normalizar(unidade) not in posicoes]
+        if desconhecidas:
+            raise ValueError(f"unidades desconhecidas no nível {nivel}: {', '.join(desconhecidas)}")
+        return [posicoes[_normalizar(unidade)] for unidade in pedidas]
+
+    def fatia(self, nivel='uf', unidades=(), meses=(), anos=(), periodo=None, taxa=False):
+        """
+        Casos por unidade do nível e por mês (ou por grupo de meses de
+        PERIODOS), somados os anos pedidos (todos, por padrão). Com `taxa`,
+        casos por 100 mil habitantes (população média dos anos pedidos).
+        """
+        if nivel not in self.indice.niveis:
+            raise ValueError(f"nível desconhecido: {nivel} (use {', '.join(self.indice.niveis)})")
+        if periodo is not None and meses:
+            raise ValueError("use 'meses' ou 'periodo', não os dois")
+        if periodo is not None and periodo not in PERIODOS:
+            raise ValueError(f"agrupamento de meses desconhecido: {periodo} (use {', '.join(PERIODOS)})")
+        rotulos_anos = [str(ano) for ano in self.cubo.anos]
+        desconhecidos = [ano for ano in anos if ano not in rotulos_anos]
+        if desconhecidos:
+            raise ValueError(f"anos fora do cubo: {', '.join(desconhecidos)} (disponíveis: {', '.join(rotulos_anos)})")
+        posicoes_anos = [rotulos_anos.index(ano) for ano in anos] if anos else slice(None)
+
+        valores = self.indice.agregar(self.casos[:, posicoes_anos].sum(axis=1), nivel)
+        rotulos = self.indice.rotulos(nivel)
+        posicoes = self._unidades(nivel, unidades)
+        if periodo is not None:
+            tabela = pd.DataFrame(agregar_periodos(valores[posicoes], periodo),
+                                  index=[rotulos[i] for i in posicoes], columns=PERIODOS[periodo][0])
+        else:
+            tabela = pd.DataFrame(valores[posicoes], index=[rotulos[i] for i in posicoes], columns=MESES)[_meses(meses)]
+        if not taxa:
+            return {'nivel': nivel, 'colunas': list(tabela.columns),
+                    'unidades': {uf: {coluna: int(valor) for coluna, valor in linha.items()}
+                                 for uf, linha in tabela.iterrows()},
+                    'total': int(tabela.to_numpy().sum())}
+
+        # ignorados e exterior não têm população
+        codigos = self.indice.codigos[nivel][posicoes]
+        validas = codigos != 0 if nivel != 'brasil' else np.ones(len(codigos), dtype=bool)
+        if not validas.any():
+            raise ValueError(f"taxa sem população para {', '.join(tabela.index)}: peça as contagens (taxa=0)")
+        tabela = tabela[validas]
+        periodo_anos = [juntar_rotulos(anos or rotulos_anos)]
+        incidencia = self.populacao.incidencia(tabela.to_numpy()[:, None], nivel, periodo_anos, codigos[validas])[:, 0]
+        habitantes = self.populacao.populacao(nivel, periodo_anos, codigos[validas]).to_numpy().sum()
+        total = tabela.to_numpy().sum() / habitantes * POR_HABITANTES
+        return {'nivel': nivel, 'colunas': list(tabela.columns), 'por_habitantes': POR_HABITANTES,
+                'unidades': {uf: dict(zip(tabela.columns, np.round(linha, 6).tolist()))
+                             for uf, linha in zip(tabela.index, incidencia)},
+                'total': round(float(total), 6)}
+
+    def correlacao(self, variaveis=(), metodo='spearman'):
+        """Matriz de correlação entre colunas das covariáveis por UF (todas, por padrão)."""
+        desconhecidas = [variavel for variavel in variaveis if variavel not in self.covariaveis.columns]
+        if desconhecidas:
+            raise ValueError(f"variáveis desconhecidas: {', '.join(desconhecidas)} "
+                             f"(disponíveis: {', '.join(self.covariaveis.columns)})")
+        matriz = matriz_correlacao(self.covariaveis[list(variaveis) or list(self.covariaveis.columns)], metodo)
+        return {'metodo': metodo, 'variaveis': list(matriz.columns), 'matriz': matriz.round(6).to_numpy().tolist()}
+
+    def defasagem(self, variavel='temperatura', maxima=3):
+        """Correlação cruzada clima → casos por UF nas defasagens 0..maxima."""
+        if variavel not in self.clima:
+            raise ValueError(f"variável climática desconhecida: {variavel} (use {', '.join(self.clima)})")
+        grade = correlacao_defasada(self.clima[variavel], self.casos_mensais, maxima)
+        return {'variavel': variavel, 'defasagens': grade.index.tolist(),
+                'ufs': {uf: grade[uf].round(6).tolist() for uf in grade.columns},
+                'media': grade.mean(axis=1).round(6).tolist()}
+
+
+def _meses(pedidos):
+    """Meses pedidos, em ordem do calendário; aceita intervalos como 'Fev-Abr'."""
+    if not pedidos:
+        return list(MESES)
+    posicoes = {_normalizar(mes): i for i, mes in enumerate(MESES)}
+    escolhidos = set()
+    for pedido in pedidos:
+        partes = [_normalizar(parte) for parte in pedido.split('-')]
+        if any(parte not in posicoes for parte in partes) or len(partes) > 2:
+            raise ValueError(f"mês inválido: {pedido}")
+        inicio, fim = posicoes[partes[0]], posicoes[partes[-1]]
+        escolhidos.update(range(inicio, fim + 1) if inicio <= fim else [*range(inicio, 12), *range(fim + 1)])
+    return [MESES[i] for i in sorted(escolhidos)]
+
+
+# rota: (método de Dados, conversão de cada parâmetro da URL)
+ROTAS = {
+    '/fatia': ('fatia', {'nivel': str, 'unidades': _lista, 'meses': _lista, 'anos': _lista, 'periodo': str,
+                         'taxa': _booleano}),
+    '/correlacao': ('correlacao', {'variaveis': _lista, 'metodo': str}),
+    '/defasagem': ('defasagem', {'variavel': str, 'maxima': int}),
+}
+
+
+def chave_consulta(rota, parametros):
+    """
+    Chave normalizada: parâmetros em ordem fixa, listas sem espaços, meses
+    em ordem do calendário e conjuntos ordenados, para que consultas
+    equivalentes dividam a mesma entrada do cache.
+    """
+    itens = []
+    for nome, valor in sorted(parametros.items()):
+        if isinstance(valor, list):
+            if nome == 'meses':
+                valor = _meses(valor)
+            elif nome in _CONJUNTOS:
+                valor = sorted(_normalizar(item) for item in valor)
+            valor = tuple(valor)
+        itens.append((nome, valor))
+    return (rota, tuple(itens))
+
+
+class Servico:
+    """Servidor HTTP/JSON assíncrono sobre Dados, com cache LRU das respostas."""
+
+    def __init__(self, dados, cache_bytes=CACHE_MB << 20):
+        self.dados = dados
+        self.cache = CacheLRU(cache_bytes)
+        self._em_andamento = {}
+
+    async def responder(self, alvo):
+        """Retorna (status, corpo JSON em bytes) para o caminho+query `alvo`."""
+        url = urlsplit(alvo)
+        if url.path == '/estado':
+            return 200, _json({'segundos_carga': round(self.dados.segundos_carga, 3), 'cache': self.cache.estado(),
+                               'niveis': self.dados.indice.niveis, 'periodos': list(PERIODOS),
+                               'variaveis': list(self.dados.covariaveis.columns)})
+        if url.path not in ROTAS:
+            return 404, _json({'erro': f"rota desconhecida: {url.path}", 'rotas': list(ROTAS) + ['/estado']})
+
+        metodo, conversoes = ROTAS[url.path]
+        try:
+            parametros = {}
+            for nome, valor in parse_qsl(url.query):
+                if nome not in conversoes:
+                    raise ValueError(f"parâmetro desconhecido: {nome}")
+                parametros[nome] = conversoes[nome](valor)
+            chave = chave_consulta(url.path, parametros)
+        except ValueError as erro:
+            return 400, _json({'erro': str(erro)})
+
+        corpo = self.cache.obter(chave)
+        if corpo is not None:
+            return 200, corpo
+        # consultas iguais que chegam juntas esperam o mesmo cálculo
+        if chave not in self._em_andamento:
+            loop = asyncio.get_running_loop()
+            self._em_andamento[chave] = loop.run_in_executor(None, self._calcular, metodo, parametros)
+        try:
+            status, corpo = await asyncio.shield(self._em_andamento[chave])
+        finally:
+            self._em_andamento.pop(chave, None)
+        if status == 200:
+            self.cache.guardar(chave, corpo)
+        return status, corpo
+
+    def _calcular(self, metodo, parametros):
+        try:
+            return 200, _json(getattr(self.dados, metodo)(**parametros))
+        except (ValueError, KeyError) as erro:
+            return 400, _json({'erro': str(erro)})
+
+    async def atender(self, leitor, escritor):
+        """Uma conexão HTTP/1.1, com keep-alive; só GET."""
+        try:
+            while True:
+                linha = await leitor.readline()
+                if not linha:
+                    break
+                metodo, alvo, versao = linha.decode('latin-1').split()
+                cabecalhos = {}
+                while (cabecalho := await leitor.readline()) not in (b'\r\n', b'\n', b''):
+                    nome, _, valor = cabecalho.decode('latin-1').partition(':')
+                    cabecalhos[nome.strip().lower()] = valor.strip()
+                conexao = cabecalhos.get('connection', '').lower()
+                manter = conexao == 'keep-alive' or (versao == 'HTTP/1.1' and conexao != 'close')
+                if metodo != 'GET':
+                    status, corpo = 405, _json({'erro': 'só GET é aceito'})
+                else:
+                    status, corpo = await self.responder(alvo)
+                escritor.write(f"HTTP/1.1 {status} {_MOTIVOS[status]}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                               f"Content-Length: {len(corpo)}\r\nConnection: {'keep-alive' if manter else 'close'}\r\n\r\n"
+                               .encode('latin-1') + corpo)
+                await escritor.drain()
+                if not manter:
+                    break
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            escritor.close()
+
+
+_MOTIVOS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}
+
+
+def _json(objeto):
+    # NaN e infinito não são JSON válido: a consulta que os produzir responde 400 (ValueError)
+    return json.dumps(objeto, ensure_ascii=False, allow_nan=False).encode('utf-8')
+
+
+async def servir(host=HOST_PADRAO, porta=PORTA_PADRAO, cache_bytes=CACHE_MB << 20):
+    dados = Dados()
+    servico = Servico(dados, cache_bytes)
+    servidor = await asyncio.start_server(servico.atender, host, porta)
+    print(f"Dados carregados em {dados.segundos_carga:.2f} s; servindo em http://{host}:{porta} "
+          f"({', '.join(list(ROTAS) + ['/estado'])})")
+    async with servidor:
+        await servidor.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serviço local de consultas HTTP/JSON sobre os casos de dengue.')
+    parser.add_argument('--host', default=HOST_PADRAO, help='endereço de escuta')
+    parser.add_argument('--porta', type=int, default=PORTA_PADRAO, help='porta de escuta')
+    parser.add_argument('--cache-mb', type=float, default=CACHE_MB, help='tamanho máximo do cache de respostas, em MB')
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(servir(args.host, args.porta, int(args.cache_mb * (1 << 20))))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from cubo_casos import CSV_PADRAO, DIRETORIO_PADRAO, MESES, abrir_cubo
+from geografia import CODIGOS_POR_NOME
+from juncao import CONFIG_PADRAO, carregar_covariaveis, normalizar_chaves
+from rastreamento import etapa
+
+SAIDA_PADRAO = '/home/ubuntu/validacao.json'
+
+COLUNAS_VALORES = ['Ign_Em_Branco'] + MESES + ['Total']
+# linhas que não são UFs: a soma de todas e os casos sem UF conhecida
+TOTAL = 'TOTAL'
+IGNORADOS = 'Ignorado/exterior'
+
+
+def celulas(tabela, verificacao, mascara, linhas, colunas, esperado=np.nan, obtido=np.nan):
+    """
+    Uma linha por célula marcada em `mascara` (linhas × colunas), com os
+    valores esperado e obtido (arrays da mesma forma, ou escalares).
+    """
+    mascara = np.asarray(mascara, dtype=bool)
+    i, j = np.nonzero(mascara)
+    return pd.DataFrame({
+        'tabela': tabela,
+        'verificacao': verificacao,
+        'linha': np.asarray(linhas, dtype=object)[i],
+        'coluna': np.asarray(colunas, dtype=object)[j],
+        'esperado': np.broadcast_to(np.asarray(esperado, dtype=object), mascara.shape)[i, j],
+        'obtido': np.broadcast_to(np.asarray(obtido, dtype=object), mascara.shape)[i, j],
+    })
+
+
+def verificar_tabela(df, tabela='dengue_data_raw.csv', conhecidas=CODIGOS_POR_NOME):
+    """
+    Tabela no esquema de dengue_data_raw.csv: colunas presentes, contagens
+    inteiras e não negativas, Total de cada linha igual a Ign_Em_Branco +
+    Jan..Dez, linha TOTAL igual à soma das demais e unidades conhecidas (por
+    padrão, os nomes das UFs; para tabelas municipais, os códigos aceitos)
+    e sem repetição. Retorna as células com falha.
+    """
+    faltantes = [coluna for coluna in ['UF_Notificacao'] + COLUNAS_VALORES if coluna not in df.columns]
+    if faltantes:
+        return celulas(tabela, 'coluna_ausente', np.ones((1, len(faltantes))), ['-'], faltantes)
+
+    nomes = normalizar_chaves(pd.Index(df['UF_Notificacao']))
+    valores = df[COLUNAS_VALORES].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    falhas = []
+
+    with np.errstate(invalid='ignore'):
+        invalidos = np.isnan(valores) | (valores < 0) | (valores != np.round(valores))
+    falhas.append(celulas(tabela, 'valor_invalido', invalidos, nomes, COLUNAS_VALORES, obtido=valores))
+
+    # NaN já entrou como valor inválido; aqui só somas que de fato divergem
+    soma_linhas = valores[:, :-1].sum(axis=1)
+    divergentes = (soma_linhas != valores[:, -1]) & ~np.isnan(soma_linhas) & ~np.isnan(valores[:, -1])
+    falhas.append(celulas(tabela, 'total_da_linha', divergentes[:, None], nomes, ['Total'],
+                          soma_linhas[:, None], valores[:, -1:]))
+
+    e_total = np.asarray(nomes == TOTAL)
+    if e_total.sum() != 1:
+        falhas.append(celulas(tabela, 'linha_total', np.ones((1, 1)), [TOTAL], ['UF_Notificacao'],
+                              1, int(e_total.sum())))
+    else:
+        esperado = np.nansum(valores[~e_total], axis=0)
+        obtido = valores[e_total][0]
+        falhas.append(celulas(tabela, 'linha_total', (esperado != obtido)[None, :], [TOTAL], COLUNAS_VALORES,
+                              esperado[None, :], obtido[None, :]))
+
+    ufs = nomes[~e_total]
+    desconhecidas = pd.Index(list(conhecidas)).unique().get_indexer(ufs) < 0
+    falhas.append(celulas(tabela, 'uf_desconhecida', desconhecidas[:, None], ufs, ['UF_Notificacao'],
+                          obtido=np.asarray(ufs, dtype=object)[:, None]))
+    repetidas = ufs.duplicated()
+    falhas.append(celulas(tabela, 'uf_repetida', repetidas[:, None], ufs, ['UF_Notificacao']))
+    return pd.concat(falhas, ignore_index=True)
+
+
+def verificar_cubo(cubo, df, tabela='cubo_dengue'):
+    """
+    Cubo UF × ano × mês contra a tabela: contagens não negativas e, somados
+    os anos, os mesmos casos por UF e mês e os mesmos ignorados por UF que
+    a tabela. UFs que estão só num dos dois também são falhas.
+    """
+    ufs = list(cubo.ufs.categories)
+    casos = np.asarray(cubo.casos, dtype=np.int64)
+    ignorados = np.asarray(cubo.ignorados, dtype=np.int64)
+    periodos = [f'{ano}/{mes}' for ano in cubo.anos for mes in cubo.periodos]
+    falhas = [
+        celulas(tabela, 'valor_invalido', casos.reshape(len(ufs), -1) < 0, ufs, periodos,
+                obtido=casos.reshape(len(ufs), -1)),
+        celulas(tabela, 'valor_invalido', ignorados < 0, ufs, [f'{ano}/Ign_Em_Branco' for ano in cubo.anos],
+                obtido=ignorados),
+    ]
+
+    linhas = df[df['UF_Notificacao'] != TOTAL]
+    nomes = normalizar_chaves(pd.Index(linhas['UF_Notificacao']))
+    posicoes = pd.Index(ufs).get_indexer(nomes)
+    falhas.append(celulas(tabela, 'uf_fora_do_cubo', (posicoes < 0)[:, None], nomes, ['UF_Notificacao']))
+    falhas.append(celulas(tabela, 'uf_fora_da_tabela', ~np.isin(np.arange(len(ufs)), posicoes)[:, None], ufs,
+                          ['UF_Notificacao']))
+
+    presentes = posicoes >= 0
+    tabela_valores = linhas[['Ign_Em_Branco'] + MESES].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    tabela_valores = tabela_valores[presentes]
+    do_cubo = np.column_stack([ignorados.sum(axis=1), casos.sum(axis=1)])[posicoes[presentes]]
+    falhas.append(celulas(tabela, 'cubo_x_tabela', do_cubo != tabela_valores, nomes[presentes],
+                          ['Ign_Em_Branco'] + MESES, tabela_valores, do_cubo))
+    return pd.concat(falhas, ignore_index=True)
+
+
+def verificar_covariaveis(ufs, tabelas):
+    """
+    Tabelas de covariáveis ({nome: DataFrame indexado pela UF}, ver
+    juncao.carregar_covariaveis) contra as UFs dos casos: cada UF com uma
+    linha em cada tabela, nenhuma chave desconhecida ou repetida e valores
+    finitos.
+    """
+    ufs = normalizar_chaves(pd.Index(ufs))
+    ufs = ufs[~ufs.isin([TOTAL, IGNORADOS])]
+    falhas = []
+    for nome, tabela in tabelas.items():
+        chaves = normalizar_chaves(tabela.index)
+        falhas.append(celulas(nome, 'sem_covariavel', ~ufs.isin(chaves)[:, None], ufs, ['UF']))
+        falhas.append(celulas(nome, 'chave_desconhecida', ~chaves.isin(ufs)[:, None], chaves, ['UF']))
+        falhas.append(celulas(nome, 'chave_repetida', chaves.duplicated()[:, None], chaves, ['UF']))
+        valores = tabela.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        falhas.append(celulas(nome, 'valor_invalido', ~np.isfinite(valores), chaves, tabela.columns,
+                              obtido=tabela.to_numpy(dtype=object)))
+    return pd.concat(falhas, ignore_index=True) if falhas else celulas('', '', np.zeros((0, 0)), [], [])
+
+
+def validar(df, cubo=None, tabelas=None):
+    """Todas as verificações que se aplicam aos dados fornecidos; DataFrame com uma linha por célula com falha."""
+    falhas = [verificar_tabela(df)]
+    if cubo is not None and 'UF_Notificacao' in df.columns:
+        falhas.append(verificar_cubo(cubo, df))
+    if tabelas is not None and 'UF_Notificacao' in df.columns:
+        falhas.append(verificar_covariaveis(df['UF_Notificacao'], tabelas))
+    return pd.concat(falhas, ignore_index=True)
+
+
+def relatorio(falhas, arquivos):
+    """Relatório em JSON: arquivos verificados, falhas por verificação e as células."""
+    contagem = falhas.groupby(['tabela', 'verificacao']).size()
+    registros = falhas.astype(object).where(falhas.notna(), None).to_dict(orient='records')
+    return {
+        'arquivos': arquivos,
+        'falhas': len(falhas),
+        'por_verificacao': {f'{tabela}:{verificacao}': int(n) for (tabela, verificacao), n in contagem.items()},
+        'celulas': [{chave: valor.item() if isinstance(valor, np.generic) else valor for chave, valor in registro.items()}
+                    for registro in registros],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Valida a tabela de casos, o cubo e as covariáveis antes das etapas caras, '
+                    'gravando as células com falha em JSON.')
+    parser.add_argument('--csv', default=CSV_PADRAO, help='tabela no esquema de dengue_data_raw.csv')
+    parser.add_argument('--cubo', default=DIRETORIO_PADRAO, help='cubo UF × ano × mês a conferir com a tabela')
+    parser.add_argument('--covariaveis', default=CONFIG_PADRAO, help='declaração das tabelas de covariáveis')
+    parser.add_argument('--saida', default=SAIDA_PADRAO, help='relatório JSON')
+    parser.add_argument('--sem-falhar', action='store_true', help='grava o relatório mas termina com sucesso mesmo com falhas')
+    args = parser.parse_args(argv)
+
+    arquivos = {'tabela': args.csv}
+    with etapa('ler_dados') as medida:
+        df = pd.read_csv(args.csv)
+        medida.linhas = len(df)
+        cubo = None
+        if os.path.exists(os.path.join(args.cubo, 'eixos.json')):
+            # carregar_casos remontaria um cubo mais velho que o CSV; aqui ele é só conferido quando está em dia
+            if os.path.getmtime(os.path.join(args.cubo, 'eixos.json')) >= os.path.getmtime(args.csv):
+                cubo = abrir_cubo(args.cubo)
+                arquivos['cubo'] = args.cubo
+            else:
+                print(f"Cubo em {args.cubo} mais antigo que {args.csv}; não conferido")
+        tabelas = carregar_covariaveis(args.covariaveis)
+        arquivos['covariaveis'] = args.covariaveis
+
+    with etapa('validar', linhas=len(df)):
+        falhas = validar(df, cubo, tabelas)
+
+    with open(args.saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(relatorio(falhas, arquivos), arquivo, ensure_ascii=False, indent=1)
+    if len(falhas):
+        for (tabela, verificacao), grupo in falhas.groupby(['tabela', 'verificacao'], sort=False):
+            exemplos = ', '.join(f"{linha}/{coluna}" for linha, coluna in grupo[['linha', 'coluna']].head(3).to_numpy())
+            print(f"  {tabela}: {verificacao}: {len(grupo)} célula(s) ({exemplos}{', ...' if len(grupo) > 3 else ''})")
+        print(f"{len(falhas)} célula(s) com falha; relatório em {args.saida}")
+        if not args.sem_falhar:
+            raise SystemExit(1)
+    else:
+        print(f"Dados válidos; relatório em {args.saida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,145 +1,117 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
-import seaborn as sns
-from matplotlib.ticker import FuncFormatter
-import matplotlib as mpl
+import argparse
+import os
 
-plt.rcParams['font.family'] = 'DejaVu Sans'
-plt.rcParams['axes.unicode_minus'] = False
+from cubo_casos import carregar_casos
+from geografia import TabelaGeografica
+from graficos import VARIANTES, grafico, renderizar
+from rastreamento import etapa
 
-df = pd.read_csv('/home/ubuntu/dengue_data_raw.csv')
+SAIDA = '/home/ubuntu/visualizacoes'
 
-df['Total_Calculado'] = df.iloc[:, 2:14].sum(axis=1)
+meses = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
 
-import os
-os.makedirs('/home/ubuntu/visualizacoes', exist_ok=True)
 
-plt.figure(figsize=(12, 6))
-meses = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
-casos_por_mes = df[df['UF_Notificacao'] == 'TOTAL'][meses].values[0]
-
-plt.plot(meses, casos_por_mes, marker='o', linewidth=2, markersize=8)
-plt.title('Casos de Dengue por Mês no Brasil', fontsize=16)
-plt.xlabel('Mês', fontsize=12)
-plt.ylabel('Número de Casos', fontsize=12)
-plt.grid(True, linestyle='--', alpha=0.7)
-
-def milhoes(x, pos):
-    return f'{x/1e6:.1f}M' if x >= 1e6 else f'{x/1e3:.0f}K'
-
-plt.gca().yaxis.set_major_formatter(FuncFormatter(milhoes))
-
-plt.annotate(f'Pico: {casos_por_mes[3]:,.0f}',
-             xy=(3, casos_por_mes[3]), 
-             xytext=(3, casos_por_mes[3]*1.1),
-             arrowprops=dict(facecolor='red', shrink=0.05),
-             fontsize=12)
-
-plt.tight_layout()
-plt.savefig('/home/ubuntu/visualizacoes/casos_por_mes.png', dpi=300)
-
-df_estados = df[(df['UF_Notificacao'] != 'TOTAL') & (df['UF_Notificacao'] != 'Ignorado/exterior')]
-df_estados = df_estados.sort_values(by='Total_Calculado', ascending=False).head(10)
-
-plt.figure(figsize=(12, 6))
-bars = plt.bar(df_estados['UF_Notificacao'], df_estados['Total_Calculado'], color=sns.color_palette('viridis', 10))
-plt.title('Top 10 Estados com Mais Casos de Dengue', fontsize=16)
-plt.xlabel('Estado', fontsize=12)
-plt.ylabel('Número de Casos', fontsize=12)
-plt.xticks(rotation=45)
-plt.grid(True, axis='y', linestyle='--', alpha=0.7)
-
-for bar in bars:
-    height = bar.get_height()
-    plt.text(bar.get_x() + bar.get_width()/2., height,
-             f'{height:,.0f}',
-             ha='center', va='bottom', rotation=0, fontsize=9)
-
-plt.gca().yaxis.set_major_formatter(FuncFormatter(milhoes))
-plt.tight_layout()
-plt.savefig('/home/ubuntu/visualizacoes/top10_estados.png', dpi=300)
-
-top15_estados = df_estados.head(15).copy()
-heatmap_data = top15_estados[meses].values
-estados_nomes = top15_estados['UF_Notificacao'].values
-
-plt.figure(figsize=(14, 8))
-ax = sns.heatmap(heatmap_data, annot=False, fmt=".0f", cmap="YlOrRd", 
-                 xticklabels=meses, yticklabels=estados_nomes)
-plt.title('Distribuição de Casos de Dengue por Mês e Estado (Top 15)', fontsize=16)
-plt.xlabel('Mês', fontsize=12)
-plt.ylabel('Estado', fontsize=12)
-
-cbar = ax.collections[0].colorbar
-cbar.set_label('Número de Casos')
-plt.tight_layout()
-plt.savefig('/home/ubuntu/visualizacoes/heatmap_estados_meses.png', dpi=300)
-
-regioes = {
-    'Norte': ['Acre', 'Amapá', 'Amazonas', 'Pará', 'Rondônia', 'Roraima', 'Tocantins'],
-    'Nordeste': ['Alagoas', 'Bahia', 'Ceará', 'Maranhão', 'Paraíba', 'Pernambuco', 'Piauí', 'Rio Grande do Norte', 'Sergipe'],
-    'Centro-Oeste': ['Distrito Federal', 'Goiás', 'Mato Grosso', 'Mato Grosso do Sul'],
-    'Sudeste': ['Espírito Santo', 'Minas Gerais', 'Rio de Janeiro', 'São Paulo'],
-    'Sul': ['Paraná', 'Rio Grande do Sul', 'Santa Catarina']
-}
-
-df_regioes = pd.DataFrame(columns=meses)
-
-for regiao, estados in regioes.items():
-    df_regiao = df[df['UF_Notificacao'].isin(estados)]
-    casos_regiao = df_regiao[meses].sum()
-    df_regioes.loc[regiao] = casos_regiao
-
-plt.figure(figsize=(14, 7))
-for regiao in df_regioes.index:
-    plt.plot(meses, df_regioes.loc[regiao], marker='o', linewidth=2, label=regiao)
-
-plt.title('Casos de Dengue por Mês e Região', fontsize=16)
-plt.xlabel('Mês', fontsize=12)
-plt.ylabel('Número de Casos', fontsize=12)
-plt.grid(True, linestyle='--', alpha=0.7)
-plt.legend(title='Região', fontsize=10)
-plt.gca().yaxis.set_major_formatter(FuncFormatter(milhoes))
-plt.tight_layout()
-plt.savefig('/home/ubuntu/visualizacoes/casos_por_regiao.png', dpi=300)
-
-total_por_regiao = df_regioes.sum(axis=1)
-plt.figure(figsize=(10, 8))
-plt.pie(total_por_regiao, labels=total_por_regiao.index, autopct='%1.1f%%', 
-        startangle=90, shadow=True, explode=[0.05]*5,
-        colors=sns.color_palette('viridis', 5))
-plt.title('Distribuição de Casos de Dengue por Região', fontsize=16)
-plt.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle
-plt.tight_layout()
-plt.savefig('/home/ubuntu/visualizacoes/distribuicao_por_regiao.png', dpi=300)
-
-trimestres = {
-    'Verão (Jan-Mar)': ['Jan', 'Fev', 'Mar'],
-    'Outono (Abr-Jun)': ['Abr', 'Mai', 'Jun'],
-    'Inverno (Jul-Set)': ['Jul', 'Ago', 'Set'],
-    'Primavera (Out-Dez)': ['Out', 'Nov', 'Dez']
-}
-
-df_trimestres = pd.DataFrame(index=df_regioes.index, columns=trimestres.keys())
-
-for trimestre, meses_trim in trimestres.items():
+def preparar_dados(df):
+    """Tabelas derivadas usadas nos gráficos: casos por região e por trimestre."""
+    df['Total_Calculado'] = df.iloc[:, 2:14].sum(axis=1)
+
+    tabela = TabelaGeografica.de_dataframe(df)
+    df_regioes = tabela.agregado('regiao').drop(index='Ignorado/exterior', errors='ignore')
+    df_trimestres = tabela.agregado('regiao', 'trimestre').drop(index='Ignorado/exterior', errors='ignore')
+    return df_regioes, df_trimestres
+
+
+def ranking_estados(df, n=10):
+    """As `n` UFs com mais casos (UF_Notificacao, Total_Calculado), em ordem decrescente."""
+    df_estados = df[(df['UF_Notificacao'] != 'TOTAL') & (df['UF_Notificacao'] != 'Ignorado/exterior')]
+    return df_estados.sort_values(by='Total_Calculado', ascending=False).head(n)
+
+
+def especificar_graficos(df, df_regioes, df_trimestres, saida=SAIDA):
+    """Especificações dos gráficos gerais (Brasil, estados e regiões)."""
+    casos_por_mes = df[df['UF_Notificacao'] == 'TOTAL'][meses].values[0]
+
+    df_estados = ranking_estados(df)
+
+    top15_estados = df_estados.head(15).copy()
+    total_por_regiao = df_regioes.sum(axis=1)
+
+    return [
+        grafico('linhas', os.path.join(saida, 'casos_por_mes.png'), {None: casos_por_mes},
+                'Casos de Dengue por Mês no Brasil', 'Mês', 'Número de Casos',
+                x=meses, tamanho_marcador=8, destaque=3, grade='both', formato_y='milhoes'),
+        grafico('barras', os.path.join(saida, 'top10_estados.png'),
+                dict(zip(df_estados['UF_Notificacao'], df_estados['Total_Calculado'])),
+                'Top 10 Estados com Mais Casos de Dengue', 'Estado', 'Número de Casos',
+                rotacao=45, valores=True, grade='y', formato_y='milhoes'),
+        grafico('mapa_calor', os.path.join(saida, 'heatmap_estados_meses.png'), top15_estados[meses].values,
+                'Distribuição de Casos de Dengue por Mês e Estado (Top 15)', 'Mês', 'Estado', tamanho=(14, 8),
+                cmap='YlOrRd', colunas=meses, linhas=top15_estados['UF_Notificacao'].values,
+                rotulo_barra='Número de Casos'),
+        grafico('linhas', os.path.join(saida, 'casos_por_regiao.png'),
+                {regiao: df_regioes.loc[regiao].values for regiao in df_regioes.index},
+                'Casos de Dengue por Mês e Região', 'Mês', 'Número de Casos', tamanho=(14, 7),
+                x=meses, grade='both', formato_y='milhoes', legenda='Região'),
+        grafico('pizza', os.path.join(saida, 'distribuicao_por_regiao.png'), total_por_regiao.to_dict(),
+                'Distribuição de Casos de Dengue por Região', tamanho=(10, 8)),
+        grafico('barras_agrupadas', os.path.join(saida, 'casos_por_trimestre.png'), df_trimestres,
+                'Casos de Dengue por Trimestre e Região', 'Região', 'Número de Casos', tamanho=(12, 7),
+                grade='y', formato_y='milhoes', legenda='Trimestre'),
+    ]
+
+
+def especificar_graficos_locais(df, df_regioes, saida=SAIDA):
+    """Curva mensal de cada UF e de cada região, em `saida`/estados e `saida`/regioes."""
+    specs = []
+    for _, linha in df[df['UF_Notificacao'] != 'TOTAL'].iterrows():
+        uf = linha['UF_Notificacao']
+        specs.append(grafico('linhas', os.path.join(saida, 'estados', f"{uf.replace('/', '-')}.png"), {None: linha[meses].values},
+                             f'Casos de Dengue por Mês - {uf}', 'Mês', 'Número de Casos',
+                             x=meses, tamanho_marcador=8, grade='both', formato_y='milhoes'))
     for regiao in df_regioes.index:
-        df_trimestres.loc[regiao, trimestre] = df_regioes.loc[regiao, meses_trim].sum()
-
-plt.figure(figsize=(12, 7))
-df_trimestres.plot(kind='bar', stacked=False, figsize=(12, 7), width=0.7)
-plt.title('Casos de Dengue por Trimestre e Região', fontsize=16)
-plt.xlabel('Região', fontsize=12)
-plt.ylabel('Número de Casos', fontsize=12)
-plt.grid(True, axis='y', linestyle='--', alpha=0.7)
-plt.legend(title='Trimestre', fontsize=10)
-plt.gca().yaxis.set_major_formatter(FuncFormatter(milhoes))
-plt.tight_layout()
-plt.savefig('/home/ubuntu/visualizacoes/casos_por_trimestre.png', dpi=300)
-
-df.to_csv('/home/ubuntu/visualizacoes/dengue_data_processed.csv', index=False)
-df_regioes.to_csv('/home/ubuntu/visualizacoes/dengue_por_regiao.csv')
-df_trimestres.to_csv('/home/ubuntu/visualizacoes/dengue_por_trimestre.csv')
-
-print("Visualizações geradas com sucesso e salvas em /home/ubuntu/visualizacoes/")
+        specs.append(grafico('linhas', os.path.join(saida, 'regioes', f'{regiao}.png'),
+                             {None: df_regioes.loc[regiao].values},
+                             f'Casos de Dengue por Mês - {regiao}', 'Mês', 'Número de Casos',
+                             x=meses, tamanho_marcador=8, grade='both', formato_y='milhoes'))
+    return specs
+
+
+def salvar_tabelas(df, df_regioes, df_trimestres, saida=SAIDA):
+    """Grava as tabelas derivadas: casos por região, por trimestre e o ranking dos estados."""
+    df_regioes.to_csv(os.path.join(saida, 'dengue_por_regiao.csv'))
+    df_trimestres.to_csv(os.path.join(saida, 'dengue_por_trimestre.csv'))
+    ranking_estados(df)[['UF_Notificacao', 'Total_Calculado']].to_csv(
+        os.path.join(saida, 'top10_estados.csv'), index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Gera as visualizações dos casos de dengue.')
+    parser.add_argument('--processos', type=int, default=None, help='processos de desenho (padrão: número de CPUs)')
+    parser.add_argument('--por-estado', action='store_true', help='gera também a curva mensal de cada UF e região')
+    parser.add_argument('--variantes', nargs='*', choices=list(VARIANTES), default=list(VARIANTES),
+                        help='versões gravadas ao lado de cada PNG (padrão: todas; sem valores, só o PNG)')
+    args = parser.parse_args(argv)
+
+    with etapa('carregar_casos') as medida:
+        df = carregar_casos()
+        medida.linhas = len(df)
+    os.makedirs(SAIDA, exist_ok=True)
+    with etapa('preparar_dados', linhas=len(df)):
+        df_regioes, df_trimestres = preparar_dados(df)
+
+    with etapa('especificar_graficos') as medida:
+        specs = especificar_graficos(df, df_regioes, df_trimestres)
+        if args.por_estado:
+            specs += especificar_graficos_locais(df, df_regioes)
+        medida.linhas = len(specs)
+    with etapa('renderizar', linhas=len(specs), processos=args.processos):
+        renderizar(specs, args.processos, variantes=args.variantes)
+
+    with etapa('salvar_tabelas', linhas=len(df_regioes) + len(df_trimestres)):
+        salvar_tabelas(df, df_regioes, df_trimestres)
+
+    print(f"Visualizações geradas com sucesso e salvas em {SAIDA}/")
+
+
+if __name__ == '__main__':
+    main()
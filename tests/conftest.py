@@ -0,0 +1,5 @@
+import os
+import sys
+
+# os scripts se importam pelo nome, como quando rodados de dentro de scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import correlacao
+
+
+def _postos_definicao(coluna, densos=False):
+    """Posto de cada valor pela definição: 1 + quantos são menores (+ metade dos outros empatados)."""
+    if densos:
+        distintos = sorted(set(coluna))
+        return [1 + distintos.index(valor) for valor in coluna]
+    return [1 + sum(outro < valor for outro in coluna) + (sum(outro == valor for outro in coluna) - 1) / 2
+            for valor in coluna]
+
+
+@pytest.mark.parametrize('densos', [False, True])
+def test_postos_pela_definicao(densos):
+    rng = np.random.default_rng(0)
+    valores = rng.integers(0, 6, size=(40, 5)).astype(float)  # muitos empates
+    valores[:, 4] = rng.normal(size=40)  # e uma coluna sem empates
+    obtidos = correlacao.postos(valores, densos=densos)
+    for j in range(valores.shape[1]):
+        assert obtidos[:, j].tolist() == _postos_definicao(valores[:, j].tolist(), densos)
+    # ao longo do outro eixo
+    np.testing.assert_array_equal(correlacao.postos(valores.T, eixo=1, densos=densos), obtidos.T)
+
+
+def test_postos_reamostrados_iguais_aos_postos_da_amostra():
+    rng = np.random.default_rng(1)
+    valores = rng.integers(0, 8, size=(25, 3)).astype(float)
+    niveis = (correlacao.postos(valores, densos=True) - 1).astype(np.int64)
+    indices = rng.integers(0, len(valores), size=(50, len(valores)))
+    obtidos = correlacao._postos_reamostrados(niveis, indices)
+    for b, amostra in enumerate(indices):
+        for j in range(valores.shape[1]):
+            assert obtidos[b, :, j].tolist() == _postos_definicao(valores[amostra, j].tolist())
+
+
+def test_matriz_igual_ao_pandas():
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame(rng.integers(0, 10, size=(60, 4)).astype(float), columns=list('abcd'))
+    for metodo in ('spearman', 'pearson'):
+        pd.testing.assert_frame_equal(correlacao.matriz_correlacao(df, metodo), df.corr(metodo))
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+from deteccao_surtos import MESES, DetectorSurtos
+
+# perfil com pico de março a maio dez vezes acima do resto do ano, como o da dengue
+PERFIL = np.array([300, 600, 1500, 2000, 1500, 500, 200, 150, 120, 120, 150, 200])
+SERIES = [f"UF {k}" for k in range(20)]
+
+
+def _ano(rng, surto=None):
+    """Tabela de um ano com contagens de Poisson em torno de PERFIL; `surto` = {série: {mês: fator}}."""
+    contagens = rng.poisson(PERFIL, size=(len(SERIES), len(MESES))).astype(float)
+    for serie, meses in (surto or {}).items():
+        for mes, fator in meses.items():
+            contagens[SERIES.index(serie), mes] *= fator
+    df = pd.DataFrame(contagens, columns=MESES)
+    df.insert(0, 'UF_Notificacao', SERIES)
+    return df
+
+
+def _historico(anos=6, semente=0):
+    rng = np.random.default_rng(semente)
+    detector = DetectorSurtos()
+    for ano in range(anos):
+        detector.consumir_tabela(_ano(rng), str(ano))
+    return detector, rng
+
+
+def test_pico_sazonal_normal_nao_dispara_ewma():
+    detector, rng = _historico()
+    alertas = pd.concat([detector.consumir_tabela(_ano(rng), str(ano)) for ano in range(6, 9)])
+    ewma = alertas[alertas['Alerta_EWMA']]
+    assert not ewma['Periodo'].str.endswith(('Mar', 'Abr', 'Mai')).any()
+    assert len(ewma) <= 0.01 * 3 * len(SERIES) * len(MESES)
+
+
+def test_surto_injetado_dispara_ewma():
+    detector, rng = _historico()
+    # o dobro do esperado de agosto a outubro, fora do pico
+    alertas = detector.consumir_tabela(_ano(rng, {'UF 3': {7: 2, 8: 2, 9: 2}}), '6')
+    ewma = alertas[alertas['Alerta_EWMA'] & (alertas['Serie'] == 'UF 3')]
+    assert '6 Ago' in set(ewma['Periodo'])
+    assert (alertas.loc[alertas['Alerta_EWMA'], 'Periodo'] == '6 Ago').sum() == 1
+
+
+def test_retomar_do_arquivo_da_os_mesmos_alertas(tmp_path):
+    detector, rng = _historico()
+    caminho = tmp_path / 'estado.npz'
+    detector.salvar(caminho)
+    retomado = DetectorSurtos.carregar(caminho)
+    for campo in ('media', 'variancia', 'ewma', 'cusum', 'sazonal', 'dispersao', 'ciclos'):
+        np.testing.assert_array_equal(getattr(retomado, campo), getattr(detector, campo))
+    for ano in range(6, 9):
+        df = _ano(rng, {'UF 3': {7: 2, 8: 2}} if ano == 7 else None)
+        pd.testing.assert_frame_equal(retomado.consumir_tabela(df, str(ano)), detector.consumir_tabela(df, str(ano)))
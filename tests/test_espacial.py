@@ -0,0 +1,41 @@
+import os
+
+import numpy as np
+
+import espacial
+
+VIZINHANCA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'vizinhanca_uf.csv')
+PERMUTACOES = 4999
+
+
+def _lisa_ingenuo(z, adjacencia, permutacoes, rng):
+    """
+    LISA pela definição, unidade a unidade: o valor da unidade fica fixo e
+    os vizinhos recebem valores sorteados sem reposição entre as demais.
+    """
+    ii, p_valores = [], []
+    for i in range(len(z)):
+        vizinhos = adjacencia.indices[adjacencia.indptr[i]:adjacencia.indptr[i + 1]]
+        ii.append(z[i] * z[vizinhos].mean())
+        outras = np.delete(z, i)
+        sorteios = rng.permuted(np.tile(outras, (permutacoes, 1)), axis=1)[:, :len(vizinhos)]
+        simulados = z[i] * sorteios.mean(axis=1)
+        maiores = (simulados >= ii[-1]).sum()
+        p_valores.append((min(maiores, permutacoes - maiores) + 1) / (permutacoes + 1))
+    return np.array(ii), np.array(p_valores)
+
+
+def test_moran_local_igual_a_permutacao_por_unidade():
+    adjacencia = espacial.Adjacencia.de_csv(VIZINHANCA)
+    rng = np.random.default_rng(0)
+    # um gradiente norte-sul com ruído: há unidades significativas e não significativas
+    valores = adjacencia.codigos // 10 + rng.normal(scale=1.5, size=len(adjacencia.codigos))
+    lisa = espacial.moran_local(valores, adjacencia, permutacoes=PERMUTACOES, semente=1)
+
+    z = (valores - valores.mean()) / valores.std()
+    ii, p_valores = _lisa_ingenuo(z, adjacencia, PERMUTACOES, rng)
+    np.testing.assert_allclose(lisa['Ii'], ii)
+    # a comparação cobre unidades significativas e não significativas
+    assert (p_valores < 0.05).any() and (p_valores > 0.2).any()
+    # desvio-padrão de Monte Carlo da diferença de dois p-valores: no máximo ~0.01 com 4999 permutações
+    assert np.abs(lisa['p_valor'].to_numpy() - p_valores).max() < 0.03
@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from cubo_casos import CuboCasos, abrir_cubo
+from geografia import CODIGOS_POR_NOME
+from incremental import Agregados, anexar, atualizar_derivados
+
+UFS = list(CODIGOS_POR_NOME)
+TABELAS = ('dengue_por_regiao.csv', 'dengue_por_trimestre.csv', 'top10_estados.csv', 'dados_correlacao.csv')
+
+
+def _ano(rng, ano, ufs=UFS):
+    """Cubo de um ano com casos aleatórios nas `ufs`."""
+    casos = rng.integers(0, 5000, size=(len(ufs), 1, 12)).astype(np.int32)
+    ignorados = rng.integers(0, 50, size=(len(ufs), 1)).astype(np.int32)
+    return CuboCasos(casos, ignorados, ufs, [ano])
+
+
+def _anexar(novo, diretorio):
+    cubo, agregados, _ = anexar(novo, diretorio)
+    cubo.salvar_anos(diretorio)
+    agregados.salvar(diretorio)
+    return agregados
+
+
+def _derivados(agregados, diretorio):
+    os.makedirs(diretorio)
+    atualizar_derivados(agregados, os.path.join(diretorio, 'anual.csv'), diretorio, covariaveis={})
+    return {nome: pd.read_csv(os.path.join(diretorio, nome)) for nome in ('anual.csv',) + TABELAS}
+
+
+def test_anexar_ano_a_ano_igual_a_recalcular(tmp_path):
+    rng = np.random.default_rng(0)
+    # um ano com UFs a menos, outro que chega depois e a revisão de um ano já guardado
+    anos = [_ano(rng, '2020', UFS[:20]), _ano(rng, '2021'), _ano(rng, '2022'), _ano(rng, '2021')]
+    cubo = str(tmp_path / 'cubo')
+    for novo in anos:
+        agregados = _anexar(novo, cubo)
+
+    completo = Agregados.do_cubo(abrir_cubo(cubo))
+    assert sorted(agregados.anos) == sorted(completo.anos) == ['2020', '2021', '2022']
+    ordem = [agregados.ufs.index(uf) for uf in completo.ufs]
+    np.testing.assert_array_equal(agregados.casos[ordem], completo.casos)
+    np.testing.assert_array_equal(agregados.ignorados[ordem], completo.ignorados)
+
+    # as somas batem com os anos finais (a revisão de 2021 substitui a primeira versão)
+    esperado = np.zeros((len(UFS), 12), dtype=np.int64)
+    for novo in anos[0], anos[2], anos[3]:
+        esperado[[UFS.index(uf) for uf in novo.ufs.categories]] += novo.casos[:, 0]
+    np.testing.assert_array_equal(completo.casos, esperado[[UFS.index(uf) for uf in completo.ufs]])
+
+    incrementais = _derivados(agregados, str(tmp_path / 'incremental'))
+    recalculados = _derivados(Agregados.carregar(cubo), str(tmp_path / 'recalculado'))
+    do_zero = _derivados(completo, str(tmp_path / 'do_zero'))
+    for nome, tabela in incrementais.items():
+        pd.testing.assert_frame_equal(tabela, recalculados[nome])
+        indice = tabela.columns[0]
+        pd.testing.assert_frame_equal(tabela.set_index(indice).sort_index(),
+                                      do_zero[nome].set_index(indice).sort_index(), check_like=True)
@@ -0,0 +1,133 @@
+import itertools
+import random
+import re
+
+import pandas as pd
+import pytest
+
+import benchmark_parser
+import parse_dengue
+from parse_dengue import ErroSeparacao, separar_lote, separar_referencia
+
+RONDONIA = '28.89610.28910.8056.4924.0932.3011.6341.0648521.2982.6994.41654.841'
+NUMERO = re.compile(r"-|[1-9][0-9]{0,2}(?:\.[0-9]{3})*")
+
+
+def _mutar(texto, rng):
+    """Apaga, troca ou insere de 1 a 3 caracteres do alfabeto das linhas."""
+    caracteres = list(texto)
+    for _ in range(rng.randint(1, 3)):
+        k = rng.randrange(len(caracteres))
+        sorteio = rng.random()
+        if sorteio < 0.3 and len(caracteres) > 1:
+            del caracteres[k]
+        elif sorteio < 0.6:
+            caracteres[k] = rng.choice('0123456789.-')
+        else:
+            caracteres.insert(k, rng.choice('0123456789.-'))
+    return ''.join(caracteres)
+
+
+def _textos(n, semente):
+    linhas, _ = benchmark_parser.gerar_linhas_sinteticas(n, semente)
+    textos = [linha.rsplit(None, 1)[1] for linha in linhas]
+    rng = random.Random(semente)
+    return textos + [_mutar(texto, rng) for texto in textos]
+
+
+def test_referencia_separa_linha_real():
+    assert separar_referencia(RONDONIA) == [2, 8896, 10289, 10805, 6492, 4093, 2301, 1634, 1064, 852, 1298,
+                                            2699, 4416, 54841]
+
+
+def test_referencia_sem_separacao():
+    with pytest.raises(ErroSeparacao) as erro:
+        separar_referencia('1' * 20)
+    assert erro.value.caminhos == 0
+
+
+def _linha(rng, escala, n_campos=parse_dengue.N_CAMPOS):
+    """Linha com contagens de até `escala` (um quarto delas zero) e o total no fim, e os números dela."""
+    numeros = [0 if rng.random() < 0.25 else rng.randint(1, escala) for _ in range(n_campos - 1)]
+    numeros.append(sum(numeros))
+    return ''.join(benchmark_parser.formatar_tabnet(valor) for valor in numeros), numeros
+
+
+def _forca_bruta(texto, n_campos):
+    """Todas as divisões de `texto` em `n_campos` números válidos cujo último é a soma dos outros."""
+    divisoes = []
+    for cortes in itertools.combinations(range(1, len(texto)), n_campos - 1):
+        pecas = [texto[i:j] for i, j in zip((0,) + cortes, cortes + (len(texto),))]
+        if all(NUMERO.fullmatch(peca) for peca in pecas):
+            numeros = [0 if peca == '-' else int(peca.replace('.', '')) for peca in pecas]
+            if sum(numeros[:-1]) == numeros[-1]:
+                divisoes.append(numeros)
+    return divisoes
+
+
+def _conferir(textos, n_campos=parse_dengue.N_CAMPOS):
+    """separar_lote dá o mesmo que separar_referencia em cada linha; retorna (valores, erros)."""
+    valores, erros = separar_lote(textos, n_campos)
+    for k, texto in enumerate(textos):
+        try:
+            esperado, erro_esperado = separar_referencia(texto, n_campos), None
+        except ErroSeparacao as erro:
+            esperado, erro_esperado = None, erro
+        if erro_esperado is None:
+            assert k not in erros, texto
+            assert valores[k].tolist() == esperado, texto
+        else:
+            assert k in erros, texto
+            assert erros[k].caminhos == erro_esperado.caminhos, texto
+            if erro_esperado.caminhos <= parse_dengue.LIMITE_CANDIDATOS:
+                assert sorted(erros[k].candidatos) == sorted(erro_esperado.candidatos), texto
+    return valores, erros
+
+
+def test_lote_separa_linha_de_valores_pequenos():
+    valores, erros = separar_lote(['1387117381171710332984713121650'])
+    assert not erros
+    assert valores[0].tolist() == [13, 87, 117, 38, 117, 17, 10, 33, 29, 8, 47, 13, 121, 650]
+
+
+@pytest.mark.parametrize('semente', [1, 2])
+def test_lote_igual_a_referencia(semente):
+    _conferir(_textos(150, semente))
+
+
+@pytest.mark.parametrize('escala', [9, 50, 120, 1000, 20000])
+def test_lote_igual_a_referencia_em_escalas_pequenas(escala):
+    rng = random.Random(escala)
+    linhas = [_linha(rng, escala) for _ in range(150)]
+    valores, erros = _conferir([texto for texto, _ in linhas])
+    for k, (texto, numeros) in enumerate(linhas):
+        if k in erros:
+            assert erros[k].caminhos > 1, texto
+            if erros[k].caminhos <= parse_dengue.LIMITE_CANDIDATOS:
+                assert numeros in erros[k].candidatos, texto
+        else:
+            assert valores[k].tolist() == numeros, texto
+
+
+@pytest.mark.parametrize('n_campos', [3, 4, 5])
+def test_separacao_igual_a_forca_bruta(n_campos):
+    rng = random.Random(n_campos)
+    textos = [_linha(rng, rng.choice([9, 120, 5000]), n_campos)[0] for _ in range(100)]
+    textos += [_mutar(texto, rng) for texto in textos]
+    valores, erros = _conferir(textos, n_campos)
+    for k, texto in enumerate(textos):
+        divisoes = _forca_bruta(texto, n_campos)
+        if k in erros:
+            assert erros[k].caminhos == len(divisoes), texto
+            assert sorted(erros[k].candidatos) == sorted(divisoes)[:parse_dengue.LIMITE_CANDIDATOS] \
+                or len(divisoes) > parse_dengue.LIMITE_CANDIDATOS, texto
+        else:
+            assert [valores[k].tolist()] == divisoes, texto
+
+
+def test_blocos_independem_do_tamanho():
+    linhas, _ = benchmark_parser.gerar_linhas_sinteticas(600, 3)
+    inteiro = pd.concat(parse_dengue.gerar_blocos(linhas), ignore_index=True)
+    for tamanho in (1, 7, 100):
+        partes = pd.concat(parse_dengue.gerar_blocos(linhas, tamanho), ignore_index=True)
+        pd.testing.assert_frame_equal(partes, inteiro)
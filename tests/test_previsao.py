@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+import previsao
+from previsao import MODELOS, NIVEL, PERIODO, completude_de_instantaneos, corrigir_atraso, holt_winters, prever
+
+# perfil sazonal na escala log(1 + casos), com pico de março a maio
+SAZONAL = np.array([0.5, 1, 2, 2.5, 2, 1, 0, -0.5, -1, -1, -0.5, 0])
+
+
+def _instantaneos(casos, completude, cortes):
+    """
+    Cortes sucessivos de `casos` (séries × meses), um mês a mais a cada um,
+    em que o mês com atraso d só tem completude[d] dos casos (todos, a
+    partir de len(completude)).
+    """
+    matrizes = []
+    for fim in range(casos.shape[1] - cortes + 1, casos.shape[1] + 1):
+        atraso = fim - 1 - np.arange(fim)
+        fracao = np.where(atraso < len(completude), np.asarray(completude)[np.minimum(atraso, len(completude) - 1)], 1.0)
+        matrizes.append(casos[:, :fim] * fracao)
+    return matrizes
+
+
+def test_completude_recupera_a_fracao_notificada():
+    rng = np.random.default_rng(0)
+    casos = rng.integers(10, 1000, size=(30, 40)).astype(float)
+    completude = [0.4, 0.7, 0.9]
+    np.testing.assert_allclose(completude_de_instantaneos(_instantaneos(casos, completude, 12)), completude)
+
+
+def test_nowcast_divide_so_os_ultimos_meses():
+    casos = np.arange(1, 21, dtype=float).reshape(2, 10)
+    corrigidos = corrigir_atraso(casos, (0.5, 0.8))
+    np.testing.assert_array_equal(corrigidos[:, :-2], casos[:, :-2])
+    np.testing.assert_allclose(corrigidos[:, -2], casos[:, -2] / 0.8)
+    np.testing.assert_allclose(corrigidos[:, -1], casos[:, -1] / 0.5)
+    # completude mais longa que a série: só os meses que existem
+    np.testing.assert_allclose(corrigir_atraso(casos[:, :2], (0.5, 0.8, 0.9)), casos[:, :2] / [0.8, 0.5])
+    np.testing.assert_array_equal(corrigir_atraso(casos, ()), casos)
+
+
+@pytest.mark.parametrize('tendencia, tolerancia', [(0.0, 1e-12), (0.01, 0.02)])
+def test_holt_winters_recupera_serie_sem_ruido(tendencia, tolerancia):
+    t = np.arange(8 * PERIODO + 6)
+    z = np.vstack([nivel + tendencia * t + SAZONAL[t % PERIODO] for nivel in (2.0, 4.0, 6.0)])
+    pontual, caminhos = holt_winters(z[:, :-6], 6, 20, np.random.default_rng(0))
+    np.testing.assert_allclose(pontual, z[:, -6:], atol=tolerancia)
+    assert np.abs(caminhos - z[None, :, -6:]).max() < 5 * tolerancia + 1e-9
+
+
+def test_sazonal_ingenuo_repete_o_ano_anterior():
+    t = np.arange(3 * PERIODO)
+    z = (3 + SAZONAL[t % PERIODO])[None]
+    pontual, caminhos = previsao.sazonal_ingenuo(z, PERIODO + 2, 5, np.random.default_rng(0))
+    np.testing.assert_allclose(pontual, z[:, np.r_[np.arange(PERIODO), 0, 1]])
+    np.testing.assert_allclose(caminhos, np.broadcast_to(pontual, caminhos.shape))
+
+
+@pytest.mark.parametrize('modelo, tolerancia', [('sazonal_ingenuo', 0.03), ('harmonico', 0.03), ('holt_winters', 0.04)])
+def test_cobertura_dos_intervalos_perto_do_nivel(modelo, tolerancia):
+    # séries log-normais em torno de um perfil harmônico fixo, com ruído independente a cada mês
+    rng = np.random.default_rng(1)
+    n, T, horizonte = 2000, 6 * PERIODO, 6
+    t = np.arange(T + horizonte)
+    fases = rng.uniform(0, 2 * np.pi, size=(n, 1))
+    z = rng.uniform(3, 6, size=(n, 1)) + 1.5 * np.cos(2 * np.pi * t / PERIODO + fases) + rng.normal(0, 0.3, (n, len(t)))
+    casos = np.expm1(z)
+    _, inferior, superior = prever(casos[:, :T], horizonte, 500, modelos=[modelo], semente=2)
+    dentro = (casos[:, T:] >= inferior) & (casos[:, T:] <= superior)
+    assert abs(dentro.mean() - NIVEL) < tolerancia
+
+
+def test_prever_exige_historico_minimo():
+    with pytest.raises(ValueError, match='holt_winters'):
+        prever(np.ones((2, MODELOS['holt_winters'][1] - 1)), modelos=['holt_winters'])
@@ -0,0 +1,89 @@
+import asyncio
+import json
+
+import pytest
+
+from servico_consultas import CacheLRU, Servico, chave_consulta
+
+
+class _Dados:
+    """Só a fatia, que recusa unidades fora de {'Acre', 'Bahia'}, contando as chamadas."""
+
+    segundos_carga = 0.0
+
+    def __init__(self):
+        self.chamadas = 0
+
+    def fatia(self, nivel='uf', unidades=(), meses=(), anos=(), periodo=None, taxa=False):
+        self.chamadas += 1
+        desconhecidas = [unidade for unidade in unidades if unidade not in ('Acre', 'Bahia')]
+        if desconhecidas:
+            raise ValueError(f"unidades desconhecidas no nível {nivel}: {', '.join(desconhecidas)}")
+        return {'unidades': list(unidades), 'meses': list(meses)}
+
+
+def _responder(servico, alvo):
+    status, corpo = asyncio.run(servico.responder(alvo))
+    return status, json.loads(corpo)
+
+
+def test_cache_descarta_os_menos_recentes_pelo_tamanho():
+    cache = CacheLRU(10)
+    cache.guardar('a', b'1234')
+    cache.guardar('b', b'1234')
+    assert cache.obter('a') == b'1234'  # 'b' passa a ser o menos recente
+    cache.guardar('c', b'1234')
+    assert cache.obter('b') is None
+    assert (cache.obter('a'), cache.obter('c')) == (b'1234', b'1234')
+    assert cache.bytes == 8
+
+    # regravar uma chave troca o tamanho dela; um corpo maior que o limite não entra nem descarta nada
+    cache.guardar('a', b'1234567')
+    assert cache.obter('c') is None
+    assert cache.bytes == 7
+    cache.guardar('d', b'x' * 11)
+    assert cache.obter('d') is None
+    assert cache.obter('a') == b'1234567'
+    assert cache.estado() == {'itens': 1, 'bytes': 7, 'limite_bytes': 10, 'acertos': 4, 'faltas': 3}
+
+
+def test_chave_normaliza_ordem_e_intervalos_de_meses():
+    chave = chave_consulta('/fatia', {'unidades': ['Bahia', 'Acre'], 'anos': ['2024', '2023'],
+                                      'meses': ['Fev-Abr'], 'taxa': True})
+    assert chave == chave_consulta('/fatia', {'taxa': True, 'meses': ['abr', 'Fev', ' MAR '],
+                                              'anos': ['2023', '2024'], 'unidades': [' acre', 'BAHIA']})
+    assert dict(chave[1])['meses'] == ('Fev', 'Mar', 'Abr')
+    # intervalo que passa da virada do ano
+    assert chave_consulta('/fatia', {'meses': ['Nov-Fev']})[1] == (('meses', ('Jan', 'Fev', 'Nov', 'Dez')),)
+    # a ordem das variáveis de uma correlação não é um conjunto: continua fazendo diferença
+    assert chave_consulta('/correlacao', {'variaveis': ['a', 'b']}) != chave_consulta('/correlacao', {'variaveis': ['b', 'a']})
+
+
+@pytest.mark.parametrize('alvo, erro', [
+    ('/fatia?cor=azul', 'parâmetro desconhecido: cor'),
+    ('/fatia?meses=Fev-Foo', 'mês inválido: Fev-Foo'),
+    ('/defasagem?maxima=tres', 'invalid literal'),
+])
+def test_parametros_invalidos_respondem_400_sem_calcular(alvo, erro):
+    dados = _Dados()
+    status, corpo = _responder(Servico(dados), alvo)
+    assert status == 400
+    assert erro in corpo['erro']
+    assert dados.chamadas == 0
+
+
+def test_erro_no_calculo_responde_400_e_nao_entra_no_cache():
+    dados = _Dados()
+    servico = Servico(dados)
+    for _ in range(2):
+        status, corpo = _responder(servico, '/fatia?unidades=Acre,Atlantida')
+        assert status == 400
+        assert corpo == {'erro': 'unidades desconhecidas no nível uf: Atlantida'}
+    assert dados.chamadas == 2
+    assert servico.cache.estado()['itens'] == 0
+
+    # a mesma consulta válida, escrita de dois jeitos, é calculada uma vez só
+    assert _responder(servico, '/fatia?unidades=Acre,Bahia&meses=Fev-Mar') == \
+        (200, {'unidades': ['Acre', 'Bahia'], 'meses': ['Fev-Mar']})
+    assert _responder(servico, '/fatia?meses=fev,mar&unidades=Bahia,Acre')[0] == 200
+    assert dados.chamadas == 3
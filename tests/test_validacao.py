@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cubo_casos import MESES, CuboCasos
+from geografia import CODIGOS_POR_NOME
+from validacao import TOTAL, validar, verificar_cubo, verificar_tabela
+
+UFS = list(CODIGOS_POR_NOME)
+
+
+@pytest.fixture
+def cubo():
+    rng = np.random.default_rng(0)
+    casos = rng.integers(0, 5000, size=(len(UFS), 2, 12)).astype(np.int32)
+    ignorados = rng.integers(0, 50, size=(len(UFS), 2)).astype(np.int32)
+    return CuboCasos(casos, ignorados, UFS, ['2023', '2024'])
+
+
+@pytest.fixture
+def df(cubo):
+    """A tabela que sai do cubo: anos somados, Total por linha e a linha TOTAL no fim."""
+    tabela = pd.DataFrame(cubo.casos.sum(axis=1, dtype=np.int64), columns=MESES)
+    tabela.insert(0, 'Ign_Em_Branco', cubo.ignorados.sum(axis=1, dtype=np.int64))
+    tabela['Total'] = tabela.sum(axis=1)
+    tabela.loc[len(tabela)] = tabela.sum()
+    tabela.insert(0, 'UF_Notificacao', UFS + [TOTAL])
+    return tabela
+
+
+def _celulas(falhas):
+    """(verificação, linha, coluna, esperado, obtido) de cada célula com falha."""
+    return sorted(map(tuple, falhas[['verificacao', 'linha', 'coluna', 'esperado', 'obtido']]
+                      .astype(object).where(falhas.notna(), None).to_numpy().tolist()))
+
+
+def test_dados_consistentes_nao_tem_falhas(cubo, df):
+    assert validar(df, cubo).empty
+
+
+def test_total_da_linha_errado(df):
+    df.loc[1, 'Total'] += 5
+    total, geral = df.loc[1, 'Total'], df.loc[len(UFS), 'Total']
+    # a linha TOTAL continua somando os Totais certos, então diverge também
+    assert _celulas(verificar_tabela(df)) == [
+        ('linha_total', TOTAL, 'Total', geral + 5, geral),
+        ('total_da_linha', 'Acre', 'Total', total - 5, total),
+    ]
+
+
+def test_linha_total_diferente_da_soma(df):
+    # TOTAL coerente consigo mesma (Mar e Total sobem juntos), mas não com as UFs
+    df.loc[len(UFS), ['Mar', 'Total']] += 7
+    mar, total = df.loc[len(UFS), ['Mar', 'Total']]
+    assert _celulas(verificar_tabela(df)) == [
+        ('linha_total', TOTAL, 'Mar', mar - 7, mar),
+        ('linha_total', TOTAL, 'Total', total - 7, total),
+    ]
+
+
+def test_uf_desconhecida(cubo, df):
+    df.loc[1, 'UF_Notificacao'] = 'Akre'
+    assert _celulas(verificar_tabela(df)) == [('uf_desconhecida', 'Akre', 'UF_Notificacao', None, 'Akre')]
+    # no cubo ela é uma UF que falta de um lado e sobra do outro
+    assert _celulas(verificar_cubo(cubo, df)) == [
+        ('uf_fora_da_tabela', 'Acre', 'UF_Notificacao', None, None),
+        ('uf_fora_do_cubo', 'Akre', 'UF_Notificacao', None, None),
+    ]
+
+
+def test_cubo_diferente_da_tabela(cubo, df):
+    k = UFS.index('Bahia')
+    cubo.casos[k, 1, MESES.index('Mai')] += 3
+    cubo.ignorados[k, 0] -= 2
+    assert verificar_tabela(df).empty
+    assert _celulas(verificar_cubo(cubo, df)) == [
+        ('cubo_x_tabela', 'Bahia', 'Ign_Em_Branco', df.loc[k, 'Ign_Em_Branco'], df.loc[k, 'Ign_Em_Branco'] - 2),
+        ('cubo_x_tabela', 'Bahia', 'Mai', df.loc[k, 'Mai'], df.loc[k, 'Mai'] + 3),
+    ]